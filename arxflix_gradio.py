@@ -1,16 +1,18 @@
 import gradio as gr
 import logging
 from backend.main import (
-    generate_paper,
-    generate_script,
-    generate_assets,
-    generate_video,
+    generate_pipeline,
 )
+from backend.utils.jobs import run_directory
+from backend.utils.video_cache import VideoCache, video_cache_key
+from backend.utils.pipeline_events import event_sink
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import tempfile
 import shutil
+import uuid
 import dotenv
 import os
+import queue
 import time
 
 dotenv.load_dotenv()
@@ -20,10 +22,13 @@ logger = logging.getLogger(__name__)
 DEFAULT_METHOD_PAPER = "arxiv_html"
 DEFAULT_METHOD_SCRIPT = "openrouter"
 DEFAULT_METHOD_AUDIO = "kokoro"
+DEFAULT_RENDER_PROFILE = "final"
 DEFAULT_PAPER_ID = "2404.02905"
 
 VIDEO_DIR = Path("generated_videos")
 VIDEO_DIR.mkdir(exist_ok=True)
+# Videos of papers already generated with the same settings, evicted by age and size
+video_cache = VideoCache(VIDEO_DIR)
 
 def _status_working(message: str) -> str:
     """Return HTML for a working status with spinner."""
@@ -39,6 +44,58 @@ def _status_error(message: str) -> str:
     """Return HTML for an error status."""
     return f'<div class="status error">❌ {message}</div>'
 
+def _stage_timings(timings: dict) -> str:
+    """Return the seconds each finished stage took, e.g. "generate_script 41.2s · tts 63.0s"."""
+    return " · ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.items())
+
+
+def _run_step(message: str, timings: dict, fn, *args, **kwargs):
+    """Run a pipeline step in a thread and yield a status for each of its events.
+
+    Use with ``result = yield from _run_step(...)``. The seconds of each
+    finished stage are added to ``timings``.
+    """
+    events = queue.Queue()
+
+    def run():
+        with event_sink(lambda type, data: events.put({"type": type, **data})):
+            return fn(*args, **kwargs)
+
+    detail = ""
+    texts = None
+    narrated = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        step = executor.submit(run)
+        yield gr.update(value=_status_working(message)), None
+        while not (step.done() and events.empty()):
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if event["type"] == "stage_start":
+                detail = f"{event['stage']}..."
+                texts = event.get("texts", texts)
+            elif event["type"] == "stage_end":
+                timings[event["stage"]] = event["seconds"]
+                detail = ""
+            elif event["type"] == "tts_segment":
+                narrated += 1
+                detail = f"narration {narrated}/{texts or '?'} texts"
+            elif event["type"] == "checkpoint_reused":
+                detail = f"{event['stage']}: reusing checkpoint"
+            elif event["type"] == "render_progress":
+                eta = event["eta_seconds"]
+                eta_text = f"ETA {int(eta // 60)}:{int(eta % 60):02d}" if eta is not None else "estimating ETA"
+                detail = f"{event['frames_done']}/{event['total_frames']} frames, {event['fps']:.1f} fps, {eta_text}"
+            else:
+                continue
+            status = " ".join(filter(None, [message, detail]))
+            if timings:
+                status += f"<br><small>{_stage_timings(timings)}</small>"
+            yield gr.update(value=_status_working(status)), None
+        return step.result()
+
+
 def process_and_generate_video(
     input_source: str,
     method_paper,
@@ -47,12 +104,14 @@ def process_and_generate_video(
     method_audio,
     pdf_file,
     api_base_url=None,
+    render_profile=DEFAULT_RENDER_PROFILE,
+    resume_run=None,
 ):
     """Processes the entire pipeline and generates the video."""
     status = _status_working("Starting the pipeline...")
     yield gr.update(value=status), None  # Update status, no video yet
 
-    temp_dir = None
+    run_id = None
     try:
         # Validate inputs based on selected source
         if input_source == "Upload PDF":
@@ -75,78 +134,75 @@ def process_and_generate_video(
             yield gr.update(value=status), None
             return
 
-        # 1. Generate Paper Markdown
-        if use_pdf:
-            status = _status_working("Generating paper markdown from PDF...")
-            yield gr.update(value=status), None
-            paper_markdown = generate_paper("pdf", "paper_id", pdf_path=pdf_file)
-        else:
-            status = _status_working("Generating paper markdown...")
-            yield gr.update(value=status), None
-            paper_markdown = generate_paper(method_paper, paper_id)
-        logger.info("Paper markdown generated successfully.")
-        
-        # 2. Generate Script
-        if use_pdf:
-            status = _status_working("Generating script from PDF markdown...")
-            yield gr.update(value=status), None
-            script = generate_script(
-                method_script, paper_markdown, "paper_id", api_base_url, from_pdf=True
-            )
-        else:
-            status = _status_working("Generating script from markdown...")
-            yield gr.update(value=status), None
-            script = generate_script(
-                method_script, paper_markdown, paper_id, api_base_url
-            )
-        logger.info("Script generated successfully.")
-
-        # 3. Create temporary directory for assets
-        temp_dir = tempfile.mkdtemp()
-        temp_path = Path(temp_dir)
-        mp3_output = temp_path / "audio.wav"
-        srt_output = temp_path / "subtitles.srt"
-        rich_output = temp_path / "rich.json"
-        input_dir = temp_path
-        output_video = temp_path / "output.mp4"
-
-        # 4. Generate Assets
-        status = _status_working("Generating audio, subtitles, and rich content assets...")
-        yield gr.update(value=status), None
-        generate_assets(
-            script,
+        # The same paper with the same settings was generated before
+        cache_key = video_cache_key(
+            None if use_pdf else paper_id,
+            pdf_file if use_pdf else None,
+            method_script,
+            api_base_url,
             method_audio,
-            mp3_output=str(mp3_output),
-            srt_output=str(srt_output),
-            rich_output=str(rich_output),
+            render_profile,
         )
-        logger.info("Assets generated successfully.")
+        cached_video = None if resume_run else video_cache.get(cache_key)
+        if cached_video:
+            status = _status_done(f"Found a video generated with the same settings: {cached_video}")
+            yield gr.update(value=status), str(cached_video)
+            return
 
-        # 5. Generate Video
-        status = _status_working("Generating video...")
-        yield gr.update(value=status), None
-        generate_video(input_dir, output_video)
-        logger.info("Video generated successfully.")
+        # Every stage is checkpointed in the run directory, kept if the
+        # pipeline fails so that it can be resumed
+        run_dir = run_directory((resume_run or "").strip() or uuid.uuid4().hex[:12])
+        run_id = run_dir.name
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        # Seconds taken by each stage, shown under the status
+        timings = {}
+        message = f"Resuming run {run_id}..." if resume_run else f"Running the pipeline (run {run_id})..."
+        result = yield from _run_step(
+            message, timings,
+            generate_pipeline,
+            paper_id=None if use_pdf else paper_id,
+            method_paper="pdf" if use_pdf else method_paper,
+            method_script=method_script,
+            method_audio=method_audio,
+            pdf_path=pdf_file if use_pdf else None,
+            end_point_base_url=api_base_url,
+            profile=render_profile,
+            resume=run_id,
+        )
+        output_video = Path(result["video"])
+        logger.info(f"Video generated successfully: {result['stages']}")
 
-        # 6. Move video to the permanent directory
+        # Move video to the permanent directory
         status = _status_working("Finalizing and saving video...")
         yield gr.update(value=status), None
-        final_video_path = VIDEO_DIR / f"video_{paper_id}_{int(time.time())}.mp4"
+        suffix = "" if render_profile == "final" else f"_{render_profile}"
+        final_video_path = VIDEO_DIR / f"video_{paper_id}_{int(time.time())}{suffix}.mp4"
         shutil.move(str(output_video), str(final_video_path))
         logger.info(f"Video saved to {final_video_path}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        video_cache.put(
+            cache_key,
+            final_video_path,
+            {
+                "paper": Path(pdf_file).name if use_pdf else paper_id,
+                "method_script": method_script,
+                "method_audio": method_audio,
+                "profile": render_profile,
+            },
+        )
 
-        status = _status_done(f"Pipeline completed! Video saved at: {final_video_path}")
+        status = _status_done(
+            f"Pipeline completed! Video saved at: {final_video_path}<br><small>{_stage_timings(timings)}</small>"
+        )
         yield gr.update(value=status), str(final_video_path)  # Return video path as video_output
 
     except Exception as e:
         logger.error(f"An error occurred: {e}")
-        status = _status_error(f"Error: {e}. Check logs for details.")
+        resume_hint = f" Resume it with run id {run_id}." if run_id else ""
+        status = _status_error(f"Error: {e}. Check logs for details.{resume_hint}")
         yield gr.update(value=status), None  # Return error status, no video
 
-    finally:
-        if temp_dir:
-            shutil.rmtree(temp_dir)
-
 
 def _toggle_source(choice: str):
     """Toggle visibility and interactivity of inputs based on source choice."""
@@ -174,6 +230,8 @@ def _reset_fields():
         DEFAULT_METHOD_AUDIO,  # method_audio_input
         None,  # pdf_file_input
         None,  # api_base_url
+        DEFAULT_RENDER_PROFILE,  # render_profile_input
+        None,  # resume_run_input
         gr.update(value="Idle..."),  # status_output
         None,  # video_output
     )
@@ -293,8 +351,15 @@ with gr.Blocks(theme=gr.themes.Soft(), css=CUSTOM_CSS) as demo:
                     visible=False,
                 )
 
+                resume_run_input = gr.Textbox(
+                    label="Resume run (optional)",
+                    value=None,
+                    placeholder="Run id shown when a pipeline fails",
+                    info="Skip the stages that already finished in that run",
+                )
+
             method_script_input = gr.Dropdown(
-                ["openai", "local", "gemini", "openrouter", "groq"],
+                ["openai", "local", "gemini", "openrouter", "groq", "routed"],
                 label="Script Generation Method",
                 value=DEFAULT_METHOD_SCRIPT,
             )
@@ -303,6 +368,12 @@ with gr.Blocks(theme=gr.themes.Soft(), css=CUSTOM_CSS) as demo:
                 label="Audio Generation Method",
                 value=DEFAULT_METHOD_AUDIO,
             )
+            render_profile_input = gr.Dropdown(
+                ["final", "draft", "storyboard"],
+                label="Render Profile",
+                value=DEFAULT_RENDER_PROFILE,
+                info="Draft and storyboard render a quick preview to review the script",
+            )
 
             with gr.Row(elem_id="actions"):
                 generate_button = gr.Button("Generate Video 🚀", variant="primary")
@@ -341,6 +412,8 @@ with gr.Blocks(theme=gr.themes.Soft(), css=CUSTOM_CSS) as demo:
             method_audio_input,
             pdf_file_input,
             api_base_url,
+            render_profile_input,
+            resume_run_input,
         ],
         outputs=[status_output, video_output],
     )
@@ -367,6 +440,8 @@ with gr.Blocks(theme=gr.themes.Soft(), css=CUSTOM_CSS) as demo:
             method_audio_input,
             pdf_file_input,
             api_base_url,
+            render_profile_input,
+            resume_run_input,
             status_output,
             video_output,
         ],
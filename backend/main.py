@@ -1,12 +1,20 @@
+from dataclasses import asdict
 from pathlib import Path
+import asyncio
+import inspect
+import json
 import logging
 import os
+import re
 import tempfile
-from typing import Literal
+import time
+import uuid
+from typing import Annotated, Literal
 from dotenv import load_dotenv
 import typer
 import fastapi
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 
 from backend.utils import (
     process_video,
@@ -17,9 +25,31 @@ from backend.utils import (
     export_mp3,
     export_srt,
     export_rich_content_json,
+    export_segments_json,
 )
 from backend.utils import process_article
 from backend.utils import process_script
+from backend.utils.generate_video import REMOTION_CONCURRENCY, REMOTION_RENDERER, ensure_audio_viz
+from backend.utils.incremental_render import SCRIPT_SEGMENTS_NAME
+from backend.utils.batch import (
+    BATCH_ASSET_WORKERS,
+    BATCH_RENDER_WORKERS,
+    BATCH_SCRIPT_WORKERS,
+    BatchStage,
+    format_batch_summary,
+    read_batch_items,
+    run_batch,
+)
+from backend.utils.checkpoints import StageCheckpoints
+from backend.utils.jobs import JOB_DIR, Job, JobQueueFullError, get_job_manager, run_directory
+from backend.utils.pipeline_events import bound_emitter, event_sink, format_sse, pipeline_stage
+from backend.utils.preflight import preflight_script
+from backend.utils.render_concurrency import calibrate_render_concurrency
+from backend.utils.remotion_bundle import get_remotion_bundle
+from backend.utils.render_profiles import RenderProfileName
+from backend.utils.renditions import check_renditions, transcode_renditions
+from backend.utils.render_progress import RenderProgress, clear_render_progress, get_render_progress, publish_render_progress
+from backend.utils.llm_metrics import aggregate_llm_calls, llm_metrics, read_llm_calls
 from backend.type import Text, RichContent
 
 # Load logger
@@ -65,21 +95,27 @@ def generate_paper(method: Literal["arxiv_gpt", "arxiv_html", "pdf"], paper_id:
     logger.info(
         f"Generating paper markdown using method: {method} and paper_id: {paper_id}"
     )
-    paper = process_article(method, paper_id, pdf_path)
+    with pipeline_stage("generate_paper", method=method):
+        paper = process_article(method, paper_id, pdf_path)
     return paper
 
 
 @cli.command("generate_script")
 @api.post("/generate_script/")
-def generate_script(method: Literal["openai","local","gemini","openrouter","groq"], paper_markdown: str,paper_id: str, end_point_base_url : str=None, from_pdf: bool=False) -> str:
+def generate_script(method: Literal["openai","local","gemini","openrouter","groq","routed"], paper_markdown: str,paper_id: str, end_point_base_url : str=None, from_pdf: bool=False, repair: bool=False, strategy: Literal["single", "map_reduce"]="single") -> str:
     """Generate video script from paper markdown using an LLM
 
     Parameters
     ----------
-    method : "openai"
-        The method to generate script
+    method : "openai" | "local" | "gemini" | "openrouter" | "groq" | "routed"
+        The method to generate script, "routed" picks among the configured
+        providers and hedges slow requests
     paper_markdown : str
         The paper markdown
+    repair : bool, optional
+        Only regenerate the components failing validation, by default False
+    strategy : "single" | "map_reduce", optional
+        How to handle long papers, see `process_script`, by default "single"
 
     Returns
     -------
@@ -89,10 +125,86 @@ def generate_script(method: Literal["openai","local","gemini","openrouter","groq
     if from_pdf:
         paper_id = "paper_id"
     logger.info(f"Generating script from paper: \n{paper_markdown}")
-    script = process_script(method, paper_markdown,paper_id,end_point_base_url,from_pdf)
+    with pipeline_stage("generate_script", method=method, strategy=strategy):
+        script = process_script(method, paper_markdown,paper_id,end_point_base_url,from_pdf,repair,strategy)
     return script
 
 
+@cli.command("llm_metrics")
+def get_llm_metrics(path: str = None) -> dict:
+    """Aggregate the metrics of the LLM calls per provider/model
+
+    Parameters
+    ----------
+    path : str, optional
+        A JSON lines metrics file (see LLM_METRICS_PATH) to aggregate, by
+        default the calls made by this process
+
+    Returns
+    -------
+    dict
+        Calls, failures, retries, validation failures, tokens and latency for
+        each provider/model
+    """
+    summary = aggregate_llm_calls(read_llm_calls(path)) if path else llm_metrics.summary()
+    logger.info(f"LLM metrics: {json.dumps(summary, indent=2)}")
+    return summary
+
+
+@api.get("/llm_metrics/")
+def get_api_llm_metrics() -> dict:
+    """Aggregate the metrics of the LLM calls made by the API process per provider/model
+
+    Unlike the CLI command, it reads no metrics file: a client must not
+    choose a file of the server to open.
+
+    Returns
+    -------
+    dict
+        Calls, failures, retries, validation failures, tokens and latency for
+        each provider/model
+    """
+    return get_llm_metrics()
+
+
+@cli.command("preflight")
+@api.post("/preflight/")
+def preflight(
+    script: str,
+    method: Literal["elevenlabs", "lmnt", "kokoro"] = "kokoro",
+    workspace: str = "public",
+    repair: bool = True,
+) -> dict:
+    """Check a script before generating its assets
+
+    Figure links are checked concurrently, equations are parsed, and the
+    narration length, its cost and the disk space needed are estimated.
+
+    Parameters
+    ----------
+    script : str
+        The video script
+    method : "elevenlabs" | "lmnt" | "kokoro", optional
+        The method that will generate the audio, by default "kokoro"
+    workspace : str, optional
+        The directory the assets and the video will be written to, by
+        default "public"
+    repair : bool, optional
+        Remove unreachable figures and invalid equations instead of failing,
+        by default True
+
+    Returns
+    -------
+    dict
+        The repaired script, what was repaired and the estimates; raises a
+        PreflightError listing the problems if the script can't be used
+    """
+    with pipeline_stage("preflight"):
+        report = asdict(preflight_script(script, method, Path(workspace), repair))
+    logger.info(f"Preflight: {json.dumps({key: value for key, value in report.items() if key != 'script'}, indent=2)}")
+    return report
+
+
 @cli.command("generate_assets")
 @api.post("/generate_assets/")
 def generate_assets(
@@ -101,6 +213,7 @@ def generate_assets(
     mp3_output: str = "public/audio.wav",
     srt_output: str = "public/output.srt",
     rich_output: str = "public/output.json",
+    segment_dir: str = None,
 ) -> float:
     """Generate audio, caption, and rich content assets from script
 
@@ -116,6 +229,9 @@ def generate_assets(
         The output srt file path, by default "public/output.srt"
     rich_output : str, optional
         The output rich content json file path, by default "public/output.json
+    segment_dir : str, optional
+        Checkpoint the audio and captions of each text in this directory, and
+        reuse those of texts already generated there, by default None
 
     Returns
     -------
@@ -134,7 +250,9 @@ def generate_assets(
     os.makedirs(os.path.dirname(rich_output), exist_ok=True)
 
     # Generate audio and caption for each text content
-    script_contents = generate_audio_and_caption(method, script)
+    texts = sum(line.startswith("\\Text: ") for line in script.split("\n"))
+    with pipeline_stage("tts", method=method, texts=texts):
+        script_contents = generate_audio_and_caption(method, script, Path(segment_dir) if segment_dir else None)
     # Fill the time for each RichContent
     script_contents = fill_rich_content_time(script_contents)
 
@@ -142,14 +260,22 @@ def generate_assets(
     rich_content = [c for c in script_contents if isinstance(c, RichContent)]
     text_content = [c for c in script_contents if isinstance(c, Text)]
 
-    # Export mp3
-    export_mp3(text_content, mp3_output, offset=0.5)
+    # Export mp3, and where each text is in it for incremental renders
+    with pipeline_stage("merge_audio"):
+        segments = export_mp3(text_content, mp3_output, offset=0.5)
+        export_segments_json(segments, str(Path(mp3_output).parent / SCRIPT_SEGMENTS_NAME))
+
+    # Precompute the waveform displayed by the video
+    with pipeline_stage("audio_viz"):
+        ensure_audio_viz(Path(mp3_output).parent, Path(mp3_output))
 
     # Export srt
-    export_srt(mp3_output, srt_output)
+    with pipeline_stage("asr"):
+        export_srt(mp3_output, srt_output)
 
     # Export rich content
-    export_rich_content_json(rich_content, rich_output)
+    with pipeline_stage("rich_content"):
+        export_rich_content_json(rich_content, rich_output)
 
     # Remove temp_dir
     temp_dir.cleanup()
@@ -163,7 +289,15 @@ def generate_assets(
 def generate_video(
     input_dir: str,
     output_video: str,
-):
+    renderer: Literal["cli", "daemon"] = REMOTION_RENDERER,
+    concurrency: str = REMOTION_CONCURRENCY,
+    chunks: int = 1,
+    layered: bool = False,
+    profile: RenderProfileName = "final",
+    renditions: Annotated[list[str], fastapi.Query()] = None,
+    frame_profile: bool = False,
+    incremental: bool = False,
+) -> dict:
     """Generate video from input directory.
     The input directory should contain subtitles.srt, audio.wav, and rich.json files.
 
@@ -173,6 +307,48 @@ def generate_video(
         The input directory containing subtitles.srt, audio.wav, and rich.json
     output_video : str
         Path of the output video
+    renderer : "cli" | "daemon", optional
+        Spawn `remotion render` for this video, or use the long-lived render
+        service with warm browsers, by default REMOTION_RENDERER ("cli")
+    concurrency : str, optional
+        Number of browser tabs rendering frames in parallel, or "auto" to pick
+        it from the calibration or the cores and memory, by default
+        REMOTION_CONCURRENCY ("auto")
+    chunks : int, optional
+        Split the frames in this many chunks rendered by parallel processes,
+        then concatenated without re-encoding, by default 1
+    layered : bool, optional
+        Render figures and headlines once per still segment and only the
+        subtitles and waveform as a video, then compose them with ffmpeg, by
+        default False
+    profile : "final" | "draft" | "storyboard", optional
+        "draft" renders a quick preview from the same assets at half the
+        resolution and fps, with cheaper encoder settings and a simpler
+        waveform; "storyboard" only renders one still per figure, headline
+        or equation, played over the narration, by default "final"
+    renditions : list[str], optional
+        Renditions to produce from the rendered video ("1080p", "720p",
+        "vertical"), transcoded in parallel next to it as
+        ``<output>_<rendition>.mp4``; only with the "final" profile, by
+        default none
+    frame_profile : bool, optional
+        Time every frame (daemon renderer only) and write the mean render
+        time of each component (subtitles and waveform, figure, headline,
+        equation, transitions) and the slowest frames to
+        ``<output>.profile.json``, by default False
+    incremental : bool, optional
+        If output_video was rendered before with the same settings, only
+        render the script segments that changed since (padded to keyframes)
+        and splice them with the rest of it without re-encoding, by default
+        False
+
+    The progress of the render (frames, fps and ETA) is logged and served by
+    the render_progress endpoint while it runs.
+
+    Returns
+    -------
+    dict
+        The path and time in seconds of the render and of each rendition
     """
     _input_dir = Path(input_dir)
     _output_video = Path(output_video)
@@ -189,7 +365,621 @@ def generate_video(
     if not (_input_dir / "rich.json").exists():
         raise FileNotFoundError(f"Rich content file does not exist in {_input_dir}")
 
-    process_video(_input_dir, _output_video)
+    check_renditions(renditions or [], profile)
+
+    # Progress is reported from the threads of the renderer
+    emit = bound_emitter()
+
+    def on_progress(progress: RenderProgress):
+        logger.info(f"Rendering {_output_video.name}: {progress}")
+        publish_render_progress(str(_output_video), progress)
+        emit("render_progress", **asdict(progress))
+
+    start = time.perf_counter()
+    with pipeline_stage("render", profile=profile):
+        try:
+            process_video(
+                _input_dir,
+                _output_video,
+                renderer=renderer,
+                concurrency=concurrency,
+                chunks=chunks,
+                layered=layered,
+                profile=profile,
+                on_progress=on_progress,
+                frame_profile=frame_profile,
+                incremental=incremental,
+            )
+        finally:
+            clear_render_progress(str(_output_video))
+    timings = {"master": {"path": str(_output_video), "seconds": round(time.perf_counter() - start, 3)}}
+    if renditions:
+        with pipeline_stage("renditions", renditions=renditions):
+            timings["renditions"] = transcode_renditions(_output_video, renditions)
+        logger.info(
+            "Renditions: "
+            + ", ".join(f"{name} {timing['seconds']:.1f}s" for name, timing in timings["renditions"].items())
+        )
+    return timings
+
+
+# Settings of a pipeline run when neither given nor recorded by the run being resumed
+PIPELINE_DEFAULTS = {
+    "paper_id": None,
+    "method_paper": "arxiv_html",
+    "method_script": "openrouter",
+    "method_audio": "kokoro",
+    "pdf_path": None,
+    "end_point_base_url": None,
+    "repair": False,
+    "strategy": "single",
+    "profile": "final",
+}
+PIPELINE_PARAMS_NAME = "params.json"
+PipelineStageName = Literal["markdown", "script", "preflight", "audio", "subtitles", "rich", "video"]
+
+
+@cli.command("generate_pipeline")
+@api.post("/generate_pipeline/")
+def generate_pipeline(
+    paper_id: str = None,
+    method_paper: Literal["arxiv_gpt", "arxiv_html", "pdf"] = None,
+    method_script: Literal["openai","local","gemini","openrouter","groq","routed"] = None,
+    method_audio: Literal["elevenlabs", "lmnt", "kokoro"] = None,
+    pdf_path: str = None,
+    end_point_base_url: str = None,
+    repair: bool = None,
+    strategy: Literal["single", "map_reduce"] = None,
+    profile: RenderProfileName = None,
+    resume: str = None,
+    until: PipelineStageName = None,
+) -> dict:
+    """Run every stage from the paper to the video, checkpointing each one
+
+    The run writes everything to ``JOB_DIR/<run id>/``. Each stage (paper
+    markdown, script, preflight, audio of each text with its captions,
+    merged audio, subtitles, rich content, video) records a hash of its
+    inputs and outputs in ``checkpoints.json``. Resuming a run skips the
+    stages whose checkpoint is still valid and starts from the first one
+    that is not.
+
+    Parameters
+    ----------
+    paper_id : str, optional
+        The arXiv paper id, not needed with method_paper "pdf"
+    method_paper : "arxiv_gpt" | "arxiv_html" | "pdf", optional
+        The method to generate the paper markdown, by default "arxiv_html"
+    method_script : "openai" | "local" | "gemini" | "openrouter" | "groq" | "routed", optional
+        The method to generate the script, by default "openrouter"
+    method_audio : "elevenlabs" | "lmnt" | "kokoro", optional
+        The method to generate the audio, by default "kokoro"
+    pdf_path : str, optional
+        The paper, with method_paper "pdf"
+    end_point_base_url : str, optional
+        The LLM API base URL, with method_script "local"
+    repair : bool, optional
+        Only regenerate the script components failing validation, see
+        generate_script, by default False
+    strategy : "single" | "map_reduce", optional
+        How the script handles long papers, see generate_script, by default
+        "single"
+    profile : "final" | "draft" | "storyboard", optional
+        The render profile, by default "final"
+    resume : str, optional
+        The id of a run to resume. The settings not given are those of that
+        run. By default a new run is started.
+    until : "markdown" | "script" | "preflight" | "audio" | "subtitles" | "rich" | "video", optional
+        Stop after this stage, to run the next ones later with ``resume``, by
+        default every stage runs
+
+    Returns
+    -------
+    dict
+        The run id and directory, the video (None when stopped before it),
+        and for each stage that ran whether it "ran" or "reused" its checkpoint
+    """
+    settings = dict(
+        paper_id=paper_id, method_paper=method_paper, method_script=method_script, method_audio=method_audio,
+        pdf_path=pdf_path, end_point_base_url=end_point_base_url, repair=repair, strategy=strategy,
+        profile=profile,
+    )
+    run_id = resume or uuid.uuid4().hex[:12]
+    run_dir = run_directory(run_id)
+    recorded = {}
+    if resume:
+        if not run_dir.is_dir():
+            raise FileNotFoundError(f"No run {resume} in {JOB_DIR}")
+        if (run_dir / PIPELINE_PARAMS_NAME).exists():
+            recorded = json.loads((run_dir / PIPELINE_PARAMS_NAME).read_text())
+    settings = {
+        name: value if value is not None else recorded.get(name, PIPELINE_DEFAULTS[name])
+        for name, value in settings.items()
+    }
+    from_pdf = settings["method_paper"] == "pdf"
+    if from_pdf and not settings["pdf_path"]:
+        raise ValueError("pdf_path is required with method_paper 'pdf'")
+    if not from_pdf and not settings["paper_id"]:
+        raise ValueError("paper_id is required")
+    checkpoints = StageCheckpoints(run_dir)
+    (run_dir / PIPELINE_PARAMS_NAME).write_text(json.dumps(settings, indent=2))
+    logger.info(f"Pipeline run {run_id} in {run_dir}")
+
+    markdown = run_dir / "paper.md"
+    script_path = run_dir / "script.txt"
+    checked_script_path = run_dir / "script.checked.txt"
+    audio = run_dir / "audio.wav"
+    subtitles = run_dir / "subtitles.srt"
+    rich = run_dir / "rich.json"
+    video = run_dir / "output.mp4"
+
+    script_contents = []
+
+    def load_script_contents() -> list:
+        # The audio and captions of each text are checkpointed in segments/ as
+        # they are generated, so this only calls the TTS for the missing ones
+        if not script_contents:
+            script = checked_script_path.read_text()
+            texts = sum(line.startswith("\\Text: ") for line in script.split("\n"))
+            with pipeline_stage("tts", method=settings["method_audio"], texts=texts):
+                contents = generate_audio_and_caption(settings["method_audio"], script, run_dir / "segments")
+            script_contents.extend(fill_rich_content_time(contents))
+        return script_contents
+
+    def merge_audio() -> None:
+        text_content = [c for c in load_script_contents() if isinstance(c, Text)]
+        with pipeline_stage("merge_audio"):
+            segments = export_mp3(text_content, str(audio), offset=0.5)
+            export_segments_json(segments, str(run_dir / SCRIPT_SEGMENTS_NAME))
+        with pipeline_stage("audio_viz"):
+            ensure_audio_viz(run_dir, audio)
+
+    def export_subtitles() -> None:
+        with pipeline_stage("asr"):
+            export_srt(str(audio), str(subtitles))
+
+    def export_rich() -> None:
+        rich_content = [c for c in load_script_contents() if isinstance(c, RichContent)]
+        with pipeline_stage("rich_content"):
+            export_rich_content_json(rich_content, str(rich))
+
+    # Name, inputs (files are hashed when the stage is checked), outputs and
+    # what produces them, in order
+    pipeline = [
+        (
+            "markdown",
+            [settings["method_paper"], settings["paper_id"], Path(settings["pdf_path"]) if from_pdf else None],
+            [markdown],
+            lambda: markdown.write_text(
+                generate_paper(settings["method_paper"], settings["paper_id"] or "paper_id", settings["pdf_path"])
+            ),
+        ),
+        (
+            "script",
+            [
+                markdown, settings["method_script"], settings["paper_id"], settings["end_point_base_url"], from_pdf,
+                settings["repair"], settings["strategy"],
+            ],
+            [script_path],
+            lambda: script_path.write_text(generate_script(
+                settings["method_script"], markdown.read_text(), settings["paper_id"] or "paper_id",
+                settings["end_point_base_url"], from_pdf=from_pdf,
+                repair=settings["repair"], strategy=settings["strategy"],
+            )),
+        ),
+        (
+            "preflight",
+            [script_path, settings["method_audio"]],
+            [checked_script_path],
+            lambda: checked_script_path.write_text(
+                preflight(script_path.read_text(), settings["method_audio"], workspace=str(run_dir))["script"]
+            ),
+        ),
+        ("audio", [checked_script_path, settings["method_audio"]], [audio, run_dir / SCRIPT_SEGMENTS_NAME], merge_audio),
+        ("subtitles", [audio], [subtitles], export_subtitles),
+        ("rich", [checked_script_path, audio], [rich], export_rich),
+        (
+            "video",
+            [audio, subtitles, rich, settings["profile"]],
+            [video],
+            lambda: generate_video(str(run_dir), str(video), profile=settings["profile"]),
+        ),
+    ]
+    stages = {}
+    for name, inputs, outputs, produce in pipeline:
+        ran = checkpoints.run(name, inputs, [output.name for output in outputs], produce)
+        stages[name] = "ran" if ran else "reused"
+        if name == until:
+            break
+    logger.info(f"Pipeline run {run_id}: " + ", ".join(f"{name} {state}" for name, state in stages.items()))
+    return {"run": run_id, "dir": str(run_dir), "video": str(video) if "video" in stages else None, "stages": stages}
+
+
+@cli.command("generate_batch")
+def generate_batch(
+    ids_file: str,
+    method_paper: Literal["arxiv_gpt", "arxiv_html"] = "arxiv_html",
+    method_script: Literal["openai","local","gemini","openrouter","groq","routed"] = "openrouter",
+    method_audio: Literal["elevenlabs", "lmnt", "kokoro"] = "kokoro",
+    end_point_base_url: str = None,
+    repair: bool = False,
+    strategy: Literal["single", "map_reduce"] = "single",
+    profile: RenderProfileName = "final",
+    script_workers: int = BATCH_SCRIPT_WORKERS,
+    asset_workers: int = BATCH_ASSET_WORKERS,
+    render_workers: int = BATCH_RENDER_WORKERS,
+    summary_output: str = None,
+) -> dict:
+    """Generate the videos of many papers, overlapping the stages of different papers
+
+    Each paper goes through three stages, each with its own workers: the
+    script (paper markdown, script and preflight), the assets (narration,
+    subtitles and rich content) and the render. So the script of a paper is
+    generated while the previous one renders. Each paper is a checkpointed
+    pipeline run ``batch_<paper id>`` (see generate_pipeline), so running
+    the batch again resumes the papers that failed.
+
+    Parameters
+    ----------
+    ids_file : str
+        A file with one arXiv paper id per line, ``#`` starts a comment
+    method_paper : "arxiv_gpt" | "arxiv_html", optional
+        The method to generate the paper markdown, by default "arxiv_html"
+    method_script : "openai" | "local" | "gemini" | "openrouter" | "groq" | "routed", optional
+        The method to generate the scripts, by default "openrouter"
+    method_audio : "elevenlabs" | "lmnt" | "kokoro", optional
+        The method to generate the audio, by default "kokoro"
+    end_point_base_url : str, optional
+        The LLM API base URL, with method_script "local"
+    repair : bool, optional
+        Only regenerate the script components failing validation, by default
+        False
+    strategy : "single" | "map_reduce", optional
+        How the scripts handle long papers, by default "single"
+    profile : "final" | "draft" | "storyboard", optional
+        The render profile, by default "final"
+    script_workers : int, optional
+        Papers generating their script at the same time, by default
+        BATCH_SCRIPT_WORKERS (4)
+    asset_workers : int, optional
+        Papers generating their assets at the same time, by default
+        BATCH_ASSET_WORKERS (2)
+    render_workers : int, optional
+        Papers rendering at the same time, by default BATCH_RENDER_WORKERS (1)
+    summary_output : str, optional
+        Also write the summary as JSON to this file, by default None
+
+    Returns
+    -------
+    dict
+        The throughput summary (papers done and failed, papers per hour,
+        speedup over running them one after the other, time and utilization
+        of each stage) and the result and video of each paper
+    """
+    paper_ids = read_batch_items(Path(ids_file).read_text())
+    settings = dict(
+        method_paper=method_paper, method_script=method_script, method_audio=method_audio,
+        end_point_base_url=end_point_base_url, repair=repair, strategy=strategy, profile=profile,
+    )
+
+    def run_id(paper_id: str) -> str:
+        return "batch_" + re.sub(r"[^\w.-]", "_", paper_id)
+
+    def pipeline_until(until: PipelineStageName | None):
+        def run(paper_id: str) -> dict:
+            run_directory(run_id(paper_id)).mkdir(parents=True, exist_ok=True)
+            return generate_pipeline(paper_id=paper_id, resume=run_id(paper_id), until=until, **settings)
+        return run
+
+    logger.info(f"Generating the videos of {len(paper_ids)} papers")
+    summary = run_batch(
+        paper_ids,
+        [
+            BatchStage("script", script_workers, pipeline_until("preflight")),
+            BatchStage("assets", asset_workers, pipeline_until("rich")),
+            BatchStage("render", render_workers, pipeline_until(None)),
+        ],
+    )
+    for result in summary["results"]:
+        if result["error"] is None:
+            result["video"] = str(JOB_DIR / run_id(result["item"]) / "output.mp4")
+    logger.info(f"Batch summary:\n{format_batch_summary(summary)}")
+    if summary_output:
+        Path(summary_output).write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+@api.get("/render_progress/")
+def render_progress(output_video: str) -> dict:
+    """Return the latest progress of a video being generated
+
+    Parameters
+    ----------
+    output_video : str
+        The output_video of the generate_video call
+
+    Returns
+    -------
+    dict
+        The frames done, the total frames, the frames per second, the ETA and
+        the elapsed time in seconds, empty if no render of it is running
+    """
+    return get_render_progress(output_video) or {}
+
+
+# Stages that can run as background jobs through the API
+JOB_STAGES = {
+    "generate_paper": generate_paper,
+    "generate_script": generate_script,
+    "preflight": preflight,
+    "generate_assets": generate_assets,
+    "generate_video": generate_video,
+    "generate_pipeline": generate_pipeline,
+}
+JobStage = Literal[
+    "generate_paper", "generate_script", "preflight", "generate_assets", "generate_video", "generate_pipeline"
+]
+# Longest wait of a request for new job events
+JOB_EVENTS_MAX_WAIT = 30.0
+# Seconds between two looks for new job events by a waiting request, which
+# sleeps on the event loop rather than blocking a worker thread
+JOB_EVENTS_POLL_INTERVAL = 0.5
+
+
+def _job_output_defaults(kind: str, job_dir: Path) -> dict:
+    """Outputs of a job not given by the client, in the job directory so concurrent jobs don't overwrite each other."""
+    if kind == "generate_assets":
+        return {
+            "mp3_output": str(job_dir / "audio.wav"),
+            "srt_output": str(job_dir / "subtitles.srt"),
+            "rich_output": str(job_dir / "rich.json"),
+        }
+    if kind == "generate_video":
+        return {"output_video": str(job_dir / "output.mp4")}
+    if kind == "generate_pipeline":
+        # The run of a pipeline job is the job directory: resume it with {"resume": <job id>}
+        return {"resume": job_dir.name}
+    return {}
+
+
+def _run_job(job: Job):
+    """Run the stage of a job and record the files it produced as artifacts."""
+    job.params = {**_job_output_defaults(job.kind, job.dir), **job.params}
+    if job.kind in ("generate_assets", "generate_video", "generate_pipeline"):
+        job.dir.mkdir(parents=True, exist_ok=True)
+    with event_sink(lambda type, data: job.add_event(type, **data)):
+        result = JOB_STAGES[job.kind](**job.params)
+    if job.kind == "generate_assets":
+        job.artifacts = {
+            "audio": job.params["mp3_output"],
+            "subtitles": job.params["srt_output"],
+            "rich": job.params["rich_output"],
+        }
+    elif job.kind == "generate_video":
+        job.artifacts["video"] = result["master"]["path"]
+        for name, rendition in result.get("renditions", {}).items():
+            job.artifacts[name] = rendition["path"]
+        frame_profile = Path(result["master"]["path"]).with_suffix(".profile.json")
+        if frame_profile.exists():
+            job.artifacts["frame_profile"] = str(frame_profile)
+    elif job.kind == "generate_pipeline":
+        run_dir = Path(result["dir"])
+        for name, file_name in (
+            ("markdown", "paper.md"), ("script", "script.checked.txt"), ("audio", "audio.wav"),
+            ("subtitles", "subtitles.srt"), ("rich", "rich.json"), ("video", "output.mp4"),
+        ):
+            job.artifacts[name] = str(run_dir / file_name)
+    return result
+
+
+def _get_job(job_id: str) -> Job:
+    try:
+        return get_job_manager().get(job_id)
+    except KeyError:
+        raise fastapi.HTTPException(status_code=404, detail=f"No job {job_id}")
+
+
+@api.post("/jobs/{kind}/", status_code=202)
+def submit_job(kind: JobStage, params: dict = fastapi.Body(default={})) -> dict:
+    """Run a stage in the background and return its job at once
+
+    Parameters
+    ----------
+    kind : "generate_paper" | "generate_script" | "preflight" | "generate_assets" | "generate_video" | "generate_pipeline"
+        The stage to run, or the whole checkpointed pipeline
+    params : dict, optional
+        The arguments of the stage, as a JSON body. The output paths of
+        generate_assets and generate_video default to the job directory.
+
+    Returns
+    -------
+    dict
+        The queued job; poll it with GET /jobs/{id}/
+    """
+    try:
+        inspect.signature(JOB_STAGES[kind]).bind(**{**_job_output_defaults(kind, Path()), **params})
+    except TypeError as e:
+        raise fastapi.HTTPException(status_code=422, detail=f"Invalid parameters for {kind}: {e}")
+    try:
+        job = get_job_manager().submit(kind, params, _run_job)
+    except JobQueueFullError as e:
+        raise fastapi.HTTPException(status_code=429, detail=str(e))
+    return job.to_dict()
+
+
+@api.get("/jobs/")
+def list_jobs() -> list[dict]:
+    """Return the jobs, oldest first"""
+    return [job.to_dict() for job in get_job_manager().list()]
+
+
+@api.get("/jobs/{job_id}/")
+def get_job(job_id: str) -> dict:
+    """Return the status of a job, its result once done, and its render progress while it renders
+
+    Parameters
+    ----------
+    job_id : str
+        The job id
+
+    Returns
+    -------
+    dict
+        The status, times, result or error, artifact names and event count
+        of the job
+    """
+    job = _get_job(job_id)
+    status = job.to_dict()
+    if job.kind == "generate_video" and job.status == "running":
+        status["progress"] = get_render_progress(job.params["output_video"])
+    return status
+
+
+async def _wait_job_events(job: Job, after: int, wait: float) -> tuple[list[dict], bool]:
+    # Like job.wait_events, polling so that the wait holds no thread
+    deadline = time.monotonic() + wait
+    while True:
+        events, finished = job.wait_events(after)
+        if events or finished or time.monotonic() >= deadline:
+            return events, finished
+        await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+
+
+@api.get("/jobs/{job_id}/events/")
+async def get_job_events(job_id: str, after: int = 0, wait: float = 0.0) -> dict:
+    """Return the events of a job, optionally waiting for new ones
+
+    Parameters
+    ----------
+    job_id : str
+        The job id
+    after : int, optional
+        Id of the first event to return, the ``next`` of the previous call,
+        by default 0
+    wait : float, optional
+        Seconds to wait for a new event if there is none yet (long polling),
+        at most JOB_EVENTS_MAX_WAIT, by default 0.0
+
+    Returns
+    -------
+    dict
+        The new events, the ``after`` of the next call and whether the job
+        is finished
+    """
+    job = _get_job(job_id)
+    events, finished = await _wait_job_events(job, after, min(max(wait, 0.0), JOB_EVENTS_MAX_WAIT))
+    return {"events": events, "next": events[-1]["id"] + 1 if events else after, "finished": finished}
+
+
+@api.get("/jobs/{job_id}/stream/")
+async def stream_job_events(job_id: str, after: int = 0, last_event_id: int = fastapi.Header(default=None)) -> StreamingResponse:
+    """Stream the events of a job as server-sent events until it finishes
+
+    Each event is named after its type: "queued", "started", "stage_start",
+    "stage_end" (with the seconds the stage took), "stage_error",
+    "tts_segment", "render_progress" (only the latest of a run of them is
+    kept), and "succeeded", "failed" or "cancelled" last. A client
+    reconnecting with Last-Event-ID gets the events it missed.
+
+    Parameters
+    ----------
+    job_id : str
+        The job id
+    after : int, optional
+        Id of the first event to send, by default 0
+    """
+    job = _get_job(job_id)
+    if last_event_id is not None:
+        after = last_event_id + 1
+
+    async def stream():
+        next_id = after
+        while True:
+            events, finished = await _wait_job_events(job, next_id, JOB_EVENTS_MAX_WAIT)
+            for event in events:
+                yield format_sse(event, event["id"])
+            if events:
+                next_id = events[-1]["id"] + 1
+            if finished:
+                return
+            if not events:
+                # Keep proxies from closing an idle connection
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@api.post("/jobs/{job_id}/cancel/")
+def cancel_job(job_id: str) -> dict:
+    """Cancel a job that has not started yet
+
+    Returns
+    -------
+    dict
+        The job; a running job can't be cancelled and is returned unchanged
+    """
+    job = _get_job(job_id)
+    get_job_manager().cancel(job_id)
+    return job.to_dict()
+
+
+@api.get("/jobs/{job_id}/artifacts/{name}")
+def get_job_artifact(job_id: str, name: str) -> FileResponse:
+    """Download a file produced by a job
+
+    Parameters
+    ----------
+    job_id : str
+        The job id
+    name : str
+        The artifact, one of the ``artifacts`` of the job ("audio",
+        "subtitles", "rich", "video", a rendition or "frame_profile")
+    """
+    job = _get_job(job_id)
+    if name not in job.artifacts or not Path(job.artifacts[name]).exists():
+        raise fastapi.HTTPException(status_code=404, detail=f"Job {job_id} has no artifact {name}")
+    path = Path(job.artifacts[name])
+    return FileResponse(path, filename=f"{job_id}_{path.name}")
+
+
+@cli.command("build_bundle")
+def build_bundle(force: bool = False) -> str:
+    """Build the Remotion bundle used by generate_video ahead of the first render
+
+    Parameters
+    ----------
+    force : bool, optional
+        Rebuild the bundle even if the frontend did not change, by default False
+
+    Returns
+    -------
+    str
+        The bundle directory
+    """
+    bundle_dir = get_remotion_bundle(force=force)
+    logger.info(f"Remotion bundle: {bundle_dir}")
+    return str(bundle_dir)
+
+
+@cli.command("calibrate_render")
+def calibrate_render(levels: list[int] = None) -> dict:
+    """Measure the render throughput at several concurrency levels
+
+    The best level is recorded and used by the "auto" concurrency afterwards.
+
+    Parameters
+    ----------
+    levels : list[int], optional
+        The concurrency levels to measure, by default powers of two up to the
+        number of cores
+
+    Returns
+    -------
+    dict
+        The cores, the frames per second of each level and the best level
+    """
+    calibration = calibrate_render_concurrency(levels)
+    logger.info(f"Render calibration: {json.dumps(calibration, indent=2)}")
+    return calibration
 
 
 if __name__ == "__main__":
@@ -3,7 +3,6 @@ from typing import List, Literal, Union
 from enum import Enum
 import re
 import logging
-import requests
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +12,7 @@ class ScriptComponentType(str):
     EQUATION = "Equation"
     HEADLINE = "Headline"
 
-class ScriptComponent(BaseModel):
+class ScriptComponentDraft(BaseModel):
     component_type: str = Field(
         ...,
         description="""Type of script component
@@ -42,37 +41,233 @@ class ScriptComponent(BaseModel):
         examples=[0, 1, 2, 3]
     )
 
-    @model_validator(mode='after')
-    def validate_content(cls, values):
-        component_type = values.component_type
-        logger.info(f"Validating script structure")
-        
-        # if component_type == ScriptComponentType.FIGURE:
-        #     pattern = r'^https://arxiv\.org/html/\d{4}\.\d{4,5}(/.*)?$'
-        #     if not re.match(pattern, values.content):
-        #         raise ValueError("Figure URL must start with 'https://arxiv.org/html/' followed by paper ID")
-        
-        if component_type == ScriptComponentType.EQUATION:
-            if '$' in values.content or r'\[' in values.content or '\n' in values.content:
-                raise ValueError("Equation must not contain $, \\[, or multiple lines")
-        
-        elif component_type == ScriptComponentType.TEXT:
-            if re.search(r'^\s*[-\d]\.\s', values.content):
-                raise ValueError("Text must not contain markdown listing patterns")
-            
-            if len(values.content.strip()) < 10:
-                raise ValueError("Text component must contain at least 10 characters")
-        elif component_type.strip() not in ["Text", "Figure", "Equation", "Headline"]:
-            raise ValueError(f"""{component_type} is not a valide component_type.
+
+def find_component_errors(component: ScriptComponentDraft) -> list[str]:
+    """Return the validation errors of a single script component.
+
+    Parameters
+    ----------
+    component : ScriptComponentDraft
+        The component to check
+
+    Returns
+    -------
+    list[str]
+        The error messages, empty if the component is valid
+    """
+    errors = []
+    component_type = component.component_type.strip()
+
+    # if component_type == ScriptComponentType.FIGURE:
+    #     pattern = r'^https://arxiv\.org/html/\d{4}\.\d{4,5}(/.*)?$'
+    #     if not re.match(pattern, component.content):
+    #         raise ValueError("Figure URL must start with 'https://arxiv.org/html/' followed by paper ID")
+
+    if component_type == ScriptComponentType.EQUATION:
+        if '$' in component.content or r'\[' in component.content or '\n' in component.content:
+            errors.append("Equation must not contain $, \\[, or multiple lines")
+
+    elif component_type == ScriptComponentType.TEXT:
+        if re.search(r'^\s*[-\d]\.\s', component.content):
+            errors.append("Text must not contain markdown listing patterns")
+
+        if len(component.content.strip()) < 10:
+            errors.append("Text component must contain at least 10 characters")
+    elif component_type not in ["Text", "Figure", "Equation", "Headline"]:
+        errors.append(f"""{component.component_type} is not a valide component_type.
                              Type of autorized script component
                                     Only one of : 
                                     - Text 
                                     - Figure, 
                                     - Equation,
                                     - Headline""")
-        
+    return errors
+
+
+FIGURE_LINK_ERROR = """Figure link is not accessible: {link}. Provide the exact figure link that is present in the paper
+
+Remember the exemples of extraction : 
+<example_figures>
+![](https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png) is rendered as "https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png"
+![](ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png) is rendered as "ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png"
+<example_figures>"""
+
+
+def check_figure_links(components: List[ScriptComponentDraft], paper_content: str, rewrite: bool = False) -> dict[int, str]:
+    """Check that the remote figures of a script are reachable.
+
+    Only figures taken from the paper are probed, all of them concurrently,
+    and the results are shared with every other validation of the process.
+
+    Parameters
+    ----------
+    components : List[ScriptComponentDraft]
+        The script components
+    paper_content : str
+        The paper the script was generated from
+    rewrite : bool, optional
+        Replace each link by the candidate that actually serves the image, by default False
+
+    Returns
+    -------
+    dict[int, str]
+        The error message of each position holding an unreachable figure
+    """
+    # Imported here, backend.utils imports this module when loaded
+    from backend.utils.figure_links import resolve_figure_links
+
+    figures = [
+        comp for comp in components
+        if comp.component_type.strip() == ScriptComponentType.FIGURE
+        and comp.content in paper_content
+        and comp.content.startswith(("http://", "https://"))
+    ]
+    resolved = resolve_figure_links([comp.content for comp in figures])
+    errors = {}
+    for comp in figures:
+        if resolved[comp.content] is None:
+            errors[comp.position] = FIGURE_LINK_ERROR.format(link=comp.content)
+        elif rewrite:
+            comp.content = resolved[comp.content]
+    return errors
+
+
+class ScriptComponent(ScriptComponentDraft):
+
+    @model_validator(mode='after')
+    def validate_content(cls, values):
+        logger.info(f"Validating script structure")
+        errors = find_component_errors(values)
+        if errors:
+            raise ValueError(errors[0])
         return values
 
+
+class ArxflixScriptDraft(BaseModel):
+    """Script as first produced by the model, before any structural check.
+
+    Used by the repair loop so that a single bad component does not reject
+    the whole script.
+    """
+    title: str = Field(..., description="Title of the research paper")
+    paper_id: str = Field(..., description="ArXiv paper ID (e.g., '2405.11273')")
+    target_duration_minutes: float = Field(
+        ...,
+        ge=0,
+        le=6,
+        description="Target video duration in minutes",
+    )
+    components: List[ScriptComponentDraft] = Field(..., description="List of script components")
+
+
+def find_script_errors(components: List[ScriptComponentDraft], paper_content: str) -> dict[int, list[str]]:
+    """Locate the errors of a script, grouped by component position.
+
+    Only the checks that can be fixed by rewriting a single component are
+    reported here. Paper id and position numbering are fixed by the caller.
+
+    Parameters
+    ----------
+    components : List[ScriptComponentDraft]
+        The script components, sorted by position
+    paper_content : str
+        The paper the script was generated from
+
+    Returns
+    -------
+    dict[int, list[str]]
+        The error messages for each failing position
+    """
+    errors: dict[int, list[str]] = {}
+    for i, comp in enumerate(components):
+        comp_errors = find_component_errors(comp)
+        if comp.component_type.strip() == ScriptComponentType.FIGURE and comp.content not in paper_content:
+            comp_errors.append(f"Figure link {comp.content} not found in paper content. Give the exact LINK that is in the paper")
+        if (i > 0 and comp.component_type.strip() == components[i-1].component_type.strip()
+                and comp.component_type.strip() != ScriptComponentType.TEXT):
+            comp_errors.append(f"Consecutive {comp.component_type.strip()} components are not allowed, use another component type here")
+        if comp_errors:
+            errors[comp.position] = comp_errors
+    for position, error in check_figure_links(components, paper_content).items():
+        errors.setdefault(position, []).append(error)
+    return errors
+
+
+def generate_repair_model(positions: List[int], paper_content: str):
+    """Build the response model used to re-ask the model for some components only.
+
+    Parameters
+    ----------
+    positions : List[int]
+        The positions the model must rewrite
+    paper_content : str
+        The paper the script was generated from, used to check figure links
+
+    Returns
+    -------
+    type[BaseModel]
+        A ScriptRepair model validating the rewritten components
+    """
+    class ScriptRepair(BaseModel):
+        components: List[ScriptComponent] = Field(
+            ...,
+            description=f"The rewritten components, exactly one for each of the positions {positions}",
+        )
+
+        @model_validator(mode='after')
+        def validate_repair(cls, values):
+            errors = []
+            returned = sorted(comp.position for comp in values.components)
+            if returned != sorted(positions):
+                errors.append(ValueError(f"Return exactly one component for each of the positions {positions}, got {returned}"))
+            for comp in values.components:
+                if comp.component_type.strip() == ScriptComponentType.FIGURE and comp.content not in paper_content:
+                    errors.append(ValueError(f"Figure link {comp.content} not found in paper content. Give the exact LINK that is in the paper"))
+            for position, error in check_figure_links(values.components, paper_content).items():
+                errors.append(ValueError(error))
+            if errors:
+                raise ValueError(errors)
+            return values
+    return ScriptRepair
+
+
+def generate_section_notes_model(section_content: str):
+    """Build the response model of the notes taken on one section of a paper.
+
+    Parameters
+    ----------
+    section_content : str
+        The section the notes are taken from, used to check figure links
+
+    Returns
+    -------
+    type[BaseModel]
+        A SectionNotes model
+    """
+    class SectionNotes(BaseModel):
+        section_title: str = Field(..., description="Title of the section")
+        key_points: List[str] = Field(
+            ...,
+            description="The ideas, methods and results of the section worth explaining in the video, as full sentences",
+        )
+        equations: List[str] = Field(
+            default_factory=list,
+            description="The most important equations of the section in LaTeX, on a single line, without $",
+        )
+        figures: List[str] = Field(
+            default_factory=list,
+            description="The exact links of the figures of the section, each followed by nothing else",
+        )
+
+        @model_validator(mode='after')
+        def validate_figures(cls, values):
+            missing = [figure for figure in values.figures if figure not in section_content]
+            if missing:
+                raise ValueError(f"Figure links {missing} not found in the section. Give the exact LINKS that are in the section")
+            return values
+    return SectionNotes
+
+
 def generate_model_with_context_check(paper_id : str ,paper_content : str):
     class ArxflixScript(BaseModel):
         title: str = Field(
@@ -165,25 +360,8 @@ def generate_model_with_context_check(paper_id : str ,paper_content : str):
                                     - Equation,
                                     - Headline"""))
                     logger.info(errors[-1])
-                # Check if the figure link is accessible
-                    try:
-                        response = requests.head(comp.content, timeout=5)
-                        if response.status_code != 200:
-                            errors.append(ValueError(f"""Figure link is not accessible: {comp.content} (Status code: {response.status_code}). Provide the exact figure link that is present in the paper
-                                                     
-                                                     Remember the exemples of extraction : 
-                                                     <example_figures>
-![](https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png) is rendered as "https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png"
-![](ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png) is rendered as "ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png"
-<example_figures>"""))
-                            logger.warning(f"Validating script structure for paper_id: {paper_id}")
-                    except requests.RequestException as e:
-                        errors.append(ValueError(f"""Error accessing figure link {comp.content}: {str(e)}.Provide the exact figure link that is present in the paper
-                                                 Remember the exemples of extraction : 
-                                                     <example_figures>
-![](https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png) is rendered as "https://arxiv.org/html/2405.11273/multi_od/5604403/figure/moe_intro.png"
-![](ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png) is rendered as "ar5iv.labs.arxiv.org//html/5643.43534/assets/x5.png"
-<example_figures>"""))
+            for position, error in check_figure_links(values.components, paper_content, rewrite=True).items():
+                errors.append(ValueError(error))
             if errors:
                 print(errors)
                 logger.info(errors)
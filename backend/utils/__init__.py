@@ -4,6 +4,7 @@ from .generate_assets import (
     export_mp3,
     export_srt,
     export_rich_content_json,
+    export_segments_json,
 )
 from .generate_paper import process_article
 from .generate_script import process_script
@@ -15,6 +16,7 @@ __all__ = [
     "export_mp3",
     "export_srt",
     "export_rich_content_json",
+    "export_segments_json",
     "process_article",
     "process_script",
     "process_video",
@@ -0,0 +1,143 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+AUDIO_VIZ_NAME = "audio_viz.bin"
+AUDIO_VIZ_META_NAME = "audio_viz.json"
+# `getAudioData` decodes the audio at this rate in the browser
+AUDIO_VIZ_SAMPLE_RATE = 48000
+AUDIO_VIZ_BATCH_FRAMES = 1024
+
+
+def compute_audio_viz(
+    audio_path: Path,
+    fps: int,
+    number_of_samples: int = 512,
+    start_index: int = 0,
+    bins: int | None = None,
+) -> tuple[np.ndarray, float]:
+    """Compute the frequency bins `AudioViz` displays for every frame of a narration.
+
+    Follows `visualizeAudio` of @remotion/media-utils: for each frame, a
+    Blackman window over ``2 * number_of_samples`` samples centered on the
+    frame time, the FFT magnitudes of the first ``number_of_samples`` bins
+    relative to the loudest sample, then the mean over the frame and its two
+    neighbours.
+
+    Parameters
+    ----------
+    audio_path : Path
+        The narration
+    fps : int
+        The frame rate of the composition
+    number_of_samples : int, optional
+        The `waveNumberOfSamples` prop, by default 512
+    start_index : int, optional
+        First bin to keep, the `waveFreqRangeStartIndex` prop, by default 0
+    bins : int | None, optional
+        Number of bins to keep, by default all of them from ``start_index``
+
+    Returns
+    -------
+    tuple[np.ndarray, float]
+        The (frames, bins) values, and their maximum
+    """
+    data, sample_rate = sf.read(str(audio_path), dtype="float32", always_2d=True)
+    signal = data[:, 0]
+    if sample_rate != AUDIO_VIZ_SAMPLE_RATE:
+        # Linear resampling is enough for a visualization
+        duration = len(signal) / sample_rate
+        resampled_length = int(duration * AUDIO_VIZ_SAMPLE_RATE)
+        signal = np.interp(
+            np.arange(resampled_length) / AUDIO_VIZ_SAMPLE_RATE,
+            np.arange(len(signal)) / sample_rate,
+            signal,
+        ).astype(np.float32)
+    sample_size = number_of_samples * 2
+    peak = float(np.abs(signal).max()) or 1.0
+    # Zeros past the end, as `visualizeAudio` does
+    padded = np.concatenate([signal, np.zeros(sample_size, dtype=np.float32)])
+
+    frames = int(len(signal) / AUDIO_VIZ_SAMPLE_RATE * fps) + 1
+    alpha = 0.16
+    i = np.arange(sample_size)
+    window = (1 - alpha) / 2 - 0.5 * np.cos(2 * np.pi * i / sample_size) + alpha / 2 * np.cos(4 * np.pi * i / sample_size)
+    bins = number_of_samples - start_index if bins is None else min(bins, number_of_samples - start_index)
+
+    # One extra frame on each side for the smoothing
+    magnitudes = np.empty((frames + 2, bins), dtype=np.float32)
+    for batch_start in range(-1, frames + 1, AUDIO_VIZ_BATCH_FRAMES):
+        batch = np.arange(batch_start, min(batch_start + AUDIO_VIZ_BATCH_FRAMES, frames + 1))
+        starts = np.maximum(0, np.floor(batch / fps * AUDIO_VIZ_SAMPLE_RATE).astype(np.int64) - sample_size // 2)
+        windows = padded[starts[:, None] + i[None, :]] * window
+        spectrum = np.abs(np.fft.rfft(windows, axis=1))[:, start_index:start_index + bins]
+        magnitudes[batch + 1] = spectrum / (peak * number_of_samples)
+    smoothed = (magnitudes[:-2] + magnitudes[1:-1] + magnitudes[2:]) / 3
+    return smoothed, float(smoothed.max())
+
+
+def export_audio_viz(
+    audio_path: Path,
+    out_dir: Path,
+    fps: int,
+    number_of_samples: int = 512,
+    start_index: int = 0,
+    bins: int | None = None,
+) -> dict[str, Any]:
+    """Compute the visualization of a narration and write it next to the other assets.
+
+    The values are quantized to one byte per bin with a square-root curve, so
+    quiet bins keep some precision: ``value = scale * (byte / 255) ** 2``.
+    The bytes go to ``audio_viz.bin`` (frames x bins, row-major) and the
+    parameters to ``audio_viz.json``.
+
+    Parameters
+    ----------
+    audio_path : Path
+        The narration
+    out_dir : Path
+        Where to write the files
+    fps : int
+        The frame rate of the composition
+    number_of_samples : int, optional
+        The `waveNumberOfSamples` prop, by default 512
+    start_index : int, optional
+        First bin to keep, by default 0
+    bins : int | None, optional
+        Number of bins to keep, by default all of them from ``start_index``
+
+    Returns
+    -------
+    dict[str, Any]
+        The parameters written to ``audio_viz.json``
+    """
+    values, scale = compute_audio_viz(audio_path, fps, number_of_samples, start_index, bins)
+    scale = scale or 1.0
+    quantized = np.round(np.sqrt(values / scale) * 255).astype(np.uint8)
+    (out_dir / AUDIO_VIZ_NAME).write_bytes(quantized.tobytes())
+    meta = {
+        "file": AUDIO_VIZ_NAME,
+        "fps": fps,
+        "frames": int(quantized.shape[0]),
+        "numberOfSamples": number_of_samples,
+        "startIndex": start_index,
+        "bins": int(quantized.shape[1]),
+        "scale": scale,
+    }
+    (out_dir / AUDIO_VIZ_META_NAME).write_text(json.dumps(meta))
+    logger.info(f"Exported the audio visualization ({meta['frames']} frames x {meta['bins']} bins) to {out_dir}")
+    return meta
+
+
+def read_audio_viz_meta(out_dir: Path) -> dict[str, Any] | None:
+    """Return the parameters of the visualization exported in ``out_dir``, None if there is none."""
+    meta_path = out_dir / AUDIO_VIZ_META_NAME
+    if not meta_path.exists() or not (out_dir / AUDIO_VIZ_NAME).exists():
+        return None
+    return json.loads(meta_path.read_text())
@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Workers of each stage of generate_batch: the script and the narration wait
+# on the network, the render uses every core
+BATCH_SCRIPT_WORKERS = int(os.getenv("BATCH_SCRIPT_WORKERS", "4"))
+BATCH_ASSET_WORKERS = int(os.getenv("BATCH_ASSET_WORKERS", "2"))
+BATCH_RENDER_WORKERS = int(os.getenv("BATCH_RENDER_WORKERS", "1"))
+
+
+@dataclass
+class BatchStage:
+    """A stage of a batch, run on its own pool of workers.
+
+    Attributes
+    ----------
+    name : str
+        The stage
+    workers : int
+        Items processed by this stage at the same time
+    run : Callable[[str], Any]
+        Processes one item
+    """
+    name: str
+    workers: int
+    run: Callable[[str], Any]
+
+
+def read_batch_items(text: str) -> list[str]:
+    """Return the items of a batch file: one per line, without blank lines and ``#`` comments, deduplicated."""
+    items = (line.split("#", 1)[0].strip() for line in text.splitlines())
+    return list(dict.fromkeys(item for item in items if item))
+
+
+def run_batch(items: list[str], stages: list[BatchStage]) -> dict[str, Any]:
+    """Pass every item through the stages, each stage working on several items at the same time.
+
+    An item enters a stage as soon as it is out of the previous one and a
+    worker of that stage is free, so the stages overlap: while an item
+    renders, the next ones generate their script and narration. An item
+    failing a stage is reported and leaves the batch.
+
+    Parameters
+    ----------
+    items : list[str]
+        The items, in the order they enter the first stage
+    stages : list[BatchStage]
+        The stages, in order
+
+    Returns
+    -------
+    dict[str, Any]
+        The throughput summary: items done and failed, wall time, items per
+        hour, the time the stages would take one item after the other and
+        the speedup over it, and for each stage its count, mean time and
+        worker utilization; then the result of each item
+    """
+    results = {item: {"item": item, "seconds": {}, "error": None, "failed_stage": None} for item in items}
+    busy = {stage.name: 0.0 for stage in stages}
+    lock = threading.Lock()
+    remaining = len(items)
+    all_done = threading.Event()
+    if not items:
+        all_done.set()
+    executors = [
+        ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=f"batch_{stage.name}")
+        for stage in stages
+    ]
+
+    def finish(item: str) -> None:
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining == 0:
+                all_done.set()
+
+    def run_stage(item: str, index: int) -> None:
+        stage = stages[index]
+        start = time.perf_counter()
+        try:
+            stage.run(item)
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            logger.error(f"Batch: {item} failed at {stage.name} after {seconds:.1f}s: {e}")
+            with lock:
+                busy[stage.name] += seconds
+                results[item]["error"] = f"{type(e).__name__}: {e}"
+                results[item]["failed_stage"] = stage.name
+            finish(item)
+            return
+        seconds = time.perf_counter() - start
+        logger.info(f"Batch: {item} {stage.name} done in {seconds:.1f}s")
+        with lock:
+            busy[stage.name] += seconds
+            results[item]["seconds"][stage.name] = round(seconds, 3)
+        if index + 1 < len(stages):
+            executors[index + 1].submit(run_stage, item, index + 1)
+        else:
+            finish(item)
+
+    start = time.perf_counter()
+    try:
+        for item in items:
+            executors[0].submit(run_stage, item, 0)
+        all_done.wait()
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+    wall = time.perf_counter() - start
+
+    succeeded = [result for result in results.values() if result["error"] is None]
+    sequential = sum(sum(result["seconds"].values()) for result in results.values())
+    summary_stages = {}
+    for stage in stages:
+        times = [result["seconds"][stage.name] for result in results.values() if stage.name in result["seconds"]]
+        summary_stages[stage.name] = {
+            "workers": stage.workers,
+            "done": len(times),
+            "failed": sum(result["failed_stage"] == stage.name for result in results.values()),
+            "mean_seconds": round(sum(times) / len(times), 3) if times else None,
+            "utilization": round(busy[stage.name] / (wall * stage.workers), 3) if wall else None,
+        }
+    return {
+        "items": len(items),
+        "succeeded": len(succeeded),
+        "failed": len(items) - len(succeeded),
+        "wall_seconds": round(wall, 3),
+        "items_per_hour": round(len(succeeded) * 3600 / wall, 2) if wall else None,
+        "sequential_seconds": round(sequential, 3),
+        "speedup": round(sequential / wall, 2) if wall else None,
+        "stages": summary_stages,
+        "results": list(results.values()),
+    }
+
+
+def format_batch_summary(summary: dict[str, Any]) -> str:
+    """Format the summary of `run_batch` as a table."""
+    lines = [
+        f"{summary['succeeded']}/{summary['items']} done, {summary['failed']} failed "
+        f"in {summary['wall_seconds']:.0f}s: {summary['items_per_hour'] or 0:.1f}/hour, "
+        f"{summary['speedup'] or 0:.2f}x over one after the other ({summary['sequential_seconds']:.0f}s)",
+        f"{'stage':<10} {'workers':>7} {'done':>5} {'failed':>6} {'mean s':>8} {'busy':>6}",
+    ]
+    for name, stage in summary["stages"].items():
+        mean = f"{stage['mean_seconds']:.1f}" if stage["mean_seconds"] is not None else "-"
+        utilization = f"{stage['utilization']:.0%}" if stage["utilization"] is not None else "-"
+        lines.append(
+            f"{name:<10} {stage['workers']:>7} {stage['done']:>5} {stage['failed']:>6} {mean:>8} {utilization:>6}"
+        )
+    for result in summary["results"]:
+        if result["error"]:
+            lines.append(f"FAILED {result['item']} at {result['failed_stage']}: {result['error']}")
+    return "\n".join(lines)
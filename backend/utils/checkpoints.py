@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from backend.utils.pipeline_events import emit_event
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_NAME = "checkpoints.json"
+
+
+def file_digest(path: Path) -> str:
+    """Return the sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def inputs_digest(inputs: list[Any]) -> str:
+    """Return a hash of the inputs of a stage: files by their content, the other values as JSON."""
+    values = [
+        {"file": file_digest(value)} if isinstance(value, Path) else value
+        for value in inputs
+    ]
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class StageCheckpoints:
+    """Checkpoints of the stages of a pipeline run, in its directory.
+
+    ``checkpoints.json`` records, for each stage, a hash of its inputs and
+    of the files it produced. A stage is skipped when its inputs hash the
+    same and its files are still there, unchanged. Each stage takes the
+    files of the previous ones as inputs, so a rerun resumes from the first
+    stage that is missing, failed or has changed inputs.
+
+    Parameters
+    ----------
+    run_dir : Path
+        The directory of the run, where the stages write their files
+    """
+
+    def __init__(self, run_dir: Path):
+        self.run_dir = run_dir
+        self.path = run_dir / CHECKPOINTS_NAME
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest: dict[str, dict[str, Any]] = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def is_valid(self, stage: str, inputs: list[Any], outputs: list[str]) -> bool:
+        """Return whether a stage was done with these inputs and its files are unchanged."""
+        entry = self.manifest.get(stage)
+        if entry is None or entry["inputs"] != inputs_digest(inputs) or sorted(entry["outputs"]) != sorted(outputs):
+            return False
+        for name, digest in entry["outputs"].items():
+            path = self.run_dir / name
+            if not path.exists() or file_digest(path) != digest:
+                return False
+        return True
+
+    def run(self, stage: str, inputs: list[Any], outputs: list[str], produce: Callable[[], None]) -> bool:
+        """Run a stage unless its checkpoint is valid, then checkpoint it.
+
+        Parameters
+        ----------
+        stage : str
+            The stage
+        inputs : list[Any]
+            What the stage depends on: JSON values, and Paths hashed by content
+        outputs : list[str]
+            The files the stage writes, relative to the run directory
+        produce : Callable[[], None]
+            Writes the files of the stage
+
+        Returns
+        -------
+        bool
+            Whether the stage ran, False if its checkpoint was reused
+        """
+        if self.is_valid(stage, inputs, outputs):
+            logger.info(f"Stage {stage}: reusing the checkpoint in {self.run_dir}")
+            emit_event("checkpoint_reused", stage=stage)
+            return False
+        # Forget the previous checkpoint first, so a failure leaves none
+        self.manifest.pop(stage, None)
+        self._write()
+        produce()
+        self.manifest[stage] = {
+            "inputs": inputs_digest(inputs),
+            "outputs": {name: file_digest(self.run_dir / name) for name in outputs},
+            "finished_at": time.time(),
+        }
+        self._write()
+        emit_event("checkpoint_saved", stage=stage)
+        return True
+
+    def _write(self) -> None:
+        temp = self.path.with_suffix(".tmp")
+        temp.write_text(json.dumps(self.manifest, indent=2))
+        os.replace(temp, self.path)
@@ -0,0 +1,149 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+FIGURE_LINK_TIMEOUT = 5
+FIGURE_LINK_WORKERS = 16
+# Figure URLs whose answer is remembered, the least recently used are forgotten
+FIGURE_LINK_MEMO_SIZE = 4096
+
+# Shared between every script generation (and every instructor retry) of the process
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=FIGURE_LINK_WORKERS, pool_maxsize=FIGURE_LINK_WORKERS))
+_session.mount("http://", HTTPAdapter(pool_connections=FIGURE_LINK_WORKERS, pool_maxsize=FIGURE_LINK_WORKERS))
+_resolved: OrderedDict[str, str | None] = OrderedDict()
+_resolved_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the HTTP session shared by the figure helpers."""
+    return _session
+
+
+def normalize_figure_link(link: str, paper_id: str) -> str:
+    """Turn a figure link as found in the paper markdown into an absolute URL.
+
+    Parameters
+    ----------
+    link : str
+        The figure link, e.g. "ar5iv.labs.arxiv.org//html/2404.02905/assets/x1.png",
+        "arxiv.org/x1.png" or "x1.png"
+    paper_id : str
+        The paper id, used for links relative to the arXiv HTML page
+
+    Returns
+    -------
+    str
+        The absolute URL of the figure
+    """
+    link = link.strip()
+    # "https:/arxiv.org/..." -> "https://arxiv.org/..."
+    link = re.sub(r"^(https?):/(?!/)", r"\1://", link)
+    if link.startswith(("http://", "https://")):
+        url = link
+    elif link.startswith("ar5iv.labs.arxiv.org"):
+        url = "https://" + link
+    elif link.startswith("arxiv.org"):
+        url = f"https://arxiv.org/html/{paper_id}/" + link[len("arxiv.org"):].lstrip("/")
+    else:
+        url = f"https://arxiv.org/html/{paper_id}/" + link.lstrip("/")
+    # Collapse duplicated slashes in the path, but not in the scheme
+    return re.sub(r"(?<!:)/{2,}", "/", url)
+
+
+def figure_link_candidates(url: str) -> list[str]:
+    """Return the URLs to try for a figure, in order of preference."""
+    candidates = [url]
+    if "ar5iv.labs." in url:
+        candidates.append(url.replace("ar5iv.labs.", ""))
+    return candidates
+
+
+def _is_image(url: str) -> bool | None:
+    # Whether the URL serves an image; None when the answer may change (5xx, 429, ...)
+    response = _session.head(url, timeout=FIGURE_LINK_TIMEOUT, allow_redirects=True)
+    if response.status_code == 405:
+        # Some static servers don't implement HEAD
+        response = _session.get(url, timeout=FIGURE_LINK_TIMEOUT, stream=True)
+        response.close()
+    if response.status_code == 200:
+        return response.headers.get("Content-Type", "").startswith("image/")
+    if response.status_code in (404, 410):
+        return False
+    return None
+
+
+def resolve_figure_link(url: str) -> str | None:
+    """Return the first candidate URL of a figure that serves an image.
+
+    Definitive answers (an image, or 404/410 for every candidate) are
+    memoized, for the FIGURE_LINK_MEMO_SIZE most recently used URLs. A figure
+    whose server failed (5xx, 429, ...) is unreachable for this call only. On
+    a network error the URL is returned unchecked. Neither is memoized, so
+    the URL is probed again on the next call.
+
+    Parameters
+    ----------
+    url : str
+        The absolute figure URL
+
+    Returns
+    -------
+    str | None
+        The reachable URL, or None if no candidate serves an image
+    """
+    with _resolved_lock:
+        if url in _resolved:
+            _resolved.move_to_end(url)
+            return _resolved[url]
+
+    resolved = None
+    definitive = True
+    try:
+        for candidate in figure_link_candidates(url):
+            is_image = _is_image(candidate)
+            if is_image:
+                resolved = candidate
+                break
+            if is_image is None:
+                definitive = False
+    except requests.RequestException as e:
+        logger.warning(f"Could not check figure link {url}: {e}")
+        return url
+
+    if resolved is None and not definitive:
+        logger.warning(f"Figure link {url} is unavailable for now")
+        return None
+    with _resolved_lock:
+        _resolved[url] = resolved
+        _resolved.move_to_end(url)
+        while len(_resolved) > FIGURE_LINK_MEMO_SIZE:
+            _resolved.popitem(last=False)
+    return resolved
+
+
+def resolve_figure_links(urls: list[str]) -> dict[str, str | None]:
+    """Resolve several figure URLs concurrently, see `resolve_figure_link`.
+
+    Parameters
+    ----------
+    urls : list[str]
+        The absolute figure URLs
+
+    Returns
+    -------
+    dict[str, str | None]
+        The reachable URL (or None) for each input URL
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    if not unique_urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(FIGURE_LINK_WORKERS, len(unique_urls))) as executor:
+        return dict(zip(unique_urls, executor.map(resolve_figure_link, unique_urls)))
@@ -0,0 +1,131 @@
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from backend.utils.figure_links import FIGURE_LINK_WORKERS, get_session
+
+logger = logging.getLogger(__name__)
+
+FIGURE_CACHE_DIR = Path(os.getenv("FIGURE_CACHE_DIR", ".cache/figures"))
+# Figures are shown at most 650px tall (max-h-[650px] in RichContent.tsx), in
+# a row 1880px wide
+FIGURE_MAX_WIDTH = 1880
+FIGURE_MAX_HEIGHT = 650
+FIGURE_WEBP_QUALITY = 90
+FIGURE_DOWNLOAD_TIMEOUT = 30
+
+
+def read_figure(source: str) -> bytes:
+    """Return the bytes of a figure, from a local path or an http(s) URL."""
+    if source.lower().startswith(("http://", "https://")):
+        response = get_session().get(source, timeout=FIGURE_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    return Path(source).read_bytes()
+
+
+def normalize_figure(data: bytes) -> bytes:
+    """Downscale a figure to the box the video shows it in and encode it to WebP.
+
+    Figures are never upscaled. Figures with few colors (plots, diagrams)
+    are encoded losslessly, so their text stays sharp; the others with
+    quality FIGURE_WEBP_QUALITY.
+
+    Parameters
+    ----------
+    data : bytes
+        The figure, in any format Pillow reads
+
+    Returns
+    -------
+    bytes
+        The WebP figure
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((FIGURE_MAX_WIDTH, FIGURE_MAX_HEIGHT), Image.Resampling.LANCZOS)
+        lossless = image.getcolors(256) is not None
+        output = io.BytesIO()
+        image.save(output, "WEBP", lossless=lossless, quality=100 if lossless else FIGURE_WEBP_QUALITY, method=4)
+        return output.getvalue()
+
+
+def normalized_figure_path(source: str, cache_dir: Path = FIGURE_CACHE_DIR) -> Path:
+    """Return the normalized figure of a source, normalizing it once per content.
+
+    The cache is keyed by a hash of the source bytes, so the same figure
+    reached by several paths or URLs is stored once.
+
+    Parameters
+    ----------
+    source : str
+        The local path or URL of the figure
+    cache_dir : Path, optional
+        Where the normalized figures are stored, by default FIGURE_CACHE_DIR
+
+    Returns
+    -------
+    Path
+        The normalized figure
+    """
+    data = read_figure(source)
+    path = cache_dir / f"{hashlib.sha256(data).hexdigest()[:16]}.webp"
+    if not path.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as f:
+            f.write(normalize_figure(data))
+        os.replace(f.name, path)
+    return path
+
+
+def link_or_copy(source: Path, destination: Path) -> None:
+    """Hardlink a file, or copy it when it is on another filesystem."""
+    if destination.exists():
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy(source, destination)
+
+
+def export_figures(sources: list[str], out_dir: Path, cache_dir: Path = FIGURE_CACHE_DIR) -> dict[str, str]:
+    """Normalize figures concurrently and put them in the asset directory.
+
+    Parameters
+    ----------
+    sources : list[str]
+        The local paths or URLs of the figures
+    out_dir : Path
+        The asset directory
+    cache_dir : Path, optional
+        Where the normalized figures are stored, by default FIGURE_CACHE_DIR
+
+    Returns
+    -------
+    dict[str, str]
+        The file name, relative to ``out_dir``, of each figure that could be
+        normalized. The others are logged and left out.
+    """
+    sources = list(dict.fromkeys(sources))
+
+    def export(source: str) -> str | None:
+        try:
+            path = normalized_figure_path(source, cache_dir)
+        except Exception as e:
+            logger.warning(f"Could not normalize figure {source}: {e}")
+            return None
+        link_or_copy(path, out_dir / path.name)
+        return path.name
+
+    with ThreadPoolExecutor(max_workers=FIGURE_LINK_WORKERS) as executor:
+        names = dict(zip(sources, executor.map(export, sources)))
+    return {source: name for source, name in names.items() if name}
@@ -1,8 +1,11 @@
 import asyncio
+import hashlib
+import json
 import os
+import subprocess
 import sys
 import tempfile
-from typing import Literal
+from typing import Callable, Literal
 from dotenv import load_dotenv
 from lmnt.api import Speech
 from elevenlabs import Voice, VoiceSettings, save
@@ -26,7 +29,6 @@ from deepgram import (
 import traceback
 import requests
 import soundfile as sf
-import shutil
 from kokoro import KPipeline
 
 try:
@@ -35,9 +37,19 @@ except ImportError:
     mlx_whisper = None
 
 from backend.type import Text, Caption, Figure, Equation, Headline, RichContent
+from backend.utils.figures import export_figures, link_or_copy
+from backend.utils.pipeline_events import emit_event
+from backend.utils.rich_raster import check_equations, export_rich_images
 
 logger = logging.getLogger(__name__)
 
+# Voice of each audio generation method
+TTS_VOICES = {
+    "elevenlabs": "cgSgspJ2msm6clMCkdW9",
+    "lmnt": "lily",
+    "kokoro": "af_heart",
+}
+
 # Load .env file
 load_dotenv()
 
@@ -163,6 +175,7 @@ def _make_caption_lmnt(result: dict) -> list[Caption]:
 def _generate_audio_and_caption_elevenlabs(
     script_contents: list[RichContent | Text],
     temp_dir: Path = Path(tempfile.gettempdir()),
+    on_segment: Callable[[Text], None] | None = None,
 ) -> list[RichContent | Text]:
     """Generate audio and caption for each text segment in the script.
     Use Whisper model to generate the captions
@@ -173,6 +186,9 @@ def _generate_audio_and_caption_elevenlabs(
         List of RichContent or Text objects
     temp_dir : Path, optional
         Temporary directory to store the audio files, by default Path(tempfile.gettempdir())
+    on_segment : Callable[[Text], None] | None, optional
+        Called with each text once its audio and captions are generated, before
+        the captions are offset, by default None
 
     Returns
     -------
@@ -201,7 +217,7 @@ def _generate_audio_and_caption_elevenlabs(
                     script_content.audio = elevenlabs_client.generate(
                         text=content,
                         voice=Voice(
-                            voice_id="cgSgspJ2msm6clMCkdW9",
+                            voice_id=TTS_VOICES["elevenlabs"],
                             settings=VoiceSettings(
                                 stability=0.35,
                                 similarity_boost=0.8,
@@ -260,6 +276,9 @@ def _generate_audio_and_caption_elevenlabs(
 
                     script_content.audio_path = audio_path
                     script_content.end = total_audio_duration
+                    emit_event("tts_segment", index=i, audio_seconds=total_audio_duration)
+                    if on_segment:
+                        on_segment(script_content)
     except Exception as e:
 
         logger.error(f"Error generating audio and caption: {e}, {traceback.format_exc()}")
@@ -292,7 +311,7 @@ def _generate_audio_lmnt(content: str, output_file: str) -> dict:
     client = Speech(api_key=LMNT_API_KEY)
     synthesis = asyncio.run(
         client.synthesize(
-            text=content, voice="lily", model='blizzard',format="wav", language="en", return_durations=True,conversational=True
+            text=content, voice=TTS_VOICES["lmnt"], model='blizzard',format="wav", language="en", return_durations=True,conversational=True
         )
     )
     with open(output_file, "wb") as f:
@@ -304,6 +323,7 @@ def _generate_audio_and_caption_lmnt(
     script_contents: list[RichContent | Text],
     temp_dir: Path = Path(tempfile.gettempdir()),
     offset: float = 0.5,
+    on_segment: Callable[[Text], None] | None = None,
 ) -> list[RichContent | Text]:
     """Generate audio and caption for each text segment in the script
 
@@ -315,6 +335,9 @@ def _generate_audio_and_caption_lmnt(
         Temporary directory to store the audio files, by default Path(tempfile.gettempdir())
     offset : float, optional
         Offset between each text segment, by default 0.5
+    on_segment : Callable[[Text], None] | None, optional
+        Called with each text once its audio and captions are generated, before
+        the captions are offset, by default None
 
     Returns
     -------
@@ -347,6 +370,9 @@ def _generate_audio_and_caption_lmnt(
                 logger.info(
                     f"Generated audio and caption for text {i}, duration: {total_audio_duration}"
                 )
+                emit_event("tts_segment", index=i, audio_seconds=total_audio_duration)
+                if on_segment:
+                    on_segment(script_content)
 
     offset_fix = 0
     # Initially all text caption start at time 0
@@ -372,6 +398,7 @@ def _generate_audio_and_caption_kokoro(
     script_contents: list[RichContent | Text],
     temp_dir: Path = Path(tempfile.gettempdir()),
     offset: float = 0.5,
+    on_segment: Callable[[Text], None] | None = None,
 ) -> list[RichContent | Text]:
     """Generate audio and caption for each text segment in the script using Kokoro TTS
 
@@ -383,6 +410,9 @@ def _generate_audio_and_caption_kokoro(
         Temporary directory to store the audio files, by default Path(tempfile.gettempdir())
     offset : float, optional
         Offset between each text segment, by default 0.5
+    on_segment : Callable[[Text], None] | None, optional
+        Called with each text once its audio and captions are generated, before
+        the captions are offset, by default None
 
     Returns
     -------
@@ -410,7 +440,7 @@ def _generate_audio_and_caption_kokoro(
                     logger.info(f"Generating audio {i} at {audio_path}")
                     
                     # Generate audio using Kokoro
-                    generator = pipeline(content, voice='af_heart', speed=1.0)
+                    generator = pipeline(content, voice=TTS_VOICES["kokoro"], speed=1.0)
                     
                     # Get the first (and typically only) result from the generator
                     for j, (gs, ps, audio) in enumerate(generator):
@@ -463,6 +493,9 @@ def _generate_audio_and_caption_kokoro(
                     logger.info(
                         f"Generated audio and caption for text {i}, duration: {total_audio_duration}"
                     )
+                    emit_event("tts_segment", index=i, audio_seconds=total_audio_duration)
+                    if on_segment:
+                        on_segment(script_content)
 
     except Exception as e:
         logger.error(f"Error generating audio and caption with Kokoro: {e}, {traceback.format_exc()}")
@@ -536,7 +569,7 @@ def fill_rich_content_time(
     return script_contents
 
 
-def export_mp3(text_content: list[Text], out_path: str, offset: float = 0.5) -> None:
+def export_mp3(text_content: list[Text], out_path: str, offset: float = 0.5) -> list[tuple[str, float, float]]:
     """Export the audio of the text content to a single mp3 file
 
     Parameters
@@ -545,22 +578,61 @@ def export_mp3(text_content: list[Text], out_path: str, offset: float = 0.5) ->
         List of Text objects
     out_path : str
         Path to save the mp3 file
+
+    Returns
+    -------
+    list[tuple[str, float, float]]
+        The content, start and end in seconds of each text in the exported
+        audio, silence after it included
     """
     # Merge all mp3 files into one
     audio_all = []
+    segments = []
+    position = 0
+    sr = None
     for i, text in enumerate(text_content):
         if not text.audio_path:
             continue
 
         path = text.audio_path
-        audio, sr = torchaudio.load(path)
+        audio, audio_sr = torchaudio.load(path)
+        # TTS providers may return stereo or another sample rate for some
+        # texts: concatenate mono audio at the rate of the first one
+        if audio.size(0) > 1:
+            audio = audio.mean(dim=0, keepdim=True)
+        if sr is None:
+            sr = audio_sr
+        elif audio_sr != sr:
+            logger.warning(f"Resampling {path} from {audio_sr} Hz to {sr} Hz")
+            audio = torchaudio.functional.resample(audio, audio_sr, sr)
         if offset > 0:
             # Add offset sec of silence between each audio
             silence = torch.zeros((1, int(sr * offset)))
             audio = torch.cat([audio, silence], dim=1)
         audio_all.append(audio)
+        segments.append((text.content, position / sr, (position + audio.size(1)) / sr))
+        position += audio.size(1)
+    if not audio_all:
+        raise ValueError("No text has audio to export")
     audio_all_torch = torch.cat(audio_all, dim=1)
     torchaudio.save(out_path, audio_all_torch, sr)
+    return segments
+
+
+def export_segments_json(segments: list[tuple[str, float, float]], out_path: str) -> None:
+    """Export the text segments of the audio, see `export_mp3`, to a json file
+
+    The incremental render uses them to find the parts of a video that changed.
+
+    Parameters
+    ----------
+    segments : list[tuple[str, float, float]]
+        The content, start and end in seconds of each text
+    out_path : str
+        Path to save the json file
+    """
+    with open(out_path, "w") as f:
+        json.dump([{"content": content, "start": start, "end": end} for content, start, end in segments], f)
 
 
 def export_srt(full_audio_path: str, out_path: str) -> None:
@@ -619,13 +691,26 @@ def export_srt(full_audio_path: str, out_path: str) -> None:
         f.write(srt_text)
 
 
-def export_rich_content_json(rich_content: list[RichContent], out_path: str) -> None:
+def export_rich_content_json(
+    rich_content: list[RichContent],
+    out_path: str,
+    rasterize: bool = True,
+    normalize_figures: bool = True,
+) -> None:
     """Export the rich content to a json file.
 
     If a Figure has a local file path (e.g. "/Users/foo/bar/image.png") we copy the
     file next to the generated rich.json and rewrite the reference so that
     Remotion can fetch it through the temporary HTTP server (relative URL).
     Remote URLs (starting with http/https) are left untouched.
+
+    Figures, local or remote, are first downscaled to the size the video shows
+    them at, re-encoded and hardlinked next to the json, see `export_figures`.
+    The copy and the URL above are only kept for figures that can't be read.
+    Equations are parsed with KaTeX first, so a bad one fails here rather than
+    in the render. Headlines and equations are then rendered once to images
+    next to the json (its "image" field), which the video shows instead of
+    laying them out on every frame.
     """
     """Export the rich content to a json file
 
@@ -635,24 +720,67 @@ def export_rich_content_json(rich_content: list[RichContent], out_path: str) ->
         List of RichContent objects
     out_path : str
         Path to save the json file
+    rasterize : bool, optional
+        Render headlines and equations to images, by default True
+    normalize_figures : bool, optional
+        Downscale, re-encode and dedupe the figures, by default True
+
+    Raises
+    ------
+    ValueError
+        If KaTeX can't parse an equation. If KaTeX can't be run, the
+        equations are not checked.
     """
     # Prepare directory where we will write the JSON – we also copy any local
     # images next to it so they can be served by the temporary HTTP server.
     out_dir = Path(out_path).parent
     os.makedirs(out_dir, exist_ok=True)
 
+    equations = list(dict.fromkeys(c.content for c in rich_content if isinstance(c, Equation)))
+    try:
+        equation_errors = check_equations(equations)
+    except (OSError, subprocess.CalledProcessError) as e:
+        # Without node or the KaTeX script the equations can't be checked, as in preflight
+        logger.warning(f"Could not check the equations: {e}")
+        equation_errors = [None] * len(equations)
+    invalid = [f"{equation!r}: {error}" for equation, error in zip(equations, equation_errors) if error]
+    if invalid:
+        raise ValueError("KaTeX can't parse these equations:\n" + "\n".join(invalid))
+
+    images = {}
+    if rasterize:
+        items = [
+            (content.__class__.__name__.lower(), content.content)
+            for content in rich_content
+            if isinstance(content, (Headline, Equation))
+        ]
+        try:
+            images = export_rich_images(items, out_dir)
+        except Exception as e:
+            # The video lays them out itself then
+            logger.warning(f"Could not render the headlines and equations to images: {e}")
+
+    # Downscale figures to their display box, once per content, so the
+    # browser tabs do not decode full-resolution images
+    figures = (
+        export_figures([c.content for c in rich_content if isinstance(c, Figure)], out_dir)
+        if normalize_figures
+        else {}
+    )
+
     rich_content_dict = []
     for i, content in enumerate(rich_content):
         # If this is a local Figure (not starting with http/https), copy it next
         # to the json file and rewrite the reference to a relative URL that the
         # browser can fetch through http://localhost:<port>/.
-        if isinstance(content, Figure):
+        if isinstance(content, Figure) and content.content in figures:
+            content.content = figures[content.content]
+        elif isinstance(content, Figure):
             path_obj = Path(content.content)
             if path_obj.is_file() and not str(content.content).lower().startswith(("http://", "https://")):
                 destination = out_dir / path_obj.name
-                # Only copy if we haven't already.
-                if not destination.exists():
-                    shutil.copy(path_obj, destination)
+                # Only link or copy if we haven't already.
+                link_or_copy(path_obj, destination)
                 # Use only the filename in the JSON (relative URL).
                 content.content = path_obj.name
         rich_content_dict.append({
@@ -660,14 +788,58 @@ def export_rich_content_json(rich_content: list[RichContent], out_path: str) ->
             "content": content.content,
             "start": content.start,
             "end": content.end,
+            "image": images.get((content.__class__.__name__.lower(), content.content)),
         })
 
     df = pd.DataFrame(rich_content_dict)
     df.to_json(out_path, orient="records")
 
 
+def _segment_checkpoint_paths(method: str, content: str, segment_dir: Path) -> tuple[Path, Path]:
+    """Return the audio and the captions json of the checkpoint of a text."""
+    key = hashlib.sha256(json.dumps([method, TTS_VOICES.get(method), content]).encode()).hexdigest()[:16]
+    return segment_dir / f"segment_{key}.wav", segment_dir / f"segment_{key}.json"
+
+
+def _load_segment_checkpoints(script_contents: list[RichContent | Text], method: str, segment_dir: Path) -> int:
+    """Fill the texts that have a checkpoint with its audio and captions, so they are not generated again.
+
+    Returns
+    -------
+    int
+        Number of texts restored
+    """
+    restored = 0
+    for script_content in script_contents:
+        if not isinstance(script_content, Text) or script_content.captions is not None:
+            continue
+        audio_path, captions_path = _segment_checkpoint_paths(method, script_content.content, segment_dir)
+        if not (audio_path.exists() and captions_path.exists()):
+            continue
+        checkpoint = json.loads(captions_path.read_text())
+        script_content.audio_path = audio_path.absolute().as_posix()
+        script_content.captions = [Caption(**caption) for caption in checkpoint["captions"]]
+        script_content.end = checkpoint["end"]
+        restored += 1
+    return restored
+
+
+def _save_segment_checkpoint(text: Text, method: str, segment_dir: Path) -> None:
+    """Keep the audio and captions of a text, relative to its start, under a hash of its content."""
+    audio_path, captions_path = _segment_checkpoint_paths(method, text.content, segment_dir)
+    os.replace(text.audio_path, audio_path)
+    text.audio_path = audio_path.absolute().as_posix()
+    checkpoint = {
+        "captions": [{"word": c.word, "start": c.start, "end": c.end} for c in text.captions or []],
+        "end": text.end,
+    }
+    temp_path = captions_path.with_suffix(".tmp")
+    temp_path.write_text(json.dumps(checkpoint))
+    os.replace(temp_path, captions_path)
+
+
 def generate_audio_and_caption(
-    method: Literal["elevenlabs", "lmnt", "kokoro"], script: str
+    method: Literal["elevenlabs", "lmnt", "kokoro"], script: str, segment_dir: Path | None = None
 ) -> list[RichContent | Text]:
     """Generate audio and caption for the script
 
@@ -677,6 +849,10 @@ def generate_audio_and_caption(
         Method to generate audio and caption
     script : str
         Script to generate audio and caption
+    segment_dir : Path | None, optional
+        Checkpoint the audio and captions of each text in this directory as
+        soon as they are generated, and reuse the checkpoints of texts already
+        generated with this method, by default None
 
     Returns
     -------
@@ -684,12 +860,22 @@ def generate_audio_and_caption(
         List of RichContent or Text objects with audio and caption
     """
     script_contents = _parse_script(script)
+    kwargs = {}
+    if segment_dir is not None:
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        restored = _load_segment_checkpoints(script_contents, method, segment_dir)
+        if restored:
+            logger.info(f"Reusing the audio and captions of {restored} texts from {segment_dir}")
+        kwargs = {
+            "temp_dir": segment_dir,
+            "on_segment": lambda text: _save_segment_checkpoint(text, method, segment_dir),
+        }
     if method == "elevenlabs":
-        script_contents = _generate_audio_and_caption_elevenlabs(script_contents)
+        script_contents = _generate_audio_and_caption_elevenlabs(script_contents, **kwargs)
     elif method == "lmnt":
-        script_contents = _generate_audio_and_caption_lmnt(script_contents)
+        script_contents = _generate_audio_and_caption_lmnt(script_contents, **kwargs)
     elif method == "kokoro":
-        script_contents = _generate_audio_and_caption_kokoro(script_contents)
+        script_contents = _generate_audio_and_caption_kokoro(script_contents, **kwargs)
     else:
         raise ValueError(f"Unknown method: {method}")
     return script_contents
@@ -1,64 +1,55 @@
 from typing import Literal, Any
+from dataclasses import dataclass, field
 from openai import OpenAI
-from  backend.schemas.script import generate_model_with_context_check, reconstruct_script
+from pydantic import BaseModel
+from  backend.schemas.script import (
+    generate_model_with_context_check,
+    generate_repair_model,
+    generate_section_notes_model,
+    reconstruct_script,
+    find_script_errors,
+    ArxflixScriptDraft,
+    ScriptComponentDraft,
+    ScriptComponentType,
+)
 import instructor
 from instructor.hooks import Hooks, HookName
-import requests
 import os
+import re
 import google.generativeai as genai
 import logging
 import traceback
+import time
+from concurrent.futures import ThreadPoolExecutor
 from groq import Groq
 
-logger = logging.getLogger(__name__)
-
-
-import re
-def replace_keys_with_values(text, dict_list):
-  """
-  Replaces keys found in a text with their corresponding values from a list of dictionaries.
-
-  Args:
-    text: The input text string.
-    dict_list: A list of dictionaries where keys are patterns to search for in the text 
-               and values are the replacements.
+from backend.utils.figure_links import normalize_figure_link, resolve_figure_links
+from backend.utils.llm_router import current_cancel_scope, get_script_router
+from backend.utils.llm_metrics import LLMCallRecord, current_llm_call, track_llm_call, usage_tokens
 
-  Returns:
-    The modified text with keys replaced by values.
-  """
-
-  # Combine all dictionaries into a single dictionary for efficiency
-  combined_dict = {}
-  for d in dict_list:
-    combined_dict.update(d)
-
-  # Sort keys by length in descending order to handle overlapping keys correctly
-  sorted_keys = sorted(combined_dict.keys(), key=len, reverse=True)
-
-  # Build a regular expression pattern to match any of the keys
-  # Escape special characters in keys for use in regex
-  pattern = re.compile("|".join(map(re.escape, sorted_keys)))
-
-  # Perform the replacement using re.sub with a lambda function
-  modified_text = pattern.sub(lambda match: combined_dict[match.group(0)], text)
-
-  return modified_text
+logger = logging.getLogger(__name__)
 
-def adjust_links(text_md : str, paper_id : str):
 
-    def get_link(link,paper_id):
-        if 'ar5iv.labs.arxiv.org' in link:
-            return '![]('+link.replace('![](','https://').replace(')','')+')'
-        elif f'https:/arxiv.org/html/{paper_id}/'  in link:
-            return '![]('+link.replace('![](',f'https://arxiv.org/html/{paper_id}/').replace(')','')+')'
-        elif '(arxiv.org' in link:
-            return '![]('+link.replace('![](arxiv.org',f'https://arxiv.org/html/{paper_id}').replace(')','')+')'
-        else:
-            return '![]('+link.replace('![](',f'https://arxiv.org/html/{paper_id}/').replace(')','')+')'
+def adjust_links(text_md : str, paper_id : str) -> str:
+    """Rewrite every figure link of a markdown paper to its absolute URL.
 
-    links  = [{line : get_link(line,paper_id)} for line in text_md.split('\n') if '![](' in line]
+    Parameters
+    ----------
+    text_md : str
+        The paper markdown
+    paper_id : str
+        The paper id
 
-    return replace_keys_with_values(text_md, links)
+    Returns
+    -------
+    str
+        The markdown with absolute figure links
+    """
+    return re.sub(
+        r"!\[([^\]]*)\]\(([^)\s]+)\)",
+        lambda match: f"![{match.group(1)}]({normalize_figure_link(match.group(2), paper_id)})",
+        text_md,
+    )
 
 
 
@@ -294,11 +285,18 @@ Your output is a JSON with the following structure :
 
 
 def create_logging_hooks(tag: str = "instructor") -> Hooks:
-    """Create hooks that log each failed attempt (completion + parse errors)."""
+    """Create hooks that log each failed attempt (completion + parse errors).
+
+    Inside `track_llm_call`, the hooks also fill the metrics of the call:
+    attempts, time to first response, token usage and error reasons.
+    """
     hooks = Hooks()
     state: dict[str, Any] = {"kwargs": None, "response": None}
 
     def on_kwargs(*args: Any, **kwargs: Any) -> None:
+        record = current_llm_call.get()
+        if record is not None:
+            record.attempts += 1
         try:
             state["kwargs"] = {
                 "model": kwargs.get("model"),
@@ -314,6 +312,13 @@ def create_logging_hooks(tag: str = "instructor") -> Hooks:
 
     def on_response(response: Any) -> None:
         state["response"] = response
+        record = current_llm_call.get()
+        if record is not None:
+            if record.time_to_first_token is None:
+                record.time_to_first_token = time.time() - record.started_at
+            prompt_tokens, completion_tokens = usage_tokens(response)
+            record.prompt_tokens += prompt_tokens
+            record.completion_tokens += completion_tokens
 
     def extract_text_from_response(resp: Any) -> str | None:
         try:
@@ -328,6 +333,9 @@ def create_logging_hooks(tag: str = "instructor") -> Hooks:
         return None
 
     def on_parse_error(error: Exception) -> None:
+        record = current_llm_call.get()
+        if record is not None:
+            record.validation_errors.append(str(error)[:1000])
         model = None
         messages = None
         if isinstance(state.get("kwargs"), dict):
@@ -353,6 +361,9 @@ def create_logging_hooks(tag: str = "instructor") -> Hooks:
             logger.error(f"[{tag}] Raw completion excerpt: {raw_text[:1000]}")
 
     def on_completion_error(error: Exception) -> None:
+        record = current_llm_call.get()
+        if record is not None:
+            record.completion_errors.append(str(error)[:1000])
         logger.error(f"[{tag}] Completion error: {error}")
 
     def on_last_attempt(error: Exception) -> None:
@@ -379,110 +390,202 @@ def _correct_result_link(script: str, url: str) -> str:
     - str
         The corrected script with valid image links.
     """
-    # handle non-arXiv links
-    if "ar5iv" not in url:
-        tmp_url = url.split("/")
-        url = (
-            "https://ar5iv.labs.arxiv.org/html/" + tmp_url[-1]
-            if tmp_url[-1] != ""
-            else "https://ar5iv.labs.arxiv.org/html/" + tmp_url[-2]
-        )
-
-    split_script = script.split("n")
+    paper_id = url.rstrip("/").split("/")[-1]
+    split_script = script.split("\n")
+    figure_lines = {
+        line_idx: normalize_figure_link(line.replace(r"\Figure: ", ""), paper_id)
+        for line_idx, line in enumerate(split_script)
+        if line.startswith(r"\Figure: ")
+    }
+    resolved = resolve_figure_links(list(figure_lines.values()))
+    for line_idx, figure_url in figure_lines.items():
+        # If no candidate is reachable, leave the link as is
+        if resolved[figure_url]:
+            split_script[line_idx] = r"\Figure: " + resolved[figure_url]
+    return "\n".join(split_script)
+
+
+SCRIPT_METHODS = ("openai", "local", "gemini", "groq", "openrouter")
+
+REPAIR_PROMPT = r"""
+<context>
+You're Arxflix an AI Researcher and Content Creator on Youtube who specializes in summarizing academic papers.
+You already wrote the script of a video, but some of its components were rejected by the validator.
+</context>
 
-    for line_idx, line in enumerate(split_script):
-        if r"Figure: " in line and not line.startswith("https"):
-            tmp_line = line.replace(r"Figure: ", "")
+<goal>
+Rewrite ONLY the rejected components, keeping their position. The rest of the script is kept as it is.
+</goal>
 
-            # Construct the potential figure URL
-            if "/html/" in tmp_line:
-                modified_base_url = url.split("/html/")[0]
-                figure_url = f"{modified_base_url}{tmp_line}"
-            else:
-                figure_url = f"{url if url.endswith('/') else url+'/'}{tmp_line if tmp_line[0] != '/' else tmp_line[1:]}"
+<format_instructions>
+- Your output is a JSON with a single key "components": the list of the rewritten components (component_type, content, position).
+- The only autorized component_type are : Text, Figure, Equation and Headline.
+- Avoid markdown listing (1., 2., or - dash) at all cost. Use full sentences that are easy to understand in spoken language.
+- For Equation: Don't use $ or [, the latex context is automatically detected, and write everything in the same line.
+- Two consecutive Figure, Equation or Headline components are not allowed.
+- For Figure: only use one of the figure links listed below, exactly as written.
+</format_instructions>
+"""
 
-            try:
-                # Check if the URL leads to an image (PNG)
-                response = requests.head(figure_url)
-                if response.status_code == 200 and "image/png" in response.headers.get(
-                    "Content-Type", ""
-                ):
-                    split_script[line_idx] = r"Figure: " + figure_url
-                else:
-                    # Remove "ar5iv.labs." and try again
-                    figure_url = figure_url.replace("ar5iv.labs.", "")
-                    response = requests.head(figure_url)
-                    if (
-                        response.status_code == 200
-                        and "image/png" in response.headers.get("Content-Type", "")
-                    ):
-                        split_script[line_idx] = r"Figure: " + figure_url
-            except requests.exceptions.RequestException:
-                # If the request fails, leave the link as is (or handle the error as you prefer)
-                pass
 
-    return "n".join(split_script)
+def script_model_name(method: str) -> str:
+    """Return the model used by a script generation method."""
+    if method == "openai":
+        return os.getenv("OPENAI_MODEL", "gpt-4o")
+    if method == "groq":
+        return "llama-3.3-70b-versatile"
+    if method == "openrouter":
+        return os.getenv("SCRIPGENETOR_MODEL", "qwen/qwen3-235b-a22b-thinking-2507")
+    if method == "gemini":
+        return os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+    return "not-needed"
 
 
-def _process_script_gpt(paper: str, paper_id:str) -> str:
-    """Generate a video script for a research paper using OpenAI's GPT-4o model.
+def _build_script_client(method: Literal["openai", "local", "gemini", "groq", "openrouter"], end_point_base_url: str | None = None) -> tuple[Any, dict[str, Any]]:
+    """Create the instructor client used to generate a script with a given provider.
 
     Parameters
     ----------
-    paper : str
-        A research paper in markdown format. (For the moment, it's HTML)
+    method : "openai" | "local" | "gemini" | "groq" | "openrouter"
+        The provider to use
+    end_point_base_url : str, optional
+        Base URL of the OpenAI compatible server, only used by "local"
 
     Returns
     -------
-    str
-        The generated video script.
+    tuple[Any, dict[str, Any]]
+        The instructor client and the extra arguments of the completion call
 
     Raises
     ------
     ValueError
-        If no result is returned from OpenAI.
+        If the API key of the provider is not set.
     """
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+    if method == "openai":
+        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+        if not OPENAI_API_KEY:
+            raise ValueError("You need to set the OPENAI_API_KEY environment variable.")
+        client = instructor.from_openai(
+            OpenAI(api_key=OPENAI_API_KEY),
+            mode=instructor.Mode.JSON_SCHEMA,
+            hooks=create_logging_hooks("openai"),
+        )
+        return client, {"model": script_model_name(method), "temperature": 0}
 
-    if not OPENAI_API_KEY:
-        raise ValueError("You need to set the OPENAI_API_KEY environment variable.")
+    if method == "groq":
+        GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+        if not GROQ_API_KEY:
+            raise ValueError("You need to set the GROQ_API_KEY environment variable.")
+        client = instructor.from_groq(
+            Groq(api_key=GROQ_API_KEY),
+            mode=instructor.Mode.JSON_SCHEMA,
+            hooks=create_logging_hooks("groq"),
+        )
+        return client, {"model": script_model_name(method), "temperature": 0}
 
-    
+    if method == "openrouter":
+        OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+        OPENROUTER_MODEL = script_model_name(method)
+        OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+        if not OPENROUTER_API_KEY:
+            raise ValueError("You need to set the OPENROUTER_API_KEY environment variable.")
+        client = instructor.from_openai(
+            OpenAI(api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL),
+            mode=instructor.Mode.OPENROUTER_STRUCTURED_OUTPUTS if "gpt" not in OPENROUTER_MODEL else instructor.Mode.JSON_SCHEMA,
+            hooks=create_logging_hooks("openrouter"),
+        )
+        return client, {"model": OPENROUTER_MODEL, "temperature": 0, "max_tokens": 8000}
 
-    openai_client = instructor.from_openai(
-        OpenAI(api_key=OPENAI_API_KEY),
-        mode=instructor.Mode.JSON_SCHEMA,
-        hooks=create_logging_hooks("openai"),
-    )
-    response,raw = openai_client.chat.completions.create_with_completion(
-        model=OPENAI_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
-            {"role": "user", "content":  f"Here is the paper I want you to generate a script from, its paper_id is {paper_id} : " + paper},
-        ],
-        response_model=generate_model_with_context_check(paper_id,paper),
-        temperature=0,
-        max_retries=3
-    )
+    if method == "local":
+        client = instructor.from_openai(
+            OpenAI(api_key="not-needed", base_url=end_point_base_url),
+            hooks=create_logging_hooks("local"),
+        )
+        return client, {"model": script_model_name(method), "temperature": 0}
 
-    try :
-        result = reconstruct_script(response)
-    except Exception as e:
-        print(e)
-        raise ValueError(f"The model failed the script generation:  {e}")
-    # result = _correct_result_link(result, url)
-    return result
+    if method == "gemini":
+        GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+        genai.configure(api_key=GEMINI_API_KEY)
+
+        # Define safety settings
+        safe = [
+            {"category": "HARM_CATEGORY_DANGEROUS", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+        ]
+        client = instructor.from_gemini(
+            client=genai.GenerativeModel(
+                model_name=script_model_name(method),
+                safety_settings=safe,
+                generation_config={"temperature": 0, "top_p": 1, "max_output_tokens": 8000},
+            ),
+            mode=instructor.Mode.GEMINI_JSON,
+            hooks=create_logging_hooks("gemini"),
+        )
+        return client, {}
 
+    raise ValueError(f"Invalid method. Please choose one of {SCRIPT_METHODS}.")
 
 
-def _process_script_groq(paper: str, paper_id:str) -> str:
-    """Generate a video script for a research paper.
+def _create_script_client(method: Literal["openai", "local", "gemini", "groq", "openrouter"], end_point_base_url: str | None = None) -> tuple[Any, dict[str, Any]]:
+    """Create the instructor client of a provider, see `_build_script_client`.
+
+    When called from a routed attempt, the client is registered so that the
+    router can abort it if another provider answers first.
+    """
+    client, completion_kwargs = _build_script_client(method, end_point_base_url)
+    scope = current_cancel_scope.get()
+    if scope is not None:
+        scope.register(client)
+    return client, completion_kwargs
+
+
+def _script_messages(method: str, paper: str, paper_id: str) -> list[dict[str, str]]:
+    """Build the system and user messages asking for a script."""
+    if method == "local":
+        user_prompt = "Here is the paper I want you to generate a script from : " + paper
+    else:
+        user_prompt = f"Here is the paper I want you to generate a script from, its paper_id is {paper_id} : " + paper
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _create_completion(method: str, client: Any, completion_kwargs: dict[str, Any], **kwargs: Any) -> tuple[Any, LLMCallRecord]:
+    """Make a structured completion call and record its metrics.
+
+    Returns
+    -------
+    tuple[Any, LLMCallRecord]
+        The validated response and the metrics of the call
+    """
+    with track_llm_call(method, completion_kwargs.get("model") or script_model_name(method)) as record:
+        response, _ = client.chat.completions.create_with_completion(**kwargs, **completion_kwargs)
+    return response, record
+
+
+def _extract_figure_links(paper: str) -> list[str]:
+    """Return the figure links of a markdown paper, in order of appearance."""
+    links = re.findall(r"!\[[^\]]*\]\(([^)\s]+)\)", paper)
+    return list(dict.fromkeys(links))
+
+
+def _generate_script(method: str, paper: str, paper_id: str, end_point_base_url: str | None = None, messages: list[dict[str, str]] | None = None) -> str:
+    """Generate a script in a single call, regenerating it entirely on validation failure.
 
     Parameters
     ----------
+    method : str
+        The provider to use
     paper : str
-        A research paper in markdown format. (For the moment, it's HTML)
+        A research paper in markdown format.
+    paper_id : str
+        The paper id, "paper_id" when the paper comes from a PDF
+    messages : list[dict[str, str]], optional
+        The messages to send, by default the whole paper with the system prompt
 
     Returns
     -------
@@ -492,87 +595,104 @@ def _process_script_groq(paper: str, paper_id:str) -> str:
     Raises
     ------
     ValueError
-        If no result is returned from OpenAI.
+        If the model fails to produce a valid script.
     """
-    GROQ_API_KEY = os.getenv("OPENAI_API_KEY")
-    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "llama-3.3-70b-versatile")
-
-    if not GROQ_API_KEY:
-        raise ValueError("You need to set the OPENAI_API_KEY environment variable.")
-
-    
-
-    openai_client = instructor.from_groq(
-        Groq(api_key=os.getenv("GROQ_API_KEY")),
-        mode=instructor.Mode.JSON_SCHEMA,
-        hooks=create_logging_hooks("groq"),
-    )
-    response,raw = openai_client.chat.completions.create_with_completion(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
-            {"role": "user", "content":  f"Here is the paper I want you to generate a script from, its paper_id is {paper_id} : " + paper},
-        ],
-        response_model=generate_model_with_context_check(paper_id,paper),
-        temperature=0,
-        max_retries=3
-    )
-
-    try :
+    client, completion_kwargs = _create_script_client(method, end_point_base_url)
+    try:
+        response, _ = _create_completion(
+            method, client, completion_kwargs,
+            messages=messages or _script_messages(method, paper, paper_id),
+            response_model=generate_model_with_context_check(paper_id, paper),
+            max_retries=3,
+        )
         result = reconstruct_script(response)
     except Exception as e:
         print(e)
-        raise ValueError(f"The model failed the script generation:  {e}")
-    # result = _correct_result_link(result, url)
+        raise ValueError(f"The model failed the script generation:  {e}, {traceback.format_exc()}")
     return result
 
-def _process_script_openrouter(paper: str, paper_id: str) -> str:
-    """Generate a video script using OpenRouter (OpenAI-compatible API).
 
-    Uses the OpenAI SDK pointed to the OpenRouter base URL.
-    """
-    OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-    OPENROUTER_MODEL = os.getenv("SCRIPGENETOR_MODEL", "qwen/qwen3-235b-a22b-thinking-2507")
-    OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+@dataclass
+class RepairReport:
+    """Cost of a targeted repair compared with regenerating the whole script."""
+    failing_positions: list[int] = field(default_factory=list)
+    rounds: int = 0
+    repair_tokens: int = 0
+    repair_seconds: float = 0.0
+    full_retry_tokens: int = 0
+    full_retry_seconds: float = 0.0
+    # Why the repair was abandoned for a full regeneration, None if it was not
+    error: str | None = None
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_retry_tokens * max(self.rounds, 1) - self.repair_tokens
+
+    @property
+    def seconds_saved(self) -> float:
+        return self.full_retry_seconds * max(self.rounds, 1) - self.repair_seconds
+
+
+def _normalize_draft(draft: ArxflixScriptDraft, paper_id: str) -> ArxflixScriptDraft:
+    """Fix the structural errors of a draft that do not need the model."""
+    if paper_id != "paper_id":
+        draft.paper_id = paper_id
+    components = sorted(draft.components, key=lambda x: x.position)
+    if not components or components[0].component_type.strip() != ScriptComponentType.HEADLINE:
+        components.insert(0, ScriptComponentDraft(component_type=ScriptComponentType.HEADLINE, content=draft.title, position=0))
+    for position, comp in enumerate(components):
+        comp.position = position
+    draft.components = components
+    return draft
+
+
+def _repair_messages(draft: ArxflixScriptDraft, errors: dict[int, list[str]], figure_links: list[str]) -> list[dict[str, str]]:
+    """Build the messages asking the model to rewrite the failing components only."""
+    failing = []
+    for position, position_errors in sorted(errors.items()):
+        neighbours = [
+            f"\\{comp.component_type.strip()}: {comp.content}"
+            for comp in draft.components[max(position - 1, 0):position + 2]
+            if comp.position != position
+        ]
+        failing.append(
+            f"<component position={position}>\n"
+            f"\\{draft.components[position].component_type.strip()}: {draft.components[position].content}\n"
+            f"Errors: {'; '.join(position_errors)}\n"
+            f"Neighbours: {' | '.join(neighbours)}\n"
+            f"</component>"
+        )
+    user_prompt = (
+        f"Script title: {draft.title}\n\n"
+        "Rejected components:\n" + "\n".join(failing) + "\n\n"
+        "Figure links available in the paper:\n" + ("\n".join(figure_links) or "None, don't use Figure components")
+    )
+    return [
+        {"role": "system", "content": REPAIR_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    if not OPENROUTER_API_KEY:
-        raise ValueError("You need to set the OPENROUTER_API_KEY environment variable.")
 
-    openrouter_client = instructor.from_openai(
-        OpenAI(api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL),
-        mode=instructor.Mode.OPENROUTER_STRUCTURED_OUTPUTS if "gpt" not in OPENROUTER_MODEL else instructor.Mode.JSON_SCHEMA,
-        hooks=create_logging_hooks("openrouter"),
-    )
-    response,raw = openrouter_client.chat.completions.create_with_completion(
-        model=OPENROUTER_MODEL,
-        messages=
-        [
-            {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
-            {
-                "role": "user",
-                "content": f"Here is the paper I want you to generate a script from, its paper_id is {paper_id} : "
-                + paper,
-            },
-        ],
-        response_model=generate_model_with_context_check(paper_id, paper),
-        temperature=0,
-        max_retries=3,
-        max_tokens=8000,
-    )
+def _generate_script_with_repair(method: str, paper: str, paper_id: str, end_point_base_url: str | None = None, max_repair_rounds: int = 2, messages: list[dict[str, str]] | None = None) -> str:
+    """Generate a script, re-asking the model only for the components that fail validation.
 
-    try:
-        result = reconstruct_script(response)
-    except Exception as e:
-        print(e)
-        raise ValueError(f"The model failed the script generation:  {e}, {traceback.format_exc()}")
-    return result
-def _process_script_open_source(paper: str, paper_id:str, end_point_base_url : str ) -> str:
-    """Generate a video script for a research paper using OpenAI's GPT-4o model.
+    The first call returns an unchecked draft. Failing components are sent back
+    with their specific errors and the fixes are merged into the draft, so the
+    valid part of the script is never regenerated. Falls back to a full
+    regeneration if the script is still invalid after ``max_repair_rounds``.
 
     Parameters
     ----------
+    method : str
+        The provider to use
     paper : str
-        A research paper in markdown format. (For the moment, it's HTML)
+        A research paper in markdown format.
+    paper_id : str
+        The paper id, "paper_id" when the paper comes from a PDF
+    max_repair_rounds : int, optional
+        Number of repair calls before falling back to a full regeneration, by default 2
+    messages : list[dict[str, str]], optional
+        The messages of the first call, by default the whole paper with the system prompt
 
     Returns
     -------
@@ -582,107 +702,269 @@ def _process_script_open_source(paper: str, paper_id:str, end_point_base_url : s
     Raises
     ------
     ValueError
-        If no result is returned from OpenAI.
+        If the model fails to produce a draft, or a valid script once the
+        repair fell back to a full regeneration.
     """
+    client, completion_kwargs = _create_script_client(method, end_point_base_url)
+    report = RepairReport()
 
+    try:
+        draft, record = _create_completion(
+            method, client, completion_kwargs,
+            messages=messages or _script_messages(method, paper, paper_id),
+            response_model=ArxflixScriptDraft,
+            max_retries=3,
+        )
+        draft = _normalize_draft(draft, paper_id)
+    except Exception as e:
+        # The same error as `_generate_script`, which callers catch
+        raise ValueError(f"The model failed the script generation:  {e}, {traceback.format_exc()}")
+    report.full_retry_seconds = record.latency
+    report.full_retry_tokens = record.total_tokens
 
+    figure_links = _extract_figure_links(paper)
+    errors = find_script_errors(draft.components, paper)
+    while errors and report.rounds < max_repair_rounds:
+        report.rounds += 1
+        report.failing_positions.extend(p for p in errors if p not in report.failing_positions)
+        logger.info(f"[{method}] Repairing positions {sorted(errors)} (round {report.rounds})")
 
-    openai_client = instructor.from_openai(
-        OpenAI(api_key="not-needed", base_url=end_point_base_url),
-        hooks=create_logging_hooks("local"),
-    )
-    response,raw = openai_client.chat.completions.create_with_completion(
-        model="not-needed",
+        try:
+            repair, record = _create_completion(
+                method, client, completion_kwargs,
+                messages=_repair_messages(draft, errors, figure_links),
+                response_model=generate_repair_model(sorted(errors), paper),
+                max_retries=2,
+            )
+            report.repair_seconds += record.latency
+            report.repair_tokens += record.total_tokens
+            for comp in repair.components:
+                if not 0 <= comp.position < len(draft.components):
+                    raise ValueError(f"Repaired component at position {comp.position} is out of the script")
+                draft.components[comp.position] = ScriptComponentDraft(**comp.model_dump())
+        except Exception as e:
+            # Out of retries, or an unusable repair: the old path still produces a script
+            report.error = f"{type(e).__name__}: {e}"
+            break
+        errors = find_script_errors(draft.components, paper)
+
+    if report.error is None:
+        try:
+            script = generate_model_with_context_check(paper_id, paper)(**draft.model_dump())
+        except ValueError as e:
+            report.error = f"{type(e).__name__}: {e}"
+    if report.error is not None:
+        logger.warning(
+            f"[{method}] Repair failed after {report.rounds} round(s) ({report.error}), regenerating the whole script"
+        )
+        return _generate_script(method, paper, paper_id, end_point_base_url, messages)
+
+    if report.rounds:
+        logger.info(
+            f"[{method}] Repaired {len(report.failing_positions)} component(s) in {report.rounds} round(s): "
+            f"{report.repair_tokens} tokens / {report.repair_seconds:.1f}s spent, "
+            f"{report.tokens_saved} tokens / {report.seconds_saved:.1f}s saved compared with a full retry"
+        )
+    return reconstruct_script(script)
+
+
+MAP_PROMPT = r"""
+<context>
+You're Arxflix an AI Researcher and Content Creator on Youtube who specializes in summarizing academic papers.
+You are preparing the script of a 5-6 minutes video on a research paper. The paper is too long to be read at once, so you read it section by section.
+</context>
+
+<goal>
+Take the notes you will need to write the script from the section you will receve.
+</goal>
+
+<format_instructions>
+- Keep only what matters for a research-focused audience: the problem, the key ideas, the method, the main results.
+- Write the key points as full sentences, without markdown listing.
+- For equations: Don't use $ or [, and write everything in the same line.
+- For figures: copy the exact link of the figure as it is in the section, keep 'https://'. Don't hallucinate figures.
+</format_instructions>
+"""
+
+MAP_REDUCE_SECTION_CHARS = int(os.getenv("SCRIPT_MAP_REDUCE_SECTION_CHARS", "24000"))
+MAP_REDUCE_CONCURRENCY = int(os.getenv("SCRIPT_MAP_REDUCE_CONCURRENCY", "4"))
+
+
+def _split_sections(paper: str, max_chars: int = MAP_REDUCE_SECTION_CHARS) -> list[str]:
+    """Split a markdown paper on its headings into chunks of at most ``max_chars``.
+
+    Consecutive small sections are merged together, sections longer than
+    ``max_chars`` are split on paragraphs.
+
+    Parameters
+    ----------
+    paper : str
+        A research paper in markdown format.
+    max_chars : int, optional
+        Maximum size of a chunk, by default MAP_REDUCE_SECTION_CHARS
+
+    Returns
+    -------
+    list[str]
+        The chunks, in order
+    """
+    sections = [s for s in re.split(r"\n(?=#{1,3} )", paper) if s.strip()]
+    chunks: list[str] = []
+    for section in sections:
+        parts = [section]
+        if len(section) > max_chars:
+            parts = []
+            for paragraph in section.split("\n\n"):
+                if parts and len(parts[-1]) + len(paragraph) + 2 <= max_chars:
+                    parts[-1] += "\n\n" + paragraph
+                else:
+                    parts.append(paragraph)
+        for part in parts:
+            if chunks and len(chunks[-1]) + len(part) + 1 <= max_chars:
+                chunks[-1] += "\n" + part
+            else:
+                chunks.append(part)
+    return chunks
+
+
+def _take_section_notes(method: str, client: Any, completion_kwargs: dict[str, Any], section: str) -> BaseModel:
+    """Ask the model for the notes of one section of the paper."""
+    notes, _ = _create_completion(
+        method, client, completion_kwargs,
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
-            {"role": "user", "content":  "Here is the paper I want you to generate a script from : " + paper},
+            {"role": "system", "content": MAP_PROMPT},
+            {"role": "user", "content": "Here is the section : " + section},
         ],
-        response_model=generate_model_with_context_check(paper_id,paper),
-        temperature=0,
-        max_retries=3
+        response_model=generate_section_notes_model(section),
+        max_retries=3,
+    )
+    return notes
+
+
+def _compose_messages(method: str, notes: list[BaseModel], paper_id: str) -> list[dict[str, str]]:
+    """Build the messages asking for the final script from the notes of every section."""
+    formatted_notes = []
+    for section_notes in notes:
+        formatted = f"## {section_notes.section_title}\n" + "\n".join(section_notes.key_points)
+        if section_notes.equations:
+            formatted += "\nEquations:\n" + "\n".join(section_notes.equations)
+        if section_notes.figures:
+            formatted += "\nFigures:\n" + "\n".join(f"![]({figure})" for figure in section_notes.figures)
+        formatted_notes.append(formatted)
+    return _script_messages(
+        method,
+        "\n\n(The paper was too long, here are the notes taken on each of its sections)\n\n" + "\n\n".join(formatted_notes),
+        paper_id,
     )
-
-    try :
-        result = reconstruct_script(response)
-    except Exception as e:
-        print(e)
-        raise ValueError(f"The model failed the script generation:  {e}")
-    # result = _correct_result_link(result, url)
-    return result
-
 
 
+def _generate_script_map_reduce(method: str, paper: str, paper_id: str, end_point_base_url: str | None = None, repair: bool = False, concurrency: int = MAP_REDUCE_CONCURRENCY) -> str:
+    """Generate a script for a long paper in two steps.
 
-def _process_script_open_gemini(paper: str, paper_id:str, end_point_base_url : str = "https://generativelanguage.googleapis.com/v1beta/openai/") -> str:
-    """Generate a video script for a research paper using OpenAI's GPT-4o model.
+    Notes are first taken on each section of the paper in parallel, then the
+    script is composed from the notes in a single, much smaller call. The
+    script goes through the same validation as the single-shot generation.
 
     Parameters
     ----------
+    method : str
+        The provider to use
     paper : str
-        A research paper in markdown format. (For the moment, it's HTML)
+        A research paper in markdown format.
+    paper_id : str
+        The paper id, "paper_id" when the paper comes from a PDF
+    repair : bool, optional
+        Repair the composed script instead of regenerating it, by default False
+    concurrency : int, optional
+        Maximum number of sections summarized at the same time, by default MAP_REDUCE_CONCURRENCY
 
     Returns
     -------
     str
         The generated video script.
-
-    Raises
-    ------
-    ValueError
-        If no result is returned from OpenAI.
     """
+    sections = _split_sections(paper)
+    if len(sections) <= 1:
+        logger.info(f"[{method}] Paper fits in a single section, using single-shot generation")
+        messages = None
+    else:
+        client, completion_kwargs = _create_script_client(method, end_point_base_url)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            notes = list(executor.map(lambda section: _take_section_notes(method, client, completion_kwargs, section), sections))
+        logger.info(f"[{method}] Took notes on {len(sections)} sections in {time.perf_counter() - start:.1f}s")
+        messages = _compose_messages(method, notes, paper_id)
+
+    if repair:
+        return _generate_script_with_repair(method, paper, paper_id, end_point_base_url, messages=messages)
+    return _generate_script(method, paper, paper_id, end_point_base_url, messages)
+
+
+ROUTED_METHODS = ("openrouter", "openai", "gemini", "groq")
+# instructor's Gemini client wraps a genai.GenerativeModel, which has no HTTP
+# pool to close: its request can't be aborted, so it is never hedged
+UNCANCELLABLE_ROUTED_METHODS = ("gemini",)
+SCRIPT_API_KEYS = {
+    "openrouter": "OPENROUTER_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
 
 
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+def _routed_providers() -> list[str]:
+    """Return the providers the "routed" method can use.
 
+    Read from SCRIPT_ROUTER_PROVIDERS (comma separated), by default every
+    provider whose API key is set.
+    """
+    providers = os.getenv("SCRIPT_ROUTER_PROVIDERS")
+    if providers:
+        return [p.strip() for p in providers.split(",") if p.strip()]
+    return [p for p in ROUTED_METHODS if os.getenv(SCRIPT_API_KEYS[p])]
 
-    genai.configure(api_key=GEMINI_API_KEY)
 
-    # Define safety settings
-    safe = [
-        {"category": "HARM_CATEGORY_DANGEROUS", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-    ]
+def script_models(method: str, end_point_base_url: str | None = None) -> list[str]:
+    """Return the provider/model pairs a script generation method may use.
 
-    gemini_client = instructor.from_gemini(client=genai.GenerativeModel(
-    model_name=GEMINI_MODEL,
-    safety_settings=safe,
-    generation_config={"temperature": 0, "top_p": 1, "max_output_tokens": 8000},
-    ),
-    mode=instructor.Mode.GEMINI_JSON,
-    hooks=create_logging_hooks("gemini"),)
-    
+    Scripts of the same paper from different models differ, so this tells
+    apart the results of a method when its model is changed in the
+    environment.
+    """
+    if method == "routed":
+        return [f"{provider}/{script_model_name(provider)}" for provider in _routed_providers()]
+    if method == "local":
+        return [f"local/{end_point_base_url}"]
+    return [f"{method}/{script_model_name(method)}"]
 
-    try :
-        response,raw = gemini_client.chat.completions.create_with_completion(
 
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT_NO_LINK if paper_id == "paper_id" else SYSTEM_PROMPT},
-            {"role": "user", "content": f"Here is the paper I want you to generate a script from, its paper_id is {paper_id} : " + paper},
-        ],
-        response_model=generate_model_with_context_check(paper_id,paper),
-        max_retries=3
-    )
-        logger.warning(f"Number input_token : {raw.usage_metadata.prompt_token_count}")
-        result = reconstruct_script(response)
-    except Exception as e:
-        print(e)
-        raise ValueError(f"The model failed the script generation:  {e}")
-    # result = _correct_result_link(result, url)
-    return result
+def _run_script_method(method: str, paper: str, paper_id: str, end_point_base_url: str | None, repair: bool, strategy: str) -> str:
+    """Generate a script with one provider using the requested strategy."""
+    if strategy == "map_reduce":
+        return _generate_script_map_reduce(method, paper, paper_id, end_point_base_url, repair)
+    if repair:
+        return _generate_script_with_repair(method, paper, paper_id, end_point_base_url)
+    return _generate_script(method, paper, paper_id, end_point_base_url)
 
 
-def process_script(method: Literal["openai", "local", "gemini", "groq", "openrouter"], paper_markdown: str, paper_id : str, end_point_base_url : str, from_pdf: bool=False) -> str:
+def process_script(method: Literal["openai", "local", "gemini", "groq", "openrouter", "routed"], paper_markdown: str, paper_id : str, end_point_base_url : str, from_pdf: bool=False, repair: bool=False, strategy: Literal["single", "map_reduce"]="single") -> str:
     """Generate a video script for a research paper.
 
     Parameters
     ----------
+    method : "openai" | "local" | "gemini" | "groq" | "openrouter" | "routed"
+        The provider to use. "routed" sends the request to the fastest
+        configured provider and hedges with a second one when it is slow,
+        see `HedgedRouter`. Gemini is only used as a fallback: its request
+        can't be cancelled, so it is neither hedged nor sent as a hedge.
     paper_markdown : str
         A research paper in markdown format.
+    repair : bool, optional
+        Re-ask the model only for the components failing validation instead of
+        regenerating the whole script, by default False
+    strategy : "single" | "map_reduce", optional
+        Send the whole paper in one call, or summarize its sections in
+        parallel before composing the script, by default "single"
 
     Returns
     -------
@@ -692,22 +974,20 @@ def process_script(method: Literal["openai", "local", "gemini", "groq", "openrou
     Raises
     ------
     ValueError
-        If no result is returned from OpenAI.
+        If no result is returned from the model.
     """
     if not from_pdf:
         pd_corrected_links = adjust_links(paper_markdown , paper_id )
     else:
         pd_corrected_links = paper_markdown
         paper_id = "paper_id"
-    if method == "openai":
-        return _process_script_gpt(pd_corrected_links,paper_id)
-    if method == "local":
-        return _process_script_open_source(pd_corrected_links, paper_id, end_point_base_url)
-    if method == "gemini":
-        return _process_script_open_gemini(pd_corrected_links, paper_id, end_point_base_url)
-    if method == "groq":
-        return _process_script_groq(pd_corrected_links,paper_id)
-    if method == "openrouter":
-        return _process_script_openrouter(pd_corrected_links, paper_id)
-    else:
-        raise ValueError("Invalid method. Please choose 'openai'.")
+    if method == "routed":
+        return get_script_router().run(
+            _routed_providers(),
+            lambda provider: _run_script_method(provider, pd_corrected_links, paper_id, end_point_base_url, repair, strategy),
+            label=lambda provider: f"{provider}/{script_model_name(provider)}",
+            cancellable=lambda provider: provider not in UNCANCELLABLE_ROUTED_METHODS,
+        )
+    if method not in SCRIPT_METHODS:
+        raise ValueError(f"Invalid method. Please choose one of {SCRIPT_METHODS}.")
+    return _run_script_method(method, pd_corrected_links, paper_id, end_point_base_url, repair, strategy)
@@ -1,33 +1,63 @@
 import logging
+import os
 import subprocess
 from pathlib import Path
-from dataclasses import dataclass, asdict, field
-from time import sleep
-from typing import Literal
+from dataclasses import dataclass, asdict
+from collections import deque
+from typing import Callable, Literal
 import json
-import socket
+
+from backend.utils.audio_viz import export_audio_viz, read_audio_viz_meta
+from backend.utils.incremental_render import (
+    build_render_segments,
+    export_render_segments,
+    plan_incremental_render,
+    read_render_segments,
+    render_incremental,
+    render_segments_path,
+    video_keyframes,
+)
+from backend.utils.layered_render import (
+    DYNAMIC_COMPOSITION_ID,
+    STATIC_COMPOSITION_ID,
+    TRANSITION_FRAMES,
+    render_layered,
+    render_storyboard,
+)
+from backend.utils.remotion_bundle import get_remotion_bundle
+from backend.utils.render_chunks import render_chunked
+from backend.utils.render_concurrency import resolve_render_concurrency
+from backend.utils.render_daemon import get_render_daemon
+from backend.utils.render_manifest import RENDER_MANIFEST_NAME, export_render_manifest
+from backend.utils.render_profiles import get_render_profile
+from backend.utils.render_progress import (
+    RenderProgress,
+    RenderProgressTracker,
+    build_frame_profile,
+    parse_rendered_frames,
+)
+from backend.utils.static_server import get_static_server
 
 VIDEO_FPS = 30
 VIDEO_HEIGHT = 1080
 VIDEO_WIDTH = 1920
 REMOTION_ROOT_PATH = Path("frontend/src/remotion/index.ts")
 REMOTION_COMPOSITION_ID = "Arxflix"
-REMOTION_CONCURRENCY = 6
-
-logger = logging.getLogger(__name__)
+# The narration starts after the intro of the composition (see Main.tsx)
+INTRO_DURATION_IN_SECONDS = 2
+# Number of browser tabs rendering frames in parallel, or "auto", see `resolve_render_concurrency`
+REMOTION_CONCURRENCY = os.getenv("REMOTION_CONCURRENCY", "auto")
+# "cli" spawns `remotion render` per video, "daemon" uses the warm render service
+REMOTION_RENDERER = os.getenv("REMOTION_RENDERER", "cli")
 
+# Props that change with every run without changing the video
+_PER_RUN_PROPS = {"subtitlesFileName", "audioFileName", "richContentFileName", "manifestFileName", "duration"}
 
-def get_free_port():
-    sock = socket.socket()
-    sock.bind(("", 0))
-    free_port = str(sock.getsockname()[1])
-    sock.close()
-    return free_port
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class CompositionProps:
-    durationInSeconds: int = 5
     subtitlesFileName: str = "frontend/public/output.srt"
     audioFileName: str = "frontend/public/audio.wav"
     richContentFileName: str = "frontend/public/output.json"
@@ -40,101 +70,359 @@ class CompositionProps:
     waveLinesToDisplay: int = 300
     waveFreqRangeStartIndex: int = 5
     waveNumberOfSamples: Literal["32", "64", "128", "256", "512"] = "512"
-    durationInFrames: int = field(init=False)
-
-    def __post_init__(self):
-        self.durationInFrames: int = self.durationInSeconds * VIDEO_FPS + 7 * VIDEO_FPS
-
-
-def expose_directory(directory: Path):
-    # pnpx http-server --cors -a localhost -p 8080
-    subprocess.run(
-        [
-            "pnpx",
-            "http-server",
-            "--cors",
-            "-a",
-            "localhost",
-            "-p",
-            "8080",
-        ],
-        cwd=directory.absolute().as_posix(),
+    # Precomputed words, rich content and duration, see `build_render_manifest`
+    manifestFileName: str | None = None
+    # Length of the composition in frames, the audio is probed when missing
+    duration: int | None = None
+    # Frame rate of the composition, VIDEO_FPS when missing
+    fps: int | None = None
+
+
+def render_cli(
+    serve_url: Path,
+    props: dict,
+    output: Path,
+    concurrency: int = 1,
+    composition_id: str = REMOTION_COMPOSITION_ID,
+    frame_range: tuple[int, int] | None = None,
+    muted: bool = False,
+    scale: float = 1.0,
+    crf: int | None = None,
+    x264_preset: str | None = None,
+    on_frames: Callable[[int], None] | None = None,
+) -> Path:
+    """Render a composition with a one-off `remotion render` process.
+
+    Parameters
+    ----------
+    serve_url : Path
+        The Remotion bundle directory
+    props : dict
+        The props of the composition
+    output : Path
+        The output video
+    concurrency : int, optional
+        Number of browser tabs rendering frames in parallel, by default 1
+    composition_id : str, optional
+        The composition to render, by default REMOTION_COMPOSITION_ID
+    frame_range : tuple[int, int] | None, optional
+        First and last frame (inclusive) to render, by default the whole composition
+    muted : bool, optional
+        Render without the audio track, by default False
+    scale : float, optional
+        Factor applied to the resolution of the composition, by default 1.0
+    crf : int | None, optional
+        x264 constant rate factor, by default Remotion's default
+    x264_preset : str | None, optional
+        x264 preset, by default Remotion's default
+    on_frames : Callable[[int], None] | None, optional
+        Called with the number of rendered frames parsed from the output of
+        the process, which is then not shown, by default None
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    command = [
+        "npx",
+        "remotion",
+        "render",
+        serve_url.absolute().as_posix(),
+        composition_id,
+        output.absolute().as_posix(),
+        "--props",
+        json.dumps(props),
+        "--concurrency",
+        str(concurrency),
+    ]
+    if frame_range:
+        command += ["--frames", f"{frame_range[0]}-{frame_range[1]}"]
+    if muted:
+        command.append("--muted")
+    if scale != 1.0:
+        command += ["--scale", str(scale)]
+    if crf is not None:
+        command += ["--crf", str(crf)]
+    if x264_preset:
+        command += ["--x264-preset", x264_preset]
+    if on_frames is None:
+        render_proc = subprocess.run(command, cwd=Path("frontend").absolute().as_posix())
+        if render_proc.returncode != 0:
+            raise RuntimeError(f"Remotion render failed with exit code {render_proc.returncode}")
+        return output
+    # Text mode splits the lines on "\r" too, which redraws the progress bar
+    render_proc = subprocess.Popen(
+        command,
+        cwd=Path("frontend").absolute().as_posix(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    tail: deque[str] = deque(maxlen=50)
+    for line in render_proc.stdout:
+        tail.append(line.rstrip())
+        frames = parse_rendered_frames(line)
+        if frames is not None:
+            on_frames(frames)
+    if render_proc.wait() != 0:
+        output_tail = "\n".join(tail)
+        raise RuntimeError(f"Remotion render failed with exit code {render_proc.returncode}:\n{output_tail}")
+    return output
+
+
+def ensure_audio_viz(input: Path, audio_path: Path | None = None) -> dict:
+    """Export the AudioViz data of a narration for the composition props, unless it is up to date.
+
+    Parameters
+    ----------
+    input : Path
+        The directory of the assets, where the data is written
+    audio_path : Path | None, optional
+        The narration, by default ``input/audio.wav``
+
+    Returns
+    -------
+    dict
+        The parameters of the data, see `export_audio_viz`
+    """
+    audio_path = audio_path or input / "audio.wav"
+    props = CompositionProps()
+    meta = read_audio_viz_meta(input)
+    if (
+        meta is not None
+        and meta["fps"] == VIDEO_FPS
+        and meta["numberOfSamples"] == int(props.waveNumberOfSamples)
+        and meta["startIndex"] == props.waveFreqRangeStartIndex
+        and meta["bins"] >= props.waveLinesToDisplay
+        and (input / meta["file"]).stat().st_mtime >= audio_path.stat().st_mtime
+    ):
+        return meta
+    return export_audio_viz(
+        audio_path,
+        input,
+        VIDEO_FPS,
+        number_of_samples=int(props.waveNumberOfSamples),
+        start_index=props.waveFreqRangeStartIndex,
+        bins=props.waveLinesToDisplay,
     )
 
 
 def process_video(
     input: Path,
     output: Path = Path("frontend/public/output.mp4"),
+    renderer: Literal["cli", "daemon"] = REMOTION_RENDERER,
+    concurrency: int | str | None = REMOTION_CONCURRENCY,
+    chunks: int = 1,
+    layered: bool = False,
+    profile: str = "final",
+    on_progress: Callable[[RenderProgress], None] | None = None,
+    frame_profile: bool = False,
+    incremental: bool = False,
 ):
-    # Get the paper id,
-    # Pick an available port,
-    free_port = get_free_port()
-    print(f"Free port: {free_port}")
-    # Ensure that figures inside the Rich Content JSON can be fetched by the Remotion bundle.
-    # If a Figure has a local filename (e.g. "figure_1.png"), we prefix it with the URL of the
-    # temporary static server so that the browser inside Remotion can retrieve it over HTTP.
-    rich_json_path = input / "rich.json"
-    if rich_json_path.exists():
-        try:
-            data = json.loads(rich_json_path.read_text())
-            # The JSON is expected to be a list of dicts.
-            for item in data:
-                if (
-                    isinstance(item, dict)
-                    and item.get("type") == "figure"
-                    and isinstance(item.get("content"), str)
-                    and not item["content"].lower().startswith(("http://", "https://"))
-                ):
-                    # Prefer IPv4 to avoid environments where localhost resolves to ::1
-                    item["content"] = f"http://127.0.0.1:{free_port}/{item['content']}"
-            rich_json_path.write_text(json.dumps(data))
-        except Exception as e:
-            logger.warning(f"Failed to rewrite {rich_json_path} with absolute URLs: {e}")
-    with subprocess.Popen(
-        [
-            "pnpx",
-            "http-server",
-            input.absolute().as_posix(),
-            "--cors",
-            "-a",
-            "0.0.0.0",
-            "-p",
-            free_port,
-        ],
-        cwd=input.absolute().as_posix(),
-    ) as static_server:
-        print(f"Exposed directory {input}")
-        sleep(2)
-        logger.info(f"Exposed directory {input}")
-        # Use IPv4 to avoid environments where localhost resolves to IPv6 ::1
-        base_url = f"http://127.0.0.1:{free_port}"
+    render_profile = get_render_profile(profile)
+    if layered and chunks > 1:
+        raise ValueError("The layered render can't be split in chunks")
+    if render_profile.storyboard and (layered or chunks > 1):
+        raise ValueError("The storyboard profile only renders stills, it can't be layered or split in chunks")
+    if frame_profile and (renderer != "daemon" or layered or render_profile.storyboard):
+        raise ValueError("The frame profile needs the daemon renderer and a render of every frame")
+    if incremental and (layered or render_profile.storyboard):
+        raise ValueError("The incremental render can't be layered or a storyboard")
+    # The daemon lends a browser to one job at a time: with fewer browsers than
+    # chunks, the chunks would render one after the other
+    range_renderer = renderer
+    if chunks > 1 and renderer == "daemon" and get_render_daemon().browsers < chunks:
+        if frame_profile:
+            raise ValueError(f"The frame profile of {chunks} chunks needs RENDER_DAEMON_BROWSERS={chunks} or more")
+        logger.warning(
+            f"The render daemon has {get_render_daemon().browsers} browser(s) for {chunks} chunks, "
+            "rendering the chunks with parallel remotion processes instead"
+        )
+        range_renderer = "cli"
+    concurrency = resolve_render_concurrency(concurrency)
+    fps = render_profile.fps or VIDEO_FPS
+    intro_frames = INTRO_DURATION_IN_SECONDS * fps
+    # Parse the subtitles and rich content, measure the audio and compute the
+    # waveform once, not in every browser tab. The waveform is looked up by
+    # time, so every profile reuses the data computed at VIDEO_FPS.
+    ensure_audio_viz(input)
+    manifest = export_render_manifest(input, fps)
+    total_frames = manifest["durationInFrames"]
+    tracker = RenderProgressTracker(total_frames, on_progress)
+    # Parse the progress of `remotion render` only when someone listens, its
+    # own progress bar is shown otherwise
+    on_frames = tracker.update if on_progress else None
+    encoding = {"scale": render_profile.scale, "crf": render_profile.crf, "x264_preset": render_profile.x264_preset}
+    # ffmpeg composes the layered and storyboard renders, with its own defaults
+    compose_encoding = {
+        "scale": render_profile.scale,
+        "crf": render_profile.crf or 18,
+        "x264_preset": render_profile.x264_preset or "fast",
+    }
+    with get_static_server().serve(input) as base_url:
+        logger.info(f"Exposed directory {input} on {base_url}")
+        # Local figures are relative to the manifest URL, so the browser inside
+        # Remotion retrieves them from the static server.
         composition_props = CompositionProps(
             subtitlesFileName=f"{base_url}/subtitles.srt",
             audioFileName=f"{base_url}/audio.wav",
             richContentFileName=f"{base_url}/rich.json",
+            manifestFileName=f"{base_url}/{RENDER_MANIFEST_NAME}",
+            duration=total_frames,
+            fps=fps,
         )
-        logger.info(f"Generating video to {output}")
-        render_proc = subprocess.run(
-            [
-                "npx",
-                "remotion",
-                "render",
-                REMOTION_ROOT_PATH.absolute().as_posix(),
-                "--props",
-                json.dumps(asdict(composition_props)),
-                "--compositionId",
+        if render_profile.wave_lines:
+            composition_props.waveLinesToDisplay = render_profile.wave_lines
+        props = asdict(composition_props)
+        serve_url = get_remotion_bundle()
+        logger.info(f"Generating {render_profile.name} video to {output}")
+
+        def render_range(frame_range: tuple[int, int], range_output: Path, range_concurrency: int) -> Path:
+            # A muted frame range of the composition, for the chunked and incremental renders
+            if range_renderer == "daemon":
+                return get_render_daemon().render(
+                    serve_url.absolute().as_posix(),
+                    REMOTION_COMPOSITION_ID,
+                    props,
+                    range_output,
+                    frame_range=frame_range,
+                    concurrency=range_concurrency,
+                    muted=True,
+                    **encoding,
+                    profile=frame_profile,
+                    on_progress=tracker.daemon_callback(str(frame_range[0])),
+                )
+            return render_cli(
+                serve_url, props, range_output,
+                concurrency=range_concurrency, frame_range=frame_range, muted=True, **encoding,
+                on_frames=(lambda frames: on_frames(frames, str(frame_range[0]))) if on_frames else None,
+            )
+
+        # What each script segment shows, to only re-render the changed ones next time
+        segments = build_render_segments(input, manifest, intro_frames)
+        settings = {
+            "bundle": serve_url.name,
+            "profile": render_profile.name,
+            "props": {key: value for key, value in props.items() if key not in _PER_RUN_PROPS},
+        }
+        previous = read_render_segments(output) if incremental else None
+        plan = None
+        if previous is not None and previous["settings"] == settings:
+            keyframes = video_keyframes(output, fps)
+            plan = plan_incremental_render(previous, segments, sorted(keyframes), total_frames)
+            if any(kind == "copy" for kind, _, _ in plan):
+                # Only the rendered frames are reported
+                tracker.total_frames = sum(end - start for kind, start, end in plan if kind == "render")
+            else:
+                logger.info("Nothing of the previous render can be reused, rendering every frame")
+                plan = None
+        elif incremental:
+            logger.info("No previous render with the same settings, rendering every frame")
+
+        if render_profile.storyboard:
+            def render_storyboard_stills(frames: list[int], out_dir: Path) -> list[Path]:
+                return get_render_daemon().render_stills(
+                    serve_url.absolute().as_posix(),
+                    REMOTION_COMPOSITION_ID,
+                    props,
+                    frames,
+                    out_dir,
+                    concurrency=concurrency,
+                    scale=render_profile.scale,
+                    # Each still stands for a segment, report the share of the video done
+                    on_progress=lambda message: tracker.update(int(message["progress"] * total_frames)),
+                )
+
+            render_storyboard(
+                render_storyboard_stills, manifest, output, input / "audio.wav",
+                fps, intro_frames, **compose_encoding,
+            )
+        elif layered:
+            # `remotion still` starts a browser per frame, so the stills go to
+            # the daemon whatever the renderer. The dynamic layer only renders
+            # at the same time with a browser of its own: a remotion process,
+            # unless the daemon has a second browser to lend
+            dynamic_renderer = "daemon" if renderer == "daemon" and get_render_daemon().browsers > 1 else "cli"
+
+            def render_stills(frames: list[int], out_dir: Path) -> list[Path]:
+                return get_render_daemon().render_stills(
+                    serve_url.absolute().as_posix(),
+                    STATIC_COMPOSITION_ID,
+                    props,
+                    frames,
+                    out_dir,
+                    concurrency=max(1, concurrency // 2),
+                    scale=render_profile.scale,
+                )
+
+            def render_dynamic(dynamic_output: Path) -> Path:
+                if dynamic_renderer == "daemon":
+                    return get_render_daemon().render(
+                        serve_url.absolute().as_posix(),
+                        DYNAMIC_COMPOSITION_ID,
+                        props,
+                        dynamic_output,
+                        concurrency=max(1, concurrency - concurrency // 2),
+                        muted=True,
+                        **encoding,
+                        on_progress=tracker.daemon_callback(),
+                    )
+                return render_cli(
+                    serve_url, props, dynamic_output,
+                    concurrency=max(1, concurrency - concurrency // 2),
+                    composition_id=DYNAMIC_COMPOSITION_ID, muted=True, **encoding, on_frames=on_frames,
+                )
+
+            render_layered(
+                render_stills, render_dynamic, manifest, output, input / "audio.wav",
+                fps, intro_frames, **compose_encoding,
+            )
+        elif plan:
+            render_incremental(
+                lambda frame_range, range_output: render_range(frame_range, range_output, concurrency),
+                output, keyframes, plan, output, input / "audio.wav",
+                audio_offset=INTRO_DURATION_IN_SECONDS,
+            )
+        elif chunks > 1:
+            chunk_concurrency = max(1, concurrency // chunks)
+            render_chunked(
+                lambda frame_range, chunk_output: render_range(frame_range, chunk_output, chunk_concurrency),
+                total_frames, chunks, output, input / "audio.wav",
+                audio_offset=INTRO_DURATION_IN_SECONDS,
+            )
+        elif renderer == "daemon":
+            get_render_daemon().render(
+                serve_url.absolute().as_posix(),
                 REMOTION_COMPOSITION_ID,
-                "--concurrency",
-                str(REMOTION_CONCURRENCY),
-                "--output",
-                output.absolute().as_posix(),
-            ],
-            cwd=Path("frontend").absolute().as_posix(),
-        )
-        static_server.terminate()
-        if render_proc.returncode != 0:
-            raise RuntimeError(f"Remotion render failed with exit code {render_proc.returncode}")
+                props,
+                output,
+                concurrency=concurrency,
+                **encoding,
+                profile=frame_profile,
+                on_progress=tracker.daemon_callback(),
+            )
+        else:
+            render_cli(serve_url, props, output, concurrency=concurrency, **encoding, on_frames=on_frames)
         if not output.exists():
             raise FileNotFoundError(str(output))
         logger.info(f"Generated video to {output}")
-        return output
+    if layered or render_profile.storyboard:
+        # Not a Remotion encode, its parts can't be spliced with rendered ones
+        render_segments_path(output).unlink(missing_ok=True)
+    else:
+        export_render_segments(output, segments, settings)
+    if frame_profile:
+        export_frame_profile(tracker.frame_times, manifest, intro_frames, output.with_suffix(".profile.json"))
+    return output
+
+
+def export_frame_profile(frame_times: dict[int, float], manifest: dict, intro_frames: int, path: Path) -> dict:
+    """Write the frame timing profile of a render, see `build_frame_profile`, and log its bottlenecks."""
+    frame_profile = build_frame_profile(frame_times, manifest, intro_frames, TRANSITION_FRAMES)
+    path.write_text(json.dumps(frame_profile, indent=2))
+    components = ", ".join(
+        f"{tag} {stats['mean_ms']:.0f}ms (x{stats['vs_median']})" for tag, stats in frame_profile["components"].items()
+    )
+    logger.info(f"Frame profile written to {path}, mean render time by component: {components}")
+    return frame_profile
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Callable
+
+import soundfile as sf
+
+from backend.utils.render_chunks import mux_audio
+
+logger = logging.getLogger(__name__)
+
+# Written next to the assets by generate_assets, see `export_segments_json`
+SCRIPT_SEGMENTS_NAME = "segments.json"
+RENDER_SEGMENTS_VERSION = 1
+
+
+def render_segments_path(video: Path) -> Path:
+    """Return where the segments of a rendered video are recorded: ``<video>.segments.json``."""
+    return video.with_suffix(".segments.json")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def build_render_segments(input_dir: Path, manifest: dict[str, Any], intro_frames: int) -> list[dict[str, Any]]:
+    """Split a video into the frame ranges of its script segments, with a key of what each one shows.
+
+    The intro is a segment, then each text of the script with the silence
+    after it. The key of a segment covers its text, its audio samples, the
+    words of its subtitles and the rich content on screen (local figures by
+    their bytes), with times relative to the start of the segment. A segment
+    with the same key in a previous render looks the same, wherever it is in
+    the video.
+
+    Parameters
+    ----------
+    input_dir : Path
+        The directory of the assets, with the segments.json of generate_assets
+    manifest : dict[str, Any]
+        The render manifest of the video
+    intro_frames : int
+        Number of frames of the intro
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The key, first frame and end frame (exclusive) of each segment, in
+        order. Without segments.json, the narration is a single segment.
+    """
+    fps = manifest["fps"]
+    total_frames = manifest["durationInFrames"]
+
+    def figure_key(content: str) -> str:
+        path = input_dir / content
+        return _digest(path.read_bytes()) if content and path.is_file() else content
+
+    intro_key = _digest(json.dumps([manifest["intro"]["title"], figure_key(manifest["intro"]["figure"])]).encode())
+    segments = [{"key": intro_key, "start": 0, "end": min(intro_frames, total_frames)}]
+    script_segments_path = input_dir / SCRIPT_SEGMENTS_NAME
+    audio, sample_rate = sf.read(str(input_dir / "audio.wav"), dtype="float32", always_2d=True)
+    if script_segments_path.exists():
+        script_segments = json.loads(script_segments_path.read_text())
+    else:
+        script_segments = [{"content": "", "start": 0.0, "end": len(audio) / sample_rate}]
+    for segment in script_segments:
+        start = intro_frames + round(segment["start"] * fps)
+        end = min(total_frames, intro_frames + round(segment["end"] * fps))
+        if start >= end:
+            continue
+        # Manifest times are relative to the narration, in frames
+        narration_start, narration_end = segment["start"] * fps, segment["end"] * fps
+        words = [word["text"] for word in manifest["words"] if narration_start <= word["start"] < narration_end]
+        rich_content = [
+            [
+                item["type"],
+                figure_key(item["content"]) if item["type"] == "figure" else item["content"],
+                round(item["start"] / fps - segment["start"], 2),
+                round(item["end"] / fps - segment["start"], 2),
+            ]
+            for item in manifest["richContent"]
+            if item["start"] < narration_end and item["end"] > narration_start
+        ]
+        samples = audio[round(segment["start"] * sample_rate):round(segment["end"] * sample_rate)]
+        key = _digest(json.dumps([segment["content"], words, rich_content, _digest(samples.tobytes())]).encode())
+        segments.append({"key": key, "start": start, "end": end})
+    return segments
+
+
+def export_render_segments(video: Path, segments: list[dict[str, Any]], settings: dict[str, Any]) -> None:
+    """Record the segments of a rendered video and the settings it was rendered with."""
+    record = {
+        "version": RENDER_SEGMENTS_VERSION,
+        "settings": settings,
+        "frames": segments[-1]["end"] if segments else 0,
+        "segments": segments,
+    }
+    render_segments_path(video).write_text(json.dumps(record))
+
+
+def read_render_segments(video: Path) -> dict[str, Any] | None:
+    """Return the record of `export_render_segments` for a video, None if there is no usable one."""
+    path = render_segments_path(video)
+    if not video.exists() or not path.exists():
+        return None
+    record = json.loads(path.read_text())
+    return record if record.get("version") == RENDER_SEGMENTS_VERSION else None
+
+
+def video_keyframes(video: Path, fps: int) -> dict[int, str]:
+    """Return the keyframes of a video, as their frame index and presentation time (seconds, as ffprobe prints it)."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video.absolute().as_posix()],
+        check=True, capture_output=True, text=True,
+    )
+    keyframes = {}
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes[round(float(pts_time) * fps)] = pts_time
+    return keyframes
+
+
+def plan_incremental_render(
+    previous: dict[str, Any],
+    segments: list[dict[str, Any]],
+    keyframes: list[int],
+    total_frames: int,
+) -> list[tuple[str, int, int]]:
+    """Plan a video as frame ranges copied from a previous render and frame ranges to render.
+
+    Consecutive segments found in the same order in the previous render are
+    copied together. A copied range must start and end on a keyframe of the
+    previous video, so the frames between a segment boundary and the nearest
+    keyframe inside it are rendered again.
+
+    Parameters
+    ----------
+    previous : dict[str, Any]
+        The record of the previous render, see `export_render_segments`
+    segments : list[dict[str, Any]]
+        The segments of the new video, see `build_render_segments`
+    keyframes : list[int]
+        The keyframes of the previous video, in order
+    total_frames : int
+        Number of frames of the new video
+
+    Returns
+    -------
+    list[tuple[str, int, int]]
+        In order, ("copy", first, end) ranges of the previous video and
+        ("render", first, end) ranges of the new one, ends exclusive
+    """
+    previous_segments = previous["segments"]
+    # The end of the previous video is a valid cut too
+    cuts = sorted(set(keyframes) | {previous["frames"]})
+    indexes: dict[str, list[int]] = {}
+    for index, segment in enumerate(previous_segments):
+        indexes.setdefault(segment["key"], []).append(index)
+
+    # [new start, new end, previous start, previous end] of the reusable runs
+    runs: list[list[int]] = []
+    last_index = None
+    for segment in segments:
+        candidates = indexes.get(segment["key"], [])
+        # A segment repeated in the previous video is only reused in sequence
+        if last_index is not None and last_index + 1 in candidates:
+            index = last_index + 1
+        elif len(candidates) == 1:
+            index = candidates[0]
+        else:
+            index = None
+        if index is None:
+            last_index = None
+            continue
+        old = previous_segments[index]
+        if last_index is not None and index == last_index + 1 and runs and runs[-1][1] == segment["start"]:
+            runs[-1][1], runs[-1][3] = segment["end"], old["end"]
+        else:
+            runs.append([segment["start"], segment["end"], old["start"], old["end"]])
+        last_index = index
+
+    plan: list[tuple[str, int, int]] = []
+    cursor = 0
+    for new_start, new_end, old_start, old_end in runs:
+        first = old_start + max(0, cursor - new_start)
+        # Never copy past the end of the run in the new video
+        last = min(old_end, old_start + min(new_end, total_frames) - new_start)
+        copy_start = next((cut for cut in cuts if cut >= first), None)
+        copy_end = max((cut for cut in cuts if cut <= last), default=None)
+        if copy_start is None or copy_end is None or copy_end <= copy_start:
+            continue
+        new_copy_start = new_start + copy_start - old_start
+        if new_copy_start > cursor:
+            plan.append(("render", cursor, new_copy_start))
+        plan.append(("copy", copy_start, copy_end))
+        cursor = new_copy_start + copy_end - copy_start
+    if cursor < total_frames:
+        plan.append(("render", cursor, total_frames))
+    return plan
+
+
+def render_incremental(
+    render_range: Callable[[tuple[int, int], Path], Path],
+    previous_video: Path,
+    keyframes: dict[int, str],
+    plan: list[tuple[str, int, int]],
+    output: Path,
+    audio: Path,
+    audio_offset: float = 0.0,
+) -> Path:
+    """Render the changed frame ranges of a video and splice them with the unchanged ones of its previous render.
+
+    The copied ranges are cut on keyframes, so nothing but the rendered
+    ranges is encoded. The narration is muxed again over the whole video.
+
+    Parameters
+    ----------
+    render_range : Callable[[tuple[int, int], Path], Path]
+        Render the given inclusive frame range, muted, to the given file, with
+        the settings of the previous render
+    previous_video : Path
+        The previous render, replaced by the new one at the end
+    keyframes : dict[int, str]
+        The keyframes of the previous video, see `video_keyframes`
+    plan : list[tuple[str, int, int]]
+        The ranges to copy and render, see `plan_incremental_render`
+    output : Path
+        The output video
+    audio : Path
+        The narration
+    audio_offset : float, optional
+        Seconds before the narration starts in the composition, by default 0.0
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    rendered = sum(end - start for kind, start, end in plan if kind == "render")
+    total = sum(end - start for _, start, end in plan)
+    logger.info(f"Incremental render: rendering {rendered} of {total} frames, copying the rest")
+    work_dir = Path(tempfile.mkdtemp(prefix="incremental_", dir=output.absolute().parent))
+    try:
+        lines = ["ffconcat version 1.0"]
+        for index, (kind, start, end) in enumerate(plan):
+            if kind == "render":
+                piece = render_range((start, end - 1), work_dir / f"piece_{index:04d}.mp4")
+                lines.append(f"file '{piece.absolute().as_posix()}'")
+            else:
+                lines += [f"file '{previous_video.absolute().as_posix()}'", f"inpoint {keyframes[start]}"]
+                if end in keyframes:
+                    lines.append(f"outpoint {keyframes[end]}")
+        concat_list = work_dir / "concat.txt"
+        concat_list.write_text("\n".join(lines) + "\n")
+        video = work_dir / "video.mp4"
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", concat_list.as_posix(), "-map", "0:v", "-c", "copy", video.as_posix()],
+            check=True,
+        )
+        spliced = mux_audio(video, audio, work_dir / "spliced.mp4", audio_offset)
+        os.replace(spliced, output)
+        return output
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,276 @@
+import atexit
+import bisect
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Literal
+
+logger = logging.getLogger(__name__)
+
+# Jobs running at the same time, the others wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs waiting to run before new submissions are refused
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+# Seconds a finished job, and its directory, are kept
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+JOB_DIR = Path(os.getenv("JOB_DIR", "jobs"))
+
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+FINISHED_JOB_STATUSES = ("succeeded", "failed", "cancelled")
+RUN_ID_PATTERN = re.compile(r"[\w.-]+")
+# Events of which only the latest matters: one replaces the previous one
+# instead of piling up (a render reports its progress every second)
+MERGED_JOB_EVENTS = ("render_progress",)
+
+
+class JobQueueFullError(RuntimeError):
+    """More than JOB_MAX_PENDING jobs are waiting to run."""
+
+
+def run_directory(run_id: str) -> Path:
+    """Return the directory of a run in JOB_DIR.
+
+    Raises
+    ------
+    ValueError
+        If the run id is not a plain name (letters, digits, ``_``, ``.`` and
+        ``-``, without ``..``) or the directory would be outside of JOB_DIR
+    """
+    if not RUN_ID_PATTERN.fullmatch(run_id) or ".." in run_id:
+        raise ValueError(f"Invalid run id {run_id!r}")
+    run_dir = JOB_DIR / run_id
+    if run_dir.resolve().parent != JOB_DIR.resolve():
+        raise ValueError(f"Invalid run id {run_id!r}: not a directory of {JOB_DIR}")
+    return run_dir
+
+
+@dataclass
+class Job:
+    """A call of a pipeline stage running in the background.
+
+    Attributes
+    ----------
+    id : str
+        The job id
+    kind : str
+        The stage, e.g. "generate_video"
+    params : dict[str, Any]
+        The arguments of the stage
+    status : JobStatus
+        "queued", "running", "succeeded", "failed" or "cancelled"
+    created_at, started_at, finished_at : float | None
+        Unix times of the submission, start and end
+    result : Any
+        What the stage returned, once succeeded
+    error : str | None
+        The exception, once failed
+    artifacts : dict[str, str]
+        The files the job produced, by name
+    events : list[dict[str, Any]]
+        What happened to the job, in order, each with an "id", a "type" and a
+        "time". Ids increase by one per event recorded; a run of
+        MERGED_JOB_EVENTS keeps only its latest event, so ids can skip
+    """
+    id: str
+    kind: str
+    params: dict[str, Any]
+    status: JobStatus = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: str | None = None
+    artifacts: dict[str, str] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False, compare=False)
+    _next_event_id: int = field(default=0, repr=False, compare=False)
+
+    @property
+    def dir(self) -> Path:
+        """The directory of the files of the job."""
+        return JOB_DIR / self.id
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_JOB_STATUSES
+
+    def add_event(self, type: str, **data: Any) -> None:
+        """Record an event of the job and wake up the clients waiting for one."""
+        with self._changed:
+            self._append_event(type, time.time(), data)
+
+    def _append_event(self, type: str, time: float, data: dict[str, Any]) -> None:
+        # Called with the condition held
+        event = {"id": self._next_event_id, "type": type, "time": time, **data}
+        self._next_event_id += 1
+        if type in MERGED_JOB_EVENTS and self.events and self.events[-1]["type"] == type:
+            self.events[-1] = event
+        else:
+            self.events.append(event)
+        self._changed.notify_all()
+
+    def finish(self, status: JobStatus, **data: Any) -> None:
+        """Mark the job finished and record its last event, named after the status, at once.
+
+        A client never finds the job finished without its last event.
+        """
+        with self._changed:
+            self.status = status
+            self.finished_at = time.time()
+            self._append_event(status, self.finished_at, data)
+
+    def wait_events(self, after: int = 0, timeout: float = 0.0) -> tuple[list[dict[str, Any]], bool]:
+        """Return the events from id ``after`` on, waiting up to ``timeout`` seconds for one.
+
+        The wait ends early when the job finishes.
+
+        Returns
+        -------
+        tuple[list[dict[str, Any]], bool]
+            The events, and whether the job was finished when they were
+            taken, in which case they end with its last event
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._next_event_id > after or self.finished, timeout)
+            start = bisect.bisect_left(self.events, after, key=lambda event: event["id"])
+            return self.events[start:], self.finished
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the job without its events, as served by the API."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "artifacts": sorted(self.artifacts),
+            "events": self._next_event_id,
+        }
+
+
+class JobManager:
+    """Run pipeline stages on a bounded pool of threads and keep track of them.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Jobs running at the same time, by default JOB_WORKERS
+    max_pending : int, optional
+        Jobs waiting to run before `submit` refuses new ones, by default
+        JOB_MAX_PENDING
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: dict[str, Job] = {}
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, params: dict[str, Any], run: Callable[[Job], Any]) -> Job:
+        """Queue a job, returning at once.
+
+        Parameters
+        ----------
+        kind : str
+            The stage
+        params : dict[str, Any]
+            The arguments of the stage, recorded with the job
+        run : Callable[[Job], Any]
+            Runs the stage and returns its result; it may record artifacts
+            and events on the job
+
+        Returns
+        -------
+        Job
+            The queued job
+
+        Raises
+        ------
+        JobQueueFullError
+            If JOB_MAX_PENDING jobs are already waiting
+        """
+        self._prune()
+        with self._lock:
+            pending = sum(job.status == "queued" for job in self._jobs.values())
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"{pending} jobs are already waiting, try again later")
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind, params=params)
+            self._jobs[job.id] = job
+            job.add_event("queued")
+            self._futures[job.id] = self._executor.submit(self._run, job, run)
+        logger.info(f"Job {job.id} ({kind}) queued")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Return a job, raising a KeyError if there is no such job."""
+        with self._lock:
+            return self._jobs[job_id]
+
+    def list(self) -> list[Job]:
+        """Return the jobs, oldest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet, return whether it was cancelled."""
+        job = self.get(job_id)
+        if not self._futures[job_id].cancel():
+            return False
+        job.finish("cancelled")
+        return True
+
+    def _run(self, job: Job, run: Callable[[Job], Any]) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        job.add_event("started")
+        try:
+            job.result = run(job)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = f"{type(e).__name__}: {e}"
+            job.finish("failed", error=job.error, traceback=traceback.format_exc())
+            return
+        job.finish("succeeded", seconds=round(time.time() - job.started_at, 3))
+        logger.info(f"Job {job.id} ({job.kind}) succeeded in {job.finished_at - job.started_at:.1f}s")
+
+    def _prune(self) -> None:
+        """Forget the jobs finished more than JOB_RETENTION_SECONDS ago and delete their directory."""
+        expired_before = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished and job.finished_at < expired_before]
+            for job in expired:
+                del self._jobs[job.id]
+                del self._futures[job.id]
+        for job in expired:
+            shutil.rmtree(job.dir, ignore_errors=True)
+
+    def close(self) -> None:
+        """Cancel the queued jobs and wait for the running ones."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Return the job manager shared by the API of the process."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+            atexit.register(_manager.close)
+        return _manager
@@ -0,0 +1,274 @@
+import logging
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Rows above are the static layer (figure, headline, equation), rows below the
+# dynamic one (subtitles, waveform). Must match LAYER_SPLIT in frontend/src/types/constants.ts
+LAYER_SPLIT = 648
+STATIC_COMPOSITION_ID = "ArxflixStatic"
+DYNAMIC_COMPOSITION_ID = "ArxflixDynamic"
+# `transitionFrames` of CurrentFigure in Main.tsx
+TRANSITION_FRAMES = 5
+
+
+def static_runs(
+    manifest: dict[str, Any],
+    intro_frames: int,
+    transition_frames: int = TRANSITION_FRAMES,
+) -> list[tuple[int, int]]:
+    """Split a composition into runs of frames where the static layer does not change.
+
+    The intro is one run. After it, a rich content item is still between its
+    enter and exit transitions, which change every frame.
+
+    Parameters
+    ----------
+    manifest : dict[str, Any]
+        The render manifest of the video, see `build_render_manifest`
+    intro_frames : int
+        Number of frames of the intro
+    transition_frames : int, optional
+        Length of the enter and exit transitions, by default TRANSITION_FRAMES
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        The first frame and the number of frames of each run, in order
+    """
+    total_frames = manifest["durationInFrames"]
+    runs: list[list[int]] = [[0, min(intro_frames, total_frames)]] if intro_frames else []
+    previous_key: Any = "intro"
+    for frame in range(intro_frames, total_frames):
+        # Rich content times are relative to the narration, which starts after the intro
+        relative_frame = frame - intro_frames
+        key = None
+        for index, item in enumerate(manifest["richContent"]):
+            if item["start"] <= relative_frame <= item["end"]:
+                offset = relative_frame - item["start"]
+                still = transition_frames <= offset <= item["end"] - item["start"] - transition_frames
+                key = (index,) if still else (index, frame)
+                break
+        if key == previous_key:
+            runs[-1][1] += 1
+        else:
+            runs.append([frame, 1])
+            previous_key = key
+    return [(start, length) for start, length in runs]
+
+
+def compose_layers(
+    stills: list[Path],
+    runs: list[tuple[int, int]],
+    dynamic: Path | None,
+    audio: Path,
+    output: Path,
+    fps: int,
+    intro_frames: int,
+    scale: float = 1.0,
+    crf: int = 18,
+    x264_preset: str = "fast",
+) -> Path:
+    """Overlay the dynamic layer on the static stills and mux the narration.
+
+    Parameters
+    ----------
+    stills : list[Path]
+        The full-frame still of each run
+    runs : list[tuple[int, int]]
+        The first frame and number of frames of each run, see `static_runs`
+    dynamic : Path | None
+        The dynamic layer video, as tall as the rows below LAYER_SPLIT, or
+        None to only show the stills
+    audio : Path
+        The narration, starting after the intro
+    output : Path
+        The output video
+    fps : int
+        The frame rate of the composition
+    intro_frames : int
+        Number of frames of the intro, shown without the dynamic layer
+    scale : float, optional
+        Factor applied to the resolution of both layers, by default 1.0
+    crf : int, optional
+        x264 constant rate factor, by default 18
+    x264_preset : str, optional
+        x264 preset, by default "fast"
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    total_frames = sum(length for _, length in runs)
+    concat_list = output.absolute().parent / f".{output.stem}_stills.txt"
+    lines = ["ffconcat version 1.0"]
+    for still, (_, length) in zip(stills, runs):
+        lines += [f"file '{still.absolute().as_posix()}'", f"duration {length / fps:.6f}"]
+    # The duration of the last entry is only honoured when a file follows it
+    lines.append(f"file '{stills[-1].absolute().as_posix()}'")
+    concat_list.write_text("\n".join(lines) + "\n")
+    intro_seconds = intro_frames / fps
+    inputs = ["-f", "concat", "-safe", "0", "-i", concat_list.as_posix()]
+    if dynamic is not None:
+        inputs += ["-i", dynamic.absolute().as_posix()]
+        video_filter = (
+            f"[0:v]fps={fps},format=yuv420p[bg];"
+            f"[bg][1:v]overlay=0:{round(LAYER_SPLIT * scale)}:enable='gte(t,{intro_seconds})'[v]"
+        )
+    else:
+        video_filter = f"[0:v]fps={fps},format=yuv420p[v]"
+    audio_index = 2 if dynamic is not None else 1
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error",
+             *inputs,
+             "-i", audio.absolute().as_posix(),
+             "-filter_complex",
+             f"{video_filter};[{audio_index}:a]adelay=delays={int(intro_seconds * 1000)}:all=1[a]",
+             "-map", "[v]", "-map", "[a]",
+             "-c:v", "libx264", "-preset", x264_preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+             "-c:a", "aac", "-t", f"{total_frames / fps:.6f}",
+             "-movflags", "+faststart", output.absolute().as_posix()],
+            check=True,
+        )
+    finally:
+        concat_list.unlink(missing_ok=True)
+    return output
+
+
+def render_layered(
+    render_stills: Callable[[list[int], Path], list[Path]],
+    render_dynamic: Callable[[Path], Path],
+    manifest: dict[str, Any],
+    output: Path,
+    audio: Path,
+    fps: int,
+    intro_frames: int,
+    scale: float = 1.0,
+    crf: int = 18,
+    x264_preset: str = "fast",
+) -> Path:
+    """Render the static layer once per still run and the dynamic layer as a video, then compose them.
+
+    Figures and headlines stay on screen for seconds but are rasterized for
+    every frame by a plain render. Here they are rendered once per run of
+    identical frames, while the subtitles and waveform are rendered as a
+    video of the rows below LAYER_SPLIT only. ffmpeg overlays the two layers
+    and muxes the narration. Content of the static layer overflowing below
+    LAYER_SPLIT (a figure taller than its row) is clipped.
+
+    The layers are submitted at the same time; they only render in parallel
+    if ``render_stills`` and ``render_dynamic`` use different browsers. The
+    time of each layer is logged.
+
+    Parameters
+    ----------
+    render_stills : Callable[[list[int], Path], list[Path]]
+        Render the given frames of the static layer composition to PNG files
+        in the given directory
+    render_dynamic : Callable[[Path], Path]
+        Render the dynamic layer composition, muted, to the given file
+    manifest : dict[str, Any]
+        The render manifest of the video
+    output : Path
+        The output video
+    audio : Path
+        The narration
+    fps : int
+        The frame rate of the composition
+    intro_frames : int
+        Number of frames of the intro
+    scale : float, optional
+        Factor applied to the resolution the layers are rendered at, by default 1.0
+    crf : int, optional
+        x264 constant rate factor of the composed video, by default 18
+    x264_preset : str, optional
+        x264 preset of the composed video, by default "fast"
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    runs = static_runs(manifest, intro_frames)
+    logger.info(f"Layered render: {len(runs)} stills for {manifest['durationInFrames']} frames")
+    work_dir = Path(tempfile.mkdtemp(prefix="layers_", dir=output.absolute().parent))
+    try:
+        def timed(layer: str, render: Callable[..., Any], *args: Any) -> Any:
+            start = time.perf_counter()
+            result = render(*args)
+            logger.info(f"Layered render: {layer} layer rendered in {time.perf_counter() - start:.1f}s")
+            return result
+
+        layers_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            stills_future = executor.submit(timed, "static", render_stills, [start for start, _ in runs], work_dir)
+            dynamic_future = executor.submit(timed, "dynamic", render_dynamic, work_dir / "dynamic.mp4")
+            stills = stills_future.result()
+            dynamic = dynamic_future.result()
+        logger.info(f"Layered render: both layers rendered in {time.perf_counter() - layers_start:.1f}s")
+        return compose_layers(stills, runs, dynamic, audio, output, fps, intro_frames, scale, crf, x264_preset)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def render_storyboard(
+    render_stills: Callable[[list[int], Path], list[Path]],
+    manifest: dict[str, Any],
+    output: Path,
+    audio: Path,
+    fps: int,
+    intro_frames: int,
+    scale: float = 1.0,
+    crf: int = 18,
+    x264_preset: str = "fast",
+) -> Path:
+    """Render one still per segment of the video and turn them into a slideshow with the narration.
+
+    A segment is the intro, a figure, headline or equation with its
+    transitions, or the gap between two of them. Its still is the middle
+    frame of the full composition, subtitles included, so a storyboard
+    shows every visual of the script in seconds but no motion.
+
+    Parameters
+    ----------
+    render_stills : Callable[[list[int], Path], list[Path]]
+        Render the given frames of the full composition to PNG files in the
+        given directory
+    manifest : dict[str, Any]
+        The render manifest of the video
+    output : Path
+        The output video
+    audio : Path
+        The narration
+    fps : int
+        The frame rate of the composition
+    intro_frames : int
+        Number of frames of the intro
+    scale : float, optional
+        Factor applied to the resolution the stills are rendered at, by default 1.0
+    crf : int, optional
+        x264 constant rate factor, by default 18
+    x264_preset : str, optional
+        x264 preset, by default "fast"
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    runs = static_runs(manifest, intro_frames, transition_frames=0)
+    logger.info(f"Storyboard render: {len(runs)} stills for {manifest['durationInFrames']} frames")
+    work_dir = Path(tempfile.mkdtemp(prefix="storyboard_", dir=output.absolute().parent))
+    try:
+        stills = render_stills([start + length // 2 for start, length in runs], work_dir)
+        return compose_layers(stills, runs, None, audio, output, fps, intro_frames, scale, crf, x264_preset)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
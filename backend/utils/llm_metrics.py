@@ -0,0 +1,156 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# JSON lines file every finished call is appended to, disabled when empty
+LLM_METRICS_PATH = os.getenv("LLM_METRICS_PATH", "")
+
+
+@dataclass
+class LLMCallRecord:
+    """Metrics of one structured LLM call, retries included.
+
+    The calls are not streamed, so ``time_to_first_token`` is the time until
+    the first response of the provider, before any validation retry.
+    """
+    provider: str
+    model: str | None = None
+    started_at: float = field(default_factory=time.time)
+    time_to_first_token: float | None = None
+    latency: float | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    attempts: int = 0
+    validation_errors: list[str] = field(default_factory=list)
+    completion_errors: list[str] = field(default_factory=list)
+    success: bool = False
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def usage_tokens(raw: Any) -> tuple[int, int]:
+    """Return the (prompt, completion) token counts of a raw completion, 0 if unknown."""
+    usage = getattr(raw, "usage", None)
+    if usage is not None:
+        return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+    usage_metadata = getattr(raw, "usage_metadata", None)
+    if usage_metadata is not None:
+        return (
+            getattr(usage_metadata, "prompt_token_count", 0) or 0,
+            getattr(usage_metadata, "candidates_token_count", 0) or 0,
+        )
+    return 0, 0
+
+
+def aggregate_llm_calls(records: Iterable[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    """Aggregate call records (as dicts) into counters per provider/model.
+
+    Parameters
+    ----------
+    records : Iterable[dict[str, Any]]
+        The records, as exported in the JSON lines file
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        For each "provider/model": calls, failures, retries, validation
+        failures, token counts, and mean/max latency in seconds
+    """
+    counters: dict[str, dict[str, float]] = {}
+    for record in records:
+        key = f"{record['provider']}/{record.get('model')}"
+        c = counters.setdefault(key, {
+            "calls": 0, "failures": 0, "retries": 0, "validation_failures": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            "latency_total": 0.0, "latency_max": 0.0, "time_to_first_token_total": 0.0,
+        })
+        c["calls"] += 1
+        c["failures"] += 0 if record["success"] else 1
+        c["retries"] += max(record["attempts"] - 1, 0)
+        c["validation_failures"] += len(record["validation_errors"])
+        c["prompt_tokens"] += record["prompt_tokens"]
+        c["completion_tokens"] += record["completion_tokens"]
+        c["latency_total"] += record["latency"] or 0.0
+        c["latency_max"] = max(c["latency_max"], record["latency"] or 0.0)
+        c["time_to_first_token_total"] += record["time_to_first_token"] or 0.0
+    for c in counters.values():
+        c["latency_mean"] = c["latency_total"] / c["calls"]
+        c["time_to_first_token_mean"] = c.pop("time_to_first_token_total") / c["calls"]
+    return counters
+
+
+class LLMMetrics:
+    """Collect the records of every LLM call of the process."""
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else None
+        self.records: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: LLMCallRecord) -> None:
+        line = asdict(record)
+        line["retries"] = record.retries
+        with self._lock:
+            self.records.append(line)
+            if self.path:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(line) + "\n")
+        logger.info(
+            f"[{record.provider}] {record.model}: {record.latency:.1f}s "
+            f"(first response {record.time_to_first_token or 0:.1f}s), "
+            f"{record.prompt_tokens} prompt + {record.completion_tokens} completion tokens, "
+            f"{record.retries} retries, {'ok' if record.success else 'failed'}"
+        )
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Return the counters of the calls recorded so far, see `aggregate_llm_calls`."""
+        with self._lock:
+            return aggregate_llm_calls(list(self.records))
+
+
+llm_metrics = LLMMetrics(LLM_METRICS_PATH)
+
+current_llm_call: contextvars.ContextVar[LLMCallRecord | None] = contextvars.ContextVar(
+    "current_llm_call", default=None
+)
+
+
+@contextmanager
+def track_llm_call(provider: str, model: str | None) -> Iterator[LLMCallRecord]:
+    """Record the metrics of the LLM call made inside the block.
+
+    The record is filled by the hooks of `create_logging_hooks` and added to
+    `llm_metrics` when the block exits.
+    """
+    record = LLMCallRecord(provider=provider, model=model)
+    token = current_llm_call.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+        record.success = True
+    finally:
+        record.latency = time.perf_counter() - start
+        current_llm_call.reset(token)
+        llm_metrics.add(record)
+
+
+def read_llm_calls(path: str | Path) -> list[dict[str, Any]]:
+    """Read the records of a JSON lines metrics file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,248 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ROUTER_WINDOW = int(os.getenv("SCRIPT_ROUTER_WINDOW", "50"))
+# Fixed hedge delay in seconds; by default the p95 latency of the provider tried first
+ROUTER_HEDGE_AFTER = os.getenv("SCRIPT_HEDGE_AFTER_SECONDS")
+ROUTER_DEFAULT_HEDGE_AFTER = 90.0
+ROUTER_MIN_SAMPLES = 5
+
+
+class CancelScope:
+    """Clients opened by one routed attempt, closed when the attempt loses the race."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._clients: list[Any] = []
+        self._lock = threading.Lock()
+
+    def register(self, client: Any) -> None:
+        with self._lock:
+            self._clients.append(client)
+            cancelled = self.cancelled
+        if cancelled:
+            _close_client(client)
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            clients = list(self._clients)
+        for client in clients:
+            _close_client(client)
+
+
+def _close_client(client: Any) -> None:
+    # instructor clients keep the provider client in `.client`; closing its
+    # HTTP pool aborts the request in flight. Clients without `close` (such
+    # as Gemini's genai.GenerativeModel) can't be aborted: the router does
+    # not hedge them, see `HedgedRouter.run`
+    raw_client = getattr(client, "client", client)
+    close = getattr(raw_client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Failed to close client {raw_client}: {e}")
+
+
+current_cancel_scope: contextvars.ContextVar[CancelScope | None] = contextvars.ContextVar(
+    "current_cancel_scope", default=None
+)
+
+
+@dataclass
+class ProviderStats:
+    """Rolling latency and error statistics of one provider/model."""
+    latencies: deque = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    outcomes: deque = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+
+    def record(self, latency: float, ok: bool) -> None:
+        if ok:
+            self.latencies.append(latency)
+        self.outcomes.append(ok)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def p50(self) -> float | None:
+        return self.percentile(0.5)
+
+    @property
+    def p95(self) -> float | None:
+        return self.percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class HedgedRouter:
+    """Route a call over several providers, hedging when the first one is slow.
+
+    Providers are ranked by error rate then p95 latency. The best one is called
+    first; if it has not answered after the hedge delay, the next one is called
+    too and the first valid answer wins. The loser is cancelled. A provider
+    that fails is immediately replaced by the next one. Providers whose
+    request can't be cancelled are only used as fallbacks, never raced.
+    """
+
+    def __init__(self, hedge_after: float | None = None):
+        self.hedge_after = hedge_after
+        self.stats: dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+
+    def _stats(self, label: str) -> ProviderStats:
+        with self._lock:
+            return self.stats.setdefault(label, ProviderStats())
+
+    def rank(self, providers: list[str], label: Callable[[str], str] = str) -> list[str]:
+        """Sort providers from the most to the least promising one.
+
+        Providers without history come first so that they get measured.
+        """
+        def score(provider: str) -> tuple[float, float]:
+            stats = self._stats(label(provider))
+            return stats.error_rate, stats.p95 or 0.0
+        return sorted(providers, key=score)
+
+    def hedge_delay(self, label: str) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        stats = self._stats(label)
+        if len(stats.latencies) >= ROUTER_MIN_SAMPLES:
+            return stats.p95
+        return ROUTER_DEFAULT_HEDGE_AFTER
+
+    def summary(self) -> dict[str, dict[str, float | None]]:
+        """Return the p50/p95 latency and error rate of each provider."""
+        with self._lock:
+            return {
+                label: {"p50": stats.p50, "p95": stats.p95, "error_rate": stats.error_rate}
+                for label, stats in self.stats.items()
+            }
+
+    def run(
+        self,
+        providers: list[str],
+        call: Callable[[str], T],
+        label: Callable[[str], str] = str,
+        cancellable: Callable[[str], bool] = lambda provider: True,
+    ) -> T:
+        """Run ``call(provider)`` with hedging and fallback.
+
+        Parameters
+        ----------
+        providers : list[str]
+            The providers that can serve the call
+        call : Callable[[str], T]
+            The call to make with a given provider
+        label : Callable[[str], str], optional
+            The provider/model label the statistics are recorded under
+        cancellable : Callable[[str], bool], optional
+            Whether the request of a provider can be cancelled. A slow
+            provider that can't is waited for, and one that can't is never
+            sent as a hedge (its request would run, and be paid for, to the
+            end), by default every provider can
+
+        Returns
+        -------
+        T
+            The result of the first successful call
+
+        Raises
+        ------
+        ValueError
+            If every provider failed.
+        """
+        if not providers:
+            raise ValueError("No provider to route the call to.")
+        queue = self.rank(providers, label)
+        errors: list[str] = []
+        running: dict[Future, tuple[str, CancelScope, float]] = {}
+
+        def attempt(provider: str, scope: CancelScope) -> T:
+            current_cancel_scope.set(scope)
+            return call(provider)
+
+        executor = ThreadPoolExecutor(max_workers=len(queue))
+
+        def launch(provider: str | None = None) -> None:
+            provider = provider or queue[0]
+            queue.remove(provider)
+            scope = CancelScope()
+            logger.info(f"[router] Calling {label(provider)}")
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, attempt, provider, scope)
+            running[future] = (provider, scope, time.perf_counter())
+
+        try:
+            launch()
+            while running:
+                first_provider, _, first_started = next(iter(running.values()))
+                hedge = next((provider for provider in queue if cancellable(provider)), None)
+                timeout = None
+                if hedge is not None and len(running) == 1 and cancellable(first_provider):
+                    timeout = max(0.0, self.hedge_delay(label(first_provider)) - (time.perf_counter() - first_started))
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    logger.warning(f"[router] {label(first_provider)} is slow, hedging with {label(hedge)}")
+                    launch(hedge)
+                    continue
+                for future in done:
+                    provider, scope, started = running.pop(future)
+                    latency = time.perf_counter() - started
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if scope.cancelled:
+                            continue
+                        self._stats(label(provider)).record(latency, ok=False)
+                        errors.append(f"{label(provider)}: {e}")
+                        logger.warning(f"[router] {label(provider)} failed after {latency:.1f}s: {e}")
+                        if queue and not running:
+                            launch()
+                        continue
+                    self._stats(label(provider)).record(latency, ok=True)
+                    logger.info(f"[router] {label(provider)} answered first in {latency:.1f}s")
+                    for loser, loser_scope, loser_started in running.values():
+                        # The loser took at least this long, keep it as a latency sample
+                        self._stats(label(loser)).latencies.append(time.perf_counter() - loser_started)
+                        loser_scope.cancel()
+                    return result
+            raise ValueError(f"Every provider failed: {errors}")
+        finally:
+            for _, scope, _ in running.values():
+                scope.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_router: HedgedRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_script_router() -> HedgedRouter:
+    """Return the router shared by every script generation of the process."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = HedgedRouter(float(ROUTER_HEDGE_AFTER) if ROUTER_HEDGE_AFTER else None)
+        return _router
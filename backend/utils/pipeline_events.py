@@ -0,0 +1,85 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Receives the type and the data of each event
+EventSink = Callable[[str, dict[str, Any]], None]
+
+_event_sink: ContextVar[EventSink | None] = ContextVar("pipeline_event_sink", default=None)
+
+
+@contextmanager
+def event_sink(sink: EventSink) -> Iterator[None]:
+    """Send the events emitted in this context (this thread, or this task) to ``sink``."""
+    token = _event_sink.set(sink)
+    try:
+        yield
+    finally:
+        _event_sink.reset(token)
+
+
+def emit_event(type: str, **data: Any) -> None:
+    """Send an event to the sink of the current context, if there is one.
+
+    Parameters
+    ----------
+    type : str
+        The event, e.g. "stage_start", "tts_segment", "render_progress"
+    **data : Any
+        JSON serializable details of the event
+    """
+    sink = _event_sink.get()
+    if sink is not None:
+        try:
+            sink(type, data)
+        except Exception as e:
+            # A broken client must not break the pipeline
+            logger.warning(f"Could not emit event {type}: {e}")
+
+
+def bound_emitter() -> Callable[..., None]:
+    """Return an `emit_event` bound to the sink of the current context.
+
+    For callbacks called from other threads (render progress, worker pools),
+    which don't see the context of the pipeline.
+    """
+    sink = _event_sink.get()
+
+    def emit(type: str, **data: Any) -> None:
+        if sink is not None:
+            with event_sink(sink):
+                emit_event(type, **data)
+
+    return emit
+
+
+@contextmanager
+def pipeline_stage(stage: str, **data: Any) -> Iterator[None]:
+    """Emit "stage_start" on entry, and "stage_end" with the seconds it took or "stage_error" on exit.
+
+    Parameters
+    ----------
+    stage : str
+        The stage, e.g. "generate_script", "tts", "asr", "render"
+    **data : Any
+        Details added to the "stage_start" event
+    """
+    emit_event("stage_start", stage=stage, **data)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        seconds = round(time.perf_counter() - start, 3)
+        emit_event("stage_error", stage=stage, error=f"{type(e).__name__}: {e}", seconds=seconds)
+        raise
+    emit_event("stage_end", stage=stage, seconds=round(time.perf_counter() - start, 3))
+
+
+def format_sse(event: dict[str, Any], event_id: int) -> str:
+    """Format an event as a server-sent event, its type as the event name."""
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
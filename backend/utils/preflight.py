@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from backend.utils.figure_links import resolve_figure_links
+from backend.utils.generate_video import INTRO_DURATION_IN_SECONDS, VIDEO_FPS
+from backend.utils.render_concurrency import RENDER_CALIBRATION_PATH, available_cores
+from backend.utils.rich_raster import check_equations
+
+logger = logging.getLogger(__name__)
+
+# Speaking rate of the narration, and the silence export_mp3 adds after each text
+NARRATION_WORDS_PER_SECOND = float(os.getenv("NARRATION_WORDS_PER_SECOND", "2.5"))
+NARRATION_PAUSE_SECONDS = 0.5
+# Price of 1000 characters of narration, in dollars
+TTS_COST_PER_1K_CHARACTERS = {
+    "elevenlabs": float(os.getenv("ELEVENLABS_COST_PER_1K_CHARACTERS", "0.30")),
+    "lmnt": float(os.getenv("LMNT_COST_PER_1K_CHARACTERS", "0.15")),
+    "kokoro": 0.0,
+}
+# Disk needed per second of video: the float32 narration (and its waveform
+# data), the rendered video and its temporary chunks or pieces
+PREFLIGHT_AUDIO_BYTES_PER_SECOND = 200_000
+PREFLIGHT_VIDEO_BYTES_PER_SECOND = 1_000_000
+PREFLIGHT_FIGURE_BYTES = 2_000_000
+PREFLIGHT_DISK_MARGIN = 2.0
+
+_FIGURE = "\\Figure: "
+_EQUATION = "\\Equation: "
+_TEXT = "\\Text: "
+
+
+class PreflightError(ValueError):
+    """The script can't be turned into a video, see `PreflightReport.errors`."""
+
+    def __init__(self, report: "PreflightReport"):
+        super().__init__("Preflight failed:\n" + "\n".join(f"- {error}" for error in report.errors))
+        self.report = report
+
+
+@dataclass
+class PreflightReport:
+    """What preflight found in a script, and what it would cost to make its video.
+
+    Attributes
+    ----------
+    script : str
+        The script, with unreachable figures and invalid equations removed
+        and figure links replaced by the ones that serve an image when repairing
+    texts : int
+        Number of narrated texts
+    characters : int
+        Number of narrated characters, what text-to-speech is billed on
+    figures : int
+        Number of figures in the script
+    equations : int
+        Number of equations in the script
+    repaired_figures : dict[str, str]
+        The figure links replaced by a reachable candidate
+    removed_lines : list[str]
+        The script lines removed when repairing
+    errors : list[str]
+        What makes the script unusable, empty if it is usable
+    estimated_duration_seconds : float
+        Length of the video, intro included
+    estimated_tts_cost : float
+        Price of the narration, in dollars
+    estimated_render_seconds : float | None
+        Render time at the calibrated throughput, None without a calibration
+    required_disk_bytes : int
+        Disk space the assets and the render need in the workspace
+    free_disk_bytes : int
+        Disk space available in the workspace
+    """
+    script: str
+    texts: int = 0
+    characters: int = 0
+    figures: int = 0
+    equations: int = 0
+    repaired_figures: dict[str, str] = field(default_factory=dict)
+    removed_lines: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    estimated_duration_seconds: float = 0.0
+    estimated_tts_cost: float = 0.0
+    estimated_render_seconds: float | None = None
+    required_disk_bytes: int = 0
+    free_disk_bytes: int = 0
+
+
+def _calibrated_fps() -> float | None:
+    """Return the frames per second of the calibrated render concurrency, None without a calibration for this machine."""
+    if not RENDER_CALIBRATION_PATH.exists():
+        return None
+    try:
+        calibration = json.loads(RENDER_CALIBRATION_PATH.read_text())
+        if calibration["cores"] != available_cores():
+            return None
+        return calibration["fps"][str(calibration["best_concurrency"])]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring render calibration {RENDER_CALIBRATION_PATH}: {e}")
+        return None
+
+
+def _free_disk_bytes(workspace: Path) -> int:
+    """Return the free space of the filesystem the workspace is (or will be) on."""
+    path = workspace.absolute()
+    while not path.exists():
+        path = path.parent
+    return shutil.disk_usage(path).free
+
+
+def preflight_script(
+    script: str,
+    method: str = "kokoro",
+    workspace: Path = Path("public"),
+    repair: bool = True,
+) -> PreflightReport:
+    """Check a script before generating its assets, in seconds rather than after minutes of wasted compute.
+
+    Figure links are checked concurrently, every equation is parsed with the
+    KaTeX of the frontend, the narration length and its price are estimated
+    from the text, and the workspace must have the disk space the assets and
+    the render need.
+
+    Parameters
+    ----------
+    script : str
+        The video script
+    method : str, optional
+        The text-to-speech method, a key of TTS_COST_PER_1K_CHARACTERS, by
+        default "kokoro"
+    workspace : Path, optional
+        Where the assets and the video are written, by default "public"
+    repair : bool, optional
+        Remove unreachable figures and invalid equations, and use the
+        reachable candidate of a figure link, instead of reporting them as
+        errors, by default True
+
+    Returns
+    -------
+    PreflightReport
+        The (repaired) script, the estimates and what was found
+
+    Raises
+    ------
+    PreflightError
+        If the script has no narration, has figures or equations that can't
+        be shown (without ``repair``), or the workspace lacks disk space
+    """
+    if method not in TTS_COST_PER_1K_CHARACTERS:
+        raise ValueError(f"Unknown method: {method}")
+    lines = script.split("\n")
+    report = PreflightReport(script=script)
+
+    figure_links = [line[len(_FIGURE):].strip() for line in lines if line.startswith(_FIGURE)]
+    remote_links = [link for link in figure_links if link.lower().startswith(("http://", "https://"))]
+    reachable = resolve_figure_links(remote_links)
+    for link in figure_links:
+        if link not in reachable:
+            reachable[link] = link if Path(link).is_file() else None
+
+    equations = [line[len(_EQUATION):] for line in lines if line.startswith(_EQUATION)]
+    try:
+        equation_errors = dict(zip(equations, check_equations(equations)))
+    except (OSError, subprocess.CalledProcessError) as e:
+        # Without node or the KaTeX script the equations can't be checked,
+        # export_rich_content_json skips the check the same way
+        logger.warning(f"Could not check the equations: {e}")
+        equation_errors = {}
+
+    kept_lines = []
+    for line in lines:
+        if line.startswith(_FIGURE):
+            link = line[len(_FIGURE):].strip()
+            if reachable[link] is None:
+                if repair:
+                    report.removed_lines.append(line)
+                    continue
+                report.errors.append(f"Figure {link} is not reachable")
+            elif reachable[link] != link and repair:
+                report.repaired_figures[link] = reachable[link]
+                line = _FIGURE + reachable[link]
+        elif line.startswith(_EQUATION) and equation_errors.get(line[len(_EQUATION):]):
+            equation = line[len(_EQUATION):]
+            if repair:
+                report.removed_lines.append(line)
+                continue
+            report.errors.append(f"Equation {equation!r} does not parse: {equation_errors[equation]}")
+        kept_lines.append(line)
+    report.script = "\n".join(kept_lines)
+
+    texts = [line[len(_TEXT):] for line in kept_lines if line.startswith(_TEXT)]
+    report.texts = len(texts)
+    report.characters = sum(len(text) for text in texts)
+    report.figures = sum(line.startswith(_FIGURE) for line in kept_lines)
+    report.equations = sum(line.startswith(_EQUATION) for line in kept_lines)
+    if not texts:
+        report.errors.append("The script has no narration (no \\Text: line)")
+
+    words = sum(len(text.split()) for text in texts)
+    narration_seconds = words / NARRATION_WORDS_PER_SECOND + NARRATION_PAUSE_SECONDS * len(texts)
+    report.estimated_duration_seconds = round(INTRO_DURATION_IN_SECONDS + narration_seconds, 1)
+    report.estimated_tts_cost = round(report.characters / 1000 * TTS_COST_PER_1K_CHARACTERS[method], 4)
+    fps = _calibrated_fps()
+    if fps:
+        report.estimated_render_seconds = round(report.estimated_duration_seconds * VIDEO_FPS / fps, 1)
+
+    report.required_disk_bytes = int(PREFLIGHT_DISK_MARGIN * (
+        report.estimated_duration_seconds * (PREFLIGHT_AUDIO_BYTES_PER_SECOND + PREFLIGHT_VIDEO_BYTES_PER_SECOND)
+        + report.figures * PREFLIGHT_FIGURE_BYTES
+    ))
+    report.free_disk_bytes = _free_disk_bytes(workspace)
+    if report.free_disk_bytes < report.required_disk_bytes:
+        report.errors.append(
+            f"{workspace} has {report.free_disk_bytes / 1e6:.0f} MB free, "
+            f"{report.required_disk_bytes / 1e6:.0f} MB needed"
+        )
+
+    for line in report.removed_lines:
+        logger.warning(f"Preflight removed: {line}")
+    if report.errors:
+        raise PreflightError(report)
+    logger.info(
+        f"Preflight passed: {report.texts} texts, {report.figures} figures, {report.equations} equations, "
+        f"~{report.estimated_duration_seconds:.0f}s of video, ~${report.estimated_tts_cost:.2f} of narration"
+    )
+    return report
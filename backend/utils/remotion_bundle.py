@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FRONTEND_PATH = Path("frontend")
+REMOTION_ENTRY_POINT = "src/remotion/index.ts"
+REMOTION_BUNDLE_CACHE_DIR = Path(os.getenv("REMOTION_BUNDLE_CACHE_DIR", ".cache/remotion_bundle"))
+# Files and directories of the frontend that end up in the bundle
+REMOTION_BUNDLE_INPUTS = [
+    "src",
+    "public/static",
+    "package.json",
+    "pnpm-lock.yaml",
+    "remotion.config.ts",
+    "tailwind.config.ts",
+    "postcss.config.js",
+    "tsconfig.json",
+]
+
+_bundle_lock = threading.Lock()
+
+
+def bundle_sources_hash(frontend: Path = FRONTEND_PATH) -> str:
+    """Hash the frontend sources and lockfile the Remotion bundle is built from.
+
+    Parameters
+    ----------
+    frontend : Path, optional
+        The frontend directory, by default "frontend"
+
+    Returns
+    -------
+    str
+        A short hex digest, changing whenever one of the inputs changes
+    """
+    digest = hashlib.sha256()
+    for name in REMOTION_BUNDLE_INPUTS:
+        path = frontend / name
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            if not file.exists():
+                continue
+            digest.update(file.relative_to(frontend).as_posix().encode())
+            digest.update(b"\0")
+            digest.update(file.read_bytes())
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _build_bundle(frontend: Path, out_dir: Path) -> None:
+    logger.info(f"Building the Remotion bundle to {out_dir}")
+    bundle_proc = subprocess.run(
+        [
+            "npx",
+            "remotion",
+            "bundle",
+            REMOTION_ENTRY_POINT,
+            "--out-dir",
+            out_dir.absolute().as_posix(),
+        ],
+        cwd=frontend.absolute().as_posix(),
+    )
+    if bundle_proc.returncode != 0:
+        raise RuntimeError(f"Remotion bundle failed with exit code {bundle_proc.returncode}")
+
+
+def get_remotion_bundle(
+    frontend: Path = FRONTEND_PATH,
+    cache_dir: Path = REMOTION_BUNDLE_CACHE_DIR,
+    force: bool = False,
+) -> Path:
+    """Return the directory of the prebuilt Remotion bundle, building it if needed.
+
+    The bundle is stored under ``cache_dir/<hash of the sources>``, so it is
+    only rebuilt when the frontend changes. It is built in a temporary
+    directory then renamed, so a concurrent process never sees a partial
+    bundle; bundles of older sources are removed.
+
+    Parameters
+    ----------
+    frontend : Path, optional
+        The frontend directory, by default "frontend"
+    cache_dir : Path, optional
+        Where the bundles are stored, by default REMOTION_BUNDLE_CACHE_DIR
+    force : bool, optional
+        Rebuild the bundle even if it is cached, by default False
+
+    Returns
+    -------
+    Path
+        The bundle directory, usable as the serve URL of `remotion render`
+    """
+    with _bundle_lock:
+        bundle_dir = cache_dir / bundle_sources_hash(frontend)
+        if (bundle_dir / "index.html").exists() and not force:
+            return bundle_dir
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = cache_dir / f".tmp-{uuid.uuid4().hex}"
+        try:
+            _build_bundle(frontend, tmp_dir)
+            if bundle_dir.exists():
+                shutil.rmtree(bundle_dir)
+            try:
+                tmp_dir.rename(bundle_dir)
+            except OSError:
+                # Another process renamed its own build of the same sources first
+                if not (bundle_dir / "index.html").exists():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for stale in cache_dir.iterdir():
+            if stale.is_dir() and stale != bundle_dir and not stale.name.startswith(".tmp-"):
+                shutil.rmtree(stale, ignore_errors=True)
+        logger.info(f"Remotion bundle ready at {bundle_dir}")
+        return bundle_dir
@@ -0,0 +1,140 @@
+import logging
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+RENDER_CHUNK_RETRIES = 2
+
+
+def split_frame_range(total_frames: int, chunks: int) -> list[tuple[int, int]]:
+    """Split ``[0, total_frames)`` into at most ``chunks`` contiguous inclusive ranges of similar size."""
+    chunks = max(1, min(chunks, total_frames))
+    bounds = [round(i * total_frames / chunks) for i in range(chunks + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(chunks)]
+
+
+def concat_videos(videos: list[Path], output: Path) -> Path:
+    """Concatenate videos encoded with the same settings, without re-encoding.
+
+    Parameters
+    ----------
+    videos : list[Path]
+        The videos, in order
+    output : Path
+        The output video
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for video in videos:
+            f.write(f"file '{video.absolute().as_posix()}'\n")
+        list_path = Path(f.name)
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_path.as_posix(), "-c", "copy", output.absolute().as_posix()],
+            check=True,
+        )
+    finally:
+        list_path.unlink(missing_ok=True)
+    return output
+
+
+def mux_audio(video: Path, audio: Path, output: Path, audio_offset: float = 0.0) -> Path:
+    """Add an audio track to a video, copying the video stream.
+
+    Parameters
+    ----------
+    video : Path
+        The video, its audio track (if any) is dropped
+    audio : Path
+        The audio file
+    output : Path
+        The output video
+    audio_offset : float, optional
+        Seconds of silence before the audio starts, by default 0.0
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    delay_ms = int(audio_offset * 1000)
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error",
+         "-i", video.absolute().as_posix(), "-i", audio.absolute().as_posix(),
+         "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac",
+         "-af", f"adelay=delays={delay_ms}:all=1", "-shortest",
+         "-movflags", "+faststart", output.absolute().as_posix()],
+        check=True,
+    )
+    return output
+
+
+def render_chunked(
+    render_chunk: Callable[[tuple[int, int], Path], Path],
+    total_frames: int,
+    chunks: int,
+    output: Path,
+    audio: Path,
+    audio_offset: float = 0.0,
+    retries: int = RENDER_CHUNK_RETRIES,
+) -> Path:
+    """Render a composition in frame-range chunks in parallel, then concat them and mux the audio.
+
+    Each chunk is rendered muted by ``render_chunk`` into its own file; a
+    failed chunk is retried on its own, up to ``retries`` times. The chunks
+    are concatenated without re-encoding and the audio is muxed once.
+
+    Parameters
+    ----------
+    render_chunk : Callable[[tuple[int, int], Path], Path]
+        Render the given inclusive frame range, muted, to the given file
+    total_frames : int
+        Number of frames of the composition
+    chunks : int
+        Number of chunks, rendered in parallel
+    output : Path
+        The output video
+    audio : Path
+        The narration, muxed at the end
+    audio_offset : float, optional
+        Seconds before the narration starts in the composition, by default 0.0
+    retries : int, optional
+        Retries of a failed chunk, by default RENDER_CHUNK_RETRIES
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    frame_ranges = split_frame_range(total_frames, chunks)
+    chunk_dir = Path(tempfile.mkdtemp(prefix="chunks_", dir=output.absolute().parent))
+
+    def render_with_retries(index: int, frame_range: tuple[int, int]) -> Path:
+        chunk_output = chunk_dir / f"chunk_{index:04d}.mp4"
+        for attempt in range(retries + 1):
+            try:
+                render_chunk(frame_range, chunk_output)
+                return chunk_output
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Chunk {index} (frames {frame_range[0]}-{frame_range[1]}) failed, retrying: {e}")
+
+    try:
+        logger.info(f"Rendering {total_frames} frames in {len(frame_ranges)} chunks")
+        with ThreadPoolExecutor(max_workers=len(frame_ranges)) as executor:
+            chunk_outputs = list(executor.map(render_with_retries, range(len(frame_ranges)), frame_ranges))
+        video = concat_videos(chunk_outputs, chunk_dir / "video.mp4")
+        return mux_audio(video, audio, output, audio_offset)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Memory a browser tab needs to render a 1080p frame of the Arxflix composition
+REMOTION_MEMORY_PER_TAB_MB = int(os.getenv("REMOTION_MEMORY_PER_TAB_MB", "700"))
+# Memory left to the rest of the pipeline (Python, ffmpeg, the browser itself)
+REMOTION_MEMORY_RESERVE_MB = int(os.getenv("REMOTION_MEMORY_RESERVE_MB", "1024"))
+RENDER_CALIBRATION_PATH = Path(os.getenv("RENDER_CALIBRATION_PATH", ".cache/render_calibration.json"))
+CALIBRATION_COMPOSITION_ID = "Calibration"
+CALIBRATION_DURATION_IN_FRAMES = 150
+
+
+def available_cores() -> int:
+    """Return the number of cores usable by this process, container CPU quota included."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # macOS has no CPU affinity
+        cores = os.cpu_count() or 1
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def _cgroup_memory_stat(path: Path, keys: tuple[str, ...]) -> int:
+    """Return the first of ``keys`` found in a cgroup memory.stat file, 0 if none is."""
+    stats = dict(line.split() for line in path.read_text().splitlines() if line.strip())
+    return next((int(stats[key]) for key in keys if key in stats), 0)
+
+
+def _cgroup_available_bytes() -> int | None:
+    """Return the memory left under the cgroup limit (v2 or v1), page cache that can be reclaimed included."""
+    v2 = Path("/sys/fs/cgroup")
+    v1 = Path("/sys/fs/cgroup/memory")
+    if (v2 / "memory.max").exists():
+        limit = (v2 / "memory.max").read_text().strip()
+        if limit == "max":
+            return None
+        usage = int((v2 / "memory.current").read_text())
+        inactive_file = _cgroup_memory_stat(v2 / "memory.stat", ("inactive_file",))
+    elif (v1 / "memory.limit_in_bytes").exists():
+        limit = (v1 / "memory.limit_in_bytes").read_text().strip()
+        # Without a limit, cgroup v1 reports a number close to 2**63
+        if int(limit) >= 2**60:
+            return None
+        usage = int((v1 / "memory.usage_in_bytes").read_text())
+        inactive_file = _cgroup_memory_stat(v1 / "memory.stat", ("total_inactive_file", "inactive_file"))
+    else:
+        return None
+    # Usage counts the page cache, whose inactive part is reclaimed on demand
+    return int(limit) - max(0, usage - inactive_file)
+
+
+def available_memory_mb() -> int | None:
+    """Return the memory available to this process in MB, container limit included, None if unknown.
+
+    Like MemAvailable, the page cache that can be reclaimed counts as
+    available: on a machine that has been running for a while, free memory
+    alone is mostly taken by the cache.
+    """
+    available = None
+    try:
+        for line in Path("/proc/meminfo").read_text().splitlines():
+            if line.startswith("MemAvailable:"):
+                available = int(line.split()[1]) // 1024
+                break
+    except (OSError, ValueError, IndexError):
+        pass
+    if available is None:
+        try:
+            available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2**20
+        except (ValueError, OSError, AttributeError):
+            pass
+    try:
+        cgroup_available = _cgroup_available_bytes()
+        if cgroup_available is not None:
+            cgroup_available //= 2**20
+            available = cgroup_available if available is None else min(available, cgroup_available)
+    except (OSError, ValueError):
+        pass
+    return available
+
+
+def auto_render_concurrency() -> int:
+    """Pick a render concurrency from the calibration, or from the cores and memory.
+
+    The calibrated value (see `calibrate_render_concurrency`) wins when it was
+    measured on a machine with the same number of cores. Otherwise one tab per
+    core, capped by the memory available for ``REMOTION_MEMORY_PER_TAB_MB``
+    per tab.
+    """
+    cores = available_cores()
+    if RENDER_CALIBRATION_PATH.exists():
+        try:
+            calibration = json.loads(RENDER_CALIBRATION_PATH.read_text())
+            if calibration["cores"] == cores:
+                return calibration["best_concurrency"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring render calibration {RENDER_CALIBRATION_PATH}: {e}")
+    concurrency = cores
+    memory = available_memory_mb()
+    if memory is not None:
+        concurrency = min(concurrency, (memory - REMOTION_MEMORY_RESERVE_MB) // REMOTION_MEMORY_PER_TAB_MB)
+    return max(1, concurrency)
+
+
+def resolve_render_concurrency(concurrency: int | str | None) -> int:
+    """Turn a concurrency setting ("auto", a number, or None for "auto") into a number of tabs."""
+    if concurrency is None or str(concurrency).strip().lower() == "auto":
+        resolved = auto_render_concurrency()
+        logger.info(f"Render concurrency: {resolved} (auto)")
+        return resolved
+    return max(1, int(concurrency))
+
+
+def calibrate_render_concurrency(levels: list[int] | None = None, path: Path = RENDER_CALIBRATION_PATH) -> dict:
+    """Render the calibration composition at several concurrency levels and record the throughput.
+
+    Parameters
+    ----------
+    levels : list[int] | None, optional
+        The concurrency levels to measure, by default powers of two up to the
+        number of cores
+    path : Path, optional
+        Where the results are written, used afterwards by the "auto" mode, by
+        default RENDER_CALIBRATION_PATH
+
+    Returns
+    -------
+    dict
+        The cores, the frames per second of each level and the best level
+    """
+    from backend.utils.generate_video import render_cli
+    from backend.utils.remotion_bundle import get_remotion_bundle
+
+    cores = available_cores()
+    if not levels:
+        levels = sorted({*(2**i for i in range(cores.bit_length()) if 2**i <= cores), cores})
+    serve_url = get_remotion_bundle()
+    fps: dict[int, float] = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Startup time of Node and the browser, not part of the throughput
+        start = time.perf_counter()
+        render_cli(
+            serve_url, {}, Path(temp_dir) / "overhead.mp4", concurrency=1,
+            composition_id=CALIBRATION_COMPOSITION_ID, frame_range=(0, 0),
+        )
+        overhead = time.perf_counter() - start
+        for level in levels:
+            output = Path(temp_dir) / f"calibration_{level}.mp4"
+            start = time.perf_counter()
+            render_cli(serve_url, {}, output, concurrency=level, composition_id=CALIBRATION_COMPOSITION_ID)
+            elapsed = max(time.perf_counter() - start - overhead, 1e-3)
+            fps[level] = (CALIBRATION_DURATION_IN_FRAMES - 1) / elapsed
+            logger.info(f"Concurrency {level}: {fps[level]:.1f} frames/s")
+    calibration = {
+        "cores": cores,
+        "memory_mb": available_memory_mb(),
+        "fps": fps,
+        "best_concurrency": max(fps, key=fps.get),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(calibration, indent=2))
+    return calibration
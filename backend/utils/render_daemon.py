@@ -0,0 +1,312 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+RENDER_DAEMON_SCRIPT = Path("frontend/render-server.mjs")
+# Number of headless browsers kept open, i.e. renders served at the same time
+RENDER_DAEMON_BROWSERS = int(os.getenv("RENDER_DAEMON_BROWSERS", "1"))
+# Restarts allowed after crashes with no job done in between before giving up
+RENDER_DAEMON_MAX_RESTARTS = int(os.getenv("RENDER_DAEMON_MAX_RESTARTS", "3"))
+RENDER_DAEMON_READY_TIMEOUT = 120
+RENDER_DAEMON_PING_TIMEOUT = 10
+
+
+class RenderDaemonError(RuntimeError):
+    """A render job failed, or the render daemon could not be (re)started."""
+
+
+class RenderDaemon:
+    """Client of the long-lived Node render service (`frontend/render-server.mjs`).
+
+    The service keeps headless browsers warm between renders; requests and
+    answers are JSON lines over its stdin/stdout. The service is started on
+    first use, health-checked before each job and restarted when it crashes,
+    at most ``max_restarts`` times in a row: a job done resets the count. A
+    job interrupted by a crash is submitted once more to the restarted
+    service.
+    """
+
+    def __init__(
+        self,
+        script: Path = RENDER_DAEMON_SCRIPT,
+        browsers: int = RENDER_DAEMON_BROWSERS,
+        max_restarts: int = RENDER_DAEMON_MAX_RESTARTS,
+    ):
+        self.script = script
+        self.browsers = browsers
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self._proc: subprocess.Popen | None = None
+        self._ready = threading.Event()
+        # Request id -> (process serving it, queue of its answers)
+        self._pending: dict[str, tuple[subprocess.Popen, queue.Queue]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self) -> None:
+        self._ready.clear()
+        proc = subprocess.Popen(
+            ["node", self.script.name],
+            cwd=self.script.parent.absolute().as_posix(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env={**os.environ, "RENDER_DAEMON_BROWSERS": str(self.browsers)},
+        )
+        self._proc = proc
+        threading.Thread(target=self._read, args=(proc,), daemon=True).start()
+        if not self._ready.wait(RENDER_DAEMON_READY_TIMEOUT):
+            proc.kill()
+            raise RenderDaemonError("Render daemon did not become ready in time")
+        logger.info(f"Render daemon started with {self.browsers} browser(s) (pid {proc.pid})")
+
+    def _read(self, proc: subprocess.Popen) -> None:
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.debug(f"[render daemon] {line.rstrip()}")
+                continue
+            if message.get("type") == "ready":
+                self._ready.set()
+            elif message.get("type") == "fatal":
+                logger.error(f"[render daemon] {message.get('message')}")
+            elif message.get("id") in self._pending:
+                self._pending[message["id"]][1].put(message)
+            else:
+                logger.warning(f"[render daemon] Unexpected message: {message}")
+        # The process is gone, fail everything it was working on
+        proc.wait()
+        logger.warning(f"Render daemon exited with code {proc.returncode}")
+        for owner, answers in list(self._pending.values()):
+            if owner is proc:
+                answers.put({"type": "error", "crashed": True, "message": f"Render daemon exited with code {proc.returncode}"})
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            if self._proc is not None:
+                self.restarts += 1
+                if self.restarts > self.max_restarts:
+                    raise RenderDaemonError(f"Render daemon crashed {self.restarts} times, giving up")
+                logger.warning(f"Restarting the render daemon ({self.restarts}/{self.max_restarts})")
+            self._start()
+
+    def _send(self, request: dict[str, Any]) -> tuple[str, queue.Queue]:
+        request_id = str(next(self._ids))
+        answers: queue.Queue = queue.Queue()
+        self._pending[request_id] = (self._proc, answers)
+        try:
+            with self._write_lock:
+                self._proc.stdin.write(json.dumps({"id": request_id, **request}) + "\n")
+                self._proc.stdin.flush()
+        except (OSError, AttributeError) as e:
+            answers.put({"type": "error", "crashed": True, "message": f"Could not reach the render daemon: {e}"})
+        return request_id, answers
+
+    def ping(self, timeout: float = RENDER_DAEMON_PING_TIMEOUT) -> bool:
+        """Return whether the daemon answers a health check within ``timeout`` seconds."""
+        if not self.running:
+            return False
+        request_id, answers = self._send({"type": "ping"})
+        try:
+            return answers.get(timeout=timeout).get("type") == "pong"
+        except queue.Empty:
+            return False
+        finally:
+            self._pending.pop(request_id, None)
+
+    def render(
+        self,
+        serve_url: str,
+        composition_id: str,
+        input_props: dict[str, Any],
+        output: Path,
+        frame_range: tuple[int, int] | None = None,
+        concurrency: int | None = None,
+        muted: bool = False,
+        scale: float = 1.0,
+        crf: int | None = None,
+        x264_preset: str | None = None,
+        profile: bool = False,
+        on_progress: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Path:
+        """Render a composition with the warm browsers of the daemon.
+
+        Parameters
+        ----------
+        serve_url : str
+            The Remotion bundle directory or URL
+        composition_id : str
+            The composition to render
+        input_props : dict[str, Any]
+            The props of the composition
+        output : Path
+            The output video
+        frame_range : tuple[int, int] | None, optional
+            First and last frame (inclusive) to render, by default the whole composition
+        concurrency : int | None, optional
+            Number of browser tabs used for the render, by default Remotion's default
+        muted : bool, optional
+            Render without the audio track, by default False
+        scale : float, optional
+            Factor applied to the resolution of the composition, by default 1.0
+        crf : int | None, optional
+            x264 constant rate factor, by default Remotion's default
+        x264_preset : str | None, optional
+            x264 preset, by default Remotion's default
+        profile : bool, optional
+            Add the milliseconds each frame took to the progress messages
+            (``frameTimes``, ``[frame, ms]`` pairs), by default False
+        on_progress : Callable[[dict[str, Any]], None] | None, optional
+            Called with each progress message (progress, renderedFrames, encodedFrames)
+
+        Returns
+        -------
+        Path
+            The output video
+
+        Raises
+        ------
+        RenderDaemonError
+            If the render failed, or the daemon crashed twice during the job.
+        """
+        request = {
+            "type": "render",
+            "serveUrl": serve_url,
+            "compositionId": composition_id,
+            "inputProps": input_props,
+            "output": output.absolute().as_posix(),
+            "frameRange": list(frame_range) if frame_range else None,
+            "concurrency": concurrency,
+            "muted": muted,
+            "scale": scale,
+            "crf": crf,
+            "x264Preset": x264_preset,
+            "profile": profile,
+        }
+        self._submit(request, on_progress)
+        return output
+
+    def render_stills(
+        self,
+        serve_url: str,
+        composition_id: str,
+        input_props: dict[str, Any],
+        frames: list[int],
+        out_dir: Path,
+        concurrency: int | None = None,
+        scale: float = 1.0,
+        on_progress: Callable[[dict[str, Any]], None] | None = None,
+    ) -> list[Path]:
+        """Render single frames of a composition to PNG files with the warm browsers of the daemon.
+
+        Parameters
+        ----------
+        serve_url : str
+            The Remotion bundle directory or URL
+        composition_id : str
+            The composition to render
+        input_props : dict[str, Any]
+            The props of the composition
+        frames : list[int]
+            The frames to render
+        out_dir : Path
+            Where the PNG files are written
+        concurrency : int | None, optional
+            Number of browser pages rendering at the same time, by default 1
+        scale : float, optional
+            Factor applied to the resolution of the composition, by default 1.0
+        on_progress : Callable[[dict[str, Any]], None] | None, optional
+            Called with each progress message (progress, renderedFrames)
+
+        Returns
+        -------
+        list[Path]
+            The PNG file of each frame, in order
+        """
+        message = self._submit(
+            {
+                "type": "stills",
+                "serveUrl": serve_url,
+                "compositionId": composition_id,
+                "inputProps": input_props,
+                "frames": frames,
+                "outDir": out_dir.absolute().as_posix(),
+                "concurrency": concurrency,
+                "scale": scale,
+            },
+            on_progress,
+        )
+        return [Path(output) for output in message["outputs"]]
+
+    def _submit(self, request: dict[str, Any], on_progress: Callable[[dict[str, Any]], None] | None) -> dict[str, Any]:
+        # Send a job, resubmitting it once if the daemon crashes, and return its "done" message
+        for attempt in range(2):
+            self._ensure_running()
+            if not self.ping():
+                logger.warning("Render daemon is not answering, killing it")
+                self._proc.kill()
+                self._proc.wait()
+                self._ensure_running()
+            request_id, answers = self._send(request)
+            try:
+                while True:
+                    message = answers.get()
+                    if message["type"] == "progress":
+                        if on_progress:
+                            on_progress(message)
+                    elif message["type"] == "done":
+                        # The service works again, only crashes in a row make it give up
+                        with self._lock:
+                            self.restarts = 0
+                        return message
+                    elif message.get("crashed") and attempt == 0:
+                        logger.warning(f"Render daemon crashed during the job, retrying: {message['message']}")
+                        break
+                    else:
+                        raise RenderDaemonError(message.get("message", "Render failed"))
+            finally:
+                self._pending.pop(request_id, None)
+        raise RenderDaemonError("Render daemon crashed twice during the job")
+
+    def close(self) -> None:
+        """Stop the daemon and its browsers."""
+        with self._lock:
+            if not self.running:
+                return
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+
+
+_daemon: RenderDaemon | None = None
+_daemon_lock = threading.Lock()
+
+
+def get_render_daemon() -> RenderDaemon:
+    """Return the render daemon shared by every render of the process."""
+    global _daemon
+    with _daemon_lock:
+        if _daemon is None:
+            _daemon = RenderDaemon()
+            atexit.register(_daemon.close)
+        return _daemon
@@ -0,0 +1,81 @@
+import json
+import math
+from pathlib import Path
+from typing import Any
+
+import soundfile as sf
+import srt
+
+from backend.utils.audio_viz import read_audio_viz_meta
+
+RENDER_MANIFEST_VERSION = 1
+RENDER_MANIFEST_NAME = "manifest.json"
+
+
+def audio_duration_in_frames(audio_path: Path, fps: int) -> int:
+    """Return the number of whole frames of an audio file, as `calculateMetadata` computes it."""
+    return math.floor(sf.info(str(audio_path)).duration * fps)
+
+
+def build_render_manifest(input_dir: Path, fps: int) -> dict[str, Any]:
+    """Precompute everything the composition needs from the assets of a video.
+
+    The browser tabs then fetch one file instead of parsing the SRT, scaling
+    the rich content to frames and decoding the audio to measure it.
+
+    Parameters
+    ----------
+    input_dir : Path
+        The directory containing subtitles.srt, audio.wav and rich.json
+    fps : int
+        The frame rate of the composition
+
+    Returns
+    -------
+    dict[str, Any]
+        The manifest: frame rate, exact duration in frames, intro title and
+        figure, the words with their first and last frame, and the rich
+        content with its first and last frame (fractional, as the transitions
+        are interpolated from the exact times), and the parameters of the
+        precomputed audio visualization if there is one. Local files stay
+        relative to the manifest URL.
+    """
+    subtitles = srt.parse((input_dir / "subtitles.srt").read_text())
+    words = [
+        {
+            "id": subtitle.index,
+            "text": subtitle.content,
+            "start": math.floor(subtitle.start.total_seconds() * fps),
+            "end": math.floor(subtitle.end.total_seconds() * fps),
+        }
+        for subtitle in subtitles
+    ]
+    rich_content = [
+        {
+            "type": item["type"],
+            "content": item["content"],
+            "start": item["start"] * fps,
+            "end": item["end"] * fps,
+            "image": item.get("image"),
+        }
+        for item in json.loads((input_dir / "rich.json").read_text())
+    ]
+    return {
+        "version": RENDER_MANIFEST_VERSION,
+        "fps": fps,
+        "durationInFrames": audio_duration_in_frames(input_dir / "audio.wav", fps),
+        "intro": {
+            "title": next((c["content"] for c in rich_content if c["type"] == "headline"), ""),
+            "figure": next((c["content"] for c in rich_content if c["type"] == "figure"), ""),
+        },
+        "words": words,
+        "richContent": rich_content,
+        "audioViz": read_audio_viz_meta(input_dir),
+    }
+
+
+def export_render_manifest(input_dir: Path, fps: int) -> dict[str, Any]:
+    """Build the render manifest of a video and write it to ``input_dir/manifest.json``."""
+    manifest = build_render_manifest(input_dir, fps)
+    (input_dir / RENDER_MANIFEST_NAME).write_text(json.dumps(manifest, separators=(",", ":")))
+    return manifest
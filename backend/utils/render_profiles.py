@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import Literal
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    """Quality settings of a render, applied on top of the same assets.
+
+    Attributes
+    ----------
+    name : str
+        The profile name
+    scale : float
+        Factor applied to the 1920x1080 resolution
+    fps : int | None
+        Frame rate, None for VIDEO_FPS
+    crf : int | None
+        x264 constant rate factor, None for Remotion's default
+    x264_preset : str | None
+        x264 preset, None for Remotion's default
+    wave_lines : int | None
+        Number of waveform lines, None for the composition default
+    storyboard : bool
+        Render one still per figure/headline/equation segment and turn them
+        into a slideshow with the narration, instead of rendering every frame
+    """
+    name: str
+    scale: float = 1.0
+    fps: int | None = None
+    crf: int | None = None
+    x264_preset: str | None = None
+    wave_lines: int | None = None
+    storyboard: bool = False
+
+
+RENDER_PROFILES: dict[str, RenderProfile] = {
+    "final": RenderProfile("final"),
+    "draft": RenderProfile("draft", scale=0.5, fps=15, crf=30, x264_preset="ultrafast", wave_lines=60),
+    "storyboard": RenderProfile("storyboard", scale=0.5, crf=30, x264_preset="ultrafast", storyboard=True),
+}
+
+RenderProfileName = Literal["final", "draft", "storyboard"]
+
+
+def get_render_profile(name: str) -> RenderProfile:
+    """Return the render profile with the given name.
+
+    Raises
+    ------
+    ValueError
+        If there is no such profile.
+    """
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile {name!r}, expected one of {list(RENDER_PROFILES)}")
+    return RENDER_PROFILES[name]
@@ -0,0 +1,236 @@
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two progress reports
+RENDER_PROGRESS_INTERVAL = 1.0
+# Seconds of history the frame rate is measured over
+RENDER_PROGRESS_WINDOW = 10.0
+FRAME_PROFILE_TOP = 20
+
+# "Rendered 150/3000", "Rendering frames 150/3000", ... in `remotion render` output
+_RENDERED_FRAMES = re.compile(r"Render(?:ed|ing)[^/\n]*?(\d+)\s*/\s*(\d+)")
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+# Latest progress of each running render, by output path, for the API and Gradio;
+# removed when the render ends
+_latest_progress: dict[str, dict[str, Any]] = {}
+_latest_progress_lock = threading.Lock()
+
+
+@dataclass
+class RenderProgress:
+    """Progress of a render.
+
+    Attributes
+    ----------
+    frames_done : int
+        Number of frames rendered
+    total_frames : int
+        Number of frames of the render
+    fps : float
+        Frames rendered per second over the last seconds
+    eta_seconds : float | None
+        Estimated seconds until all frames are rendered, None until measured
+    elapsed_seconds : float
+        Seconds since the render started
+    """
+    frames_done: int
+    total_frames: int
+    fps: float
+    eta_seconds: float | None
+    elapsed_seconds: float
+
+    def __str__(self) -> str:
+        percent = 100 * self.frames_done / self.total_frames if self.total_frames else 100.0
+        eta = "?" if self.eta_seconds is None else f"{int(self.eta_seconds // 60)}:{int(self.eta_seconds % 60):02d}"
+        return f"{self.frames_done}/{self.total_frames} frames ({percent:.0f}%), {self.fps:.1f} fps, ETA {eta}"
+
+
+class RenderProgressTracker:
+    """Turn the rendered frame counts of one or several renderers into a progress stream.
+
+    Parameters
+    ----------
+    total_frames : int
+        Number of frames of the whole render
+    on_progress : Callable[[RenderProgress], None] | None, optional
+        Called at most every ``interval`` seconds, and when the last frame is done
+    interval : float, optional
+        Seconds between two calls of ``on_progress``, by default RENDER_PROGRESS_INTERVAL
+    """
+
+    def __init__(
+        self,
+        total_frames: int,
+        on_progress: Callable[[RenderProgress], None] | None = None,
+        interval: float = RENDER_PROGRESS_INTERVAL,
+    ):
+        self.total_frames = total_frames
+        self.on_progress = on_progress
+        self.interval = interval
+        self.frame_times: dict[int, float] = {}
+        self._start = time.monotonic()
+        self._done: dict[str, int] = {}
+        self._history: deque[tuple[float, int]] = deque([(self._start, 0)])
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, frames_done: int, key: str = "") -> None:
+        """Record the number of frames a renderer has done.
+
+        Parameters
+        ----------
+        frames_done : int
+            Frames done by this renderer since it started
+        key : str, optional
+            The renderer, for renders split between several of them (chunks, layers)
+        """
+        with self._lock:
+            self._done[key] = frames_done
+            now = time.monotonic()
+            done = min(sum(self._done.values()), self.total_frames)
+            self._history.append((now, done))
+            while len(self._history) > 2 and now - self._history[1][0] > RENDER_PROGRESS_WINDOW:
+                self._history.popleft()
+            if now - self._last_report < self.interval and done < self.total_frames:
+                return
+            self._last_report = now
+            progress = self._progress(now, done)
+        if self.on_progress:
+            self.on_progress(progress)
+
+    def add_frame_times(self, frame_times: list[list[float]]) -> None:
+        """Record how many milliseconds frames took to render, as ``[frame, ms]`` pairs."""
+        with self._lock:
+            for frame, ms in frame_times:
+                self.frame_times[int(frame)] = ms
+
+    def daemon_callback(self, key: str = "") -> Callable[[dict[str, Any]], None]:
+        """Return an ``on_progress`` callback for the render daemon reporting to this tracker."""
+        def on_message(message: dict[str, Any]) -> None:
+            if message.get("frameTimes"):
+                self.add_frame_times(message["frameTimes"])
+            if "renderedFrames" in message:
+                self.update(message["renderedFrames"], key)
+        return on_message
+
+    def _progress(self, now: float, done: int) -> RenderProgress:
+        first_time, first_done = self._history[0]
+        fps = (done - first_done) / (now - first_time) if now > first_time else 0.0
+        eta = (self.total_frames - done) / fps if fps > 0 else None
+        return RenderProgress(done, self.total_frames, fps, eta, now - self._start)
+
+
+def parse_rendered_frames(line: str) -> int | None:
+    """Return the number of rendered frames from a line of `remotion render` output, None if there is none."""
+    match = _RENDERED_FRAMES.search(_ANSI_ESCAPE.sub("", line))
+    return int(match.group(1)) if match else None
+
+
+def publish_render_progress(key: str, progress: RenderProgress) -> None:
+    """Make the latest progress of a render available to `get_render_progress`."""
+    with _latest_progress_lock:
+        _latest_progress[key] = asdict(progress)
+
+
+def clear_render_progress(key: str) -> None:
+    """Forget the progress of a render once it is over, whether it succeeded or not."""
+    with _latest_progress_lock:
+        _latest_progress.pop(key, None)
+
+
+def get_render_progress(key: str) -> dict[str, Any] | None:
+    """Return the latest progress published for a render, None if there is none."""
+    with _latest_progress_lock:
+        return _latest_progress.get(key)
+
+
+def build_frame_profile(
+    frame_times: dict[int, float],
+    manifest: dict[str, Any],
+    intro_frames: int,
+    transition_frames: int = 5,
+    top: int = FRAME_PROFILE_TOP,
+) -> dict[str, Any]:
+    """Summarize the render time of each frame by what is on screen.
+
+    Every frame shows the subtitles and the waveform. A frame is also tagged
+    with the intro, the type of the rich content on screen (figure,
+    headline, equation), "transition" while it enters or exits, and
+    "word_change" when a word starts, which lays the subtitles out again.
+    Comparing the mean time of the tags shows which component is the
+    bottleneck.
+
+    Parameters
+    ----------
+    frame_times : dict[int, float]
+        The milliseconds each frame took to render
+    manifest : dict[str, Any]
+        The render manifest of the video
+    intro_frames : int
+        Number of frames of the intro
+    transition_frames : int, optional
+        Length of the enter and exit transitions, by default 5
+    top : int, optional
+        Number of slowest frames to list, by default FRAME_PROFILE_TOP
+
+    Returns
+    -------
+    dict[str, Any]
+        The frame count, mean, median and 95th percentile, the statistics of
+        each tag and the slowest frames with their tags
+    """
+    if not frame_times:
+        return {"frames": 0, "components": {}, "slowest_frames": []}
+    word_starts = {word["start"] for word in manifest["words"]}
+
+    def tags(frame: int) -> list[str]:
+        if frame < intro_frames:
+            return ["intro"]
+        relative_frame = frame - intro_frames
+        frame_tags = ["subtitles_waveform"]
+        for item in manifest["richContent"]:
+            if item["start"] <= relative_frame <= item["end"]:
+                frame_tags.append(item["type"])
+                if min(relative_frame - item["start"], item["end"] - relative_frame) < transition_frames:
+                    frame_tags.append("transition")
+                break
+        if relative_frame in word_starts:
+            frame_tags.append("word_change")
+        return frame_tags
+
+    times = sorted(frame_times.values())
+    median = statistics.median(times)
+    by_tag: dict[str, list[float]] = {}
+    frame_tags = {frame: tags(frame) for frame in frame_times}
+    for frame, ms in frame_times.items():
+        for tag in frame_tags[frame]:
+            by_tag.setdefault(tag, []).append(ms)
+    components = {
+        tag: {
+            "frames": len(values),
+            "mean_ms": round(statistics.fmean(values), 2),
+            "total_ms": round(sum(values), 1),
+            "vs_median": round(statistics.fmean(values) / median, 2) if median else None,
+        }
+        for tag, values in sorted(by_tag.items(), key=lambda item: -statistics.fmean(item[1]))
+    }
+    slowest = sorted(frame_times.items(), key=lambda item: -item[1])[:top]
+    return {
+        "frames": len(times),
+        "mean_ms": round(statistics.fmean(times), 2),
+        "median_ms": round(median, 2),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 2),
+        "components": components,
+        "slowest_frames": [
+            {"frame": frame, "ms": round(ms, 2), "tags": frame_tags[frame]} for frame, ms in slowest
+        ],
+    }
@@ -0,0 +1,131 @@
+import logging
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from backend.utils.render_concurrency import available_cores
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg video filter of each rendition
+RENDITIONS: dict[str, str] = {
+    "1080p": "scale=1920:1080:flags=lanczos",
+    "720p": "scale=1280:720:flags=lanczos",
+    # The 16:9 video centered over a blurred, cropped copy of itself
+    "vertical": (
+        "split[bg][fg];"
+        "[bg]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,boxblur=20:2[bg];"
+        "[fg]scale=1080:-2:flags=lanczos[fg];"
+        "[bg][fg]overlay=0:(H-h)/2"
+    ),
+}
+# Size of the renditions that keep the master video stream when it already has it
+RENDITION_SIZES: dict[str, tuple[int, int]] = {
+    "1080p": (1920, 1080),
+    "720p": (1280, 720),
+}
+RENDITION_CRF = 20
+RENDITION_X264_PRESET = "medium"
+
+
+def check_renditions(names: list[str], profile: str = "final") -> None:
+    """Raise a ValueError if one of the renditions is unknown, or the profile is not "final", before anything is rendered.
+
+    The other profiles render at half the size: their renditions would be
+    upscaled.
+    """
+    unknown = [name for name in names if name not in RENDITIONS]
+    if unknown:
+        raise ValueError(f"Unknown renditions {unknown}, expected some of {list(RENDITIONS)}")
+    if names and profile != "final":
+        raise ValueError(f"Renditions are made from the final render, not from a {profile} one")
+
+
+def video_size(video: Path) -> tuple[int, int]:
+    """Return the width and height of the first video stream of a video."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", video.absolute().as_posix()],
+        check=True, capture_output=True, text=True,
+    )
+    width, height = result.stdout.strip().split("x")
+    return int(width), int(height)
+
+
+def rendition_path(master: Path, name: str) -> Path:
+    """Return the path of a rendition, next to the master: ``<stem>_<name>.mp4``."""
+    return master.with_name(f"{master.stem}_{name}.mp4")
+
+
+def transcode_rendition(master: Path, name: str, output: Path, threads: int = 0) -> Path:
+    """Produce one rendition of the master video, with the MP4 index at the start of the file.
+
+    Parameters
+    ----------
+    master : Path
+        The rendered video
+    name : str
+        The rendition, a key of RENDITIONS
+    output : Path
+        The output video
+    threads : int, optional
+        Number of threads of the encoder, by default 0 (ffmpeg's choice)
+
+    Returns
+    -------
+    Path
+        The output video
+    """
+    if name in RENDITION_SIZES and video_size(master) == RENDITION_SIZES[name]:
+        # Same size as the master: only move the index to the start of the file
+        codec_args = ["-c", "copy"]
+    else:
+        codec_args = [
+            "-vf", RENDITIONS[name],
+            "-c:v", "libx264", "-preset", RENDITION_X264_PRESET, "-crf", str(RENDITION_CRF),
+            "-pix_fmt", "yuv420p", "-threads", str(threads),
+            "-c:a", "copy",
+        ]
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", master.absolute().as_posix(),
+         *codec_args, "-movflags", "+faststart", output.absolute().as_posix()],
+        check=True,
+    )
+    return output
+
+
+def transcode_renditions(master: Path, names: list[str]) -> dict[str, dict[str, Any]]:
+    """Produce several renditions of the master video in parallel.
+
+    The cores are shared between the encoders, so the renditions finish at
+    about the same time instead of competing for every core.
+
+    Parameters
+    ----------
+    master : Path
+        The rendered video
+    names : list[str]
+        The renditions, keys of RENDITIONS
+
+    Returns
+    -------
+    dict[str, dict[str, Any]]
+        The path and the transcode time in seconds of each rendition
+    """
+    check_renditions(names)
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    threads = max(1, available_cores() // len(names))
+
+    def transcode(name: str) -> dict[str, Any]:
+        start = time.perf_counter()
+        output = transcode_rendition(master, name, rendition_path(master, name), threads)
+        seconds = time.perf_counter() - start
+        logger.info(f"Rendition {name} written to {output} in {seconds:.1f}s")
+        return {"path": str(output), "seconds": round(seconds, 3)}
+
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        return dict(zip(names, executor.map(transcode, names)))
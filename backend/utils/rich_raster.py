@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from backend.utils.remotion_bundle import FRONTEND_PATH, get_remotion_bundle
+from backend.utils.render_daemon import get_render_daemon
+
+logger = logging.getLogger(__name__)
+
+RICH_RASTER_CACHE_DIR = Path(os.getenv("RICH_RASTER_CACHE_DIR", ".cache/rich_raster"))
+RICH_RASTER_COMPOSITION_ID = "RichContentRaster"
+KATEX_CHECK_SCRIPT = Path("katex-check.mjs")
+
+
+def check_equations(equations: list[str], frontend: Path = FRONTEND_PATH) -> list[str | None]:
+    """Parse LaTeX equations with the KaTeX of the frontend.
+
+    Parameters
+    ----------
+    equations : list[str]
+        The equations
+    frontend : Path, optional
+        The frontend directory, by default FRONTEND_PATH
+
+    Returns
+    -------
+    list[str | None]
+        For each equation, None if KaTeX parses it, or its error message
+    """
+    if not equations:
+        return []
+    result = subprocess.run(
+        ["node", KATEX_CHECK_SCRIPT.as_posix()],
+        cwd=frontend.absolute().as_posix(),
+        input=json.dumps(equations),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def rasterize_rich_content(
+    items: list[tuple[str, str]],
+    cache_dir: Path = RICH_RASTER_CACHE_DIR,
+) -> dict[tuple[str, str], Path]:
+    """Render headlines and equations to transparent PNG images, once per content.
+
+    The images are as large as the row the video shows them in, with the
+    content laid out as the video does, so showing an image instead of the
+    text looks the same. They are cached under a hash of the content and of
+    the Remotion bundle, so a change of the frontend renders them again.
+
+    Parameters
+    ----------
+    items : list[tuple[str, str]]
+        The type ("headline" or "equation") and content of each item
+    cache_dir : Path, optional
+        Where the images are cached, by default RICH_RASTER_CACHE_DIR
+
+    Returns
+    -------
+    dict[tuple[str, str], Path]
+        The cached image of each item
+    """
+    serve_url = get_remotion_bundle()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    images = {}
+    missing = []
+    for item in dict.fromkeys(items):
+        key = hashlib.sha256(json.dumps([serve_url.name, *item]).encode()).hexdigest()[:16]
+        images[item] = cache_dir / f"{key}.png"
+        if not images[item].exists():
+            missing.append(item)
+    if missing:
+        logger.info(f"Rendering {len(missing)} headlines and equations to images")
+        with tempfile.TemporaryDirectory(dir=cache_dir) as out_dir:
+            stills = get_render_daemon().render_stills(
+                serve_url.absolute().as_posix(),
+                RICH_RASTER_COMPOSITION_ID,
+                {"items": [{"type": type_, "content": content} for type_, content in missing]},
+                list(range(len(missing))),
+                Path(out_dir),
+            )
+            for item, still in zip(missing, stills):
+                os.replace(still, images[item])
+    return images
+
+
+def export_rich_images(items: list[tuple[str, str]], out_dir: Path) -> dict[tuple[str, str], str]:
+    """Put the images of headlines and equations next to the rich content json.
+
+    Parameters
+    ----------
+    items : list[tuple[str, str]]
+        The type and content of each item
+    out_dir : Path
+        The directory of the rich content json
+
+    Returns
+    -------
+    dict[tuple[str, str], str]
+        The file name of the image of each item, relative to ``out_dir``
+    """
+    names = {}
+    for item, image in rasterize_rich_content(items).items():
+        destination = out_dir / f"rich_{image.name}"
+        if not destination.exists():
+            shutil.copy(image, destination)
+        names[item] = destination.name
+    return names
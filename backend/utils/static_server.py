@@ -0,0 +1,182 @@
+import logging
+import os
+import re
+import shutil
+import threading
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Use IPv4 to avoid environments where localhost resolves to IPv6 ::1
+STATIC_SERVER_HOST = os.getenv("STATIC_SERVER_HOST", "127.0.0.1")
+STATIC_SERVER_READY_TIMEOUT = 5
+
+
+class _StaticRequestHandler(SimpleHTTPRequestHandler):
+    """Serve the files of the mounted directories, with keep-alive, CORS and byte ranges."""
+
+    protocol_version = "HTTP/1.1"
+    server: "_StaticHTTPServer"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"[static server] {format % args}")
+
+    def end_headers(self) -> None:
+        self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def translate_path(self, path: str) -> str:
+        # /<mount token>/<relative path> -> file of the mounted directory
+        token, _, relative = unquote(urlsplit(path).path).lstrip("/").partition("/")
+        root = self.server.mounts.get(token)
+        if root is None:
+            return ""
+        target = (root / relative).resolve()
+        if not target.is_relative_to(root):
+            return ""
+        return target.as_posix()
+
+    def do_GET(self) -> None:
+        if self.path == "/healthz":
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+            return
+        super().do_GET()
+
+    def send_head(self):
+        self._remaining = None
+        path = self.translate_path(self.path)
+        if not path or not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return None
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", "").strip())
+        if match and (match[1] or match[2]):
+            if match[1]:
+                start = int(match[1])
+                end = min(int(match[2]), size - 1) if match[2] else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start = max(size - int(match[2]), 0)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+        f = open(path, "rb")
+        if match and (match[1] or match[2]):
+            f.seek(start)
+            self._remaining = end - start + 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile) -> None:
+        if self._remaining is None:
+            shutil.copyfileobj(source, outputfile)
+            return
+        remaining = self._remaining
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class _StaticHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int]):
+        self.mounts: dict[str, Path] = {}
+        super().__init__(address, _StaticRequestHandler)
+
+
+class StaticServer:
+    """Threaded HTTP server exposing job directories to the Remotion renderer.
+
+    The server binds its own port, so there is no window where another process
+    can take it, and `start` only returns once the server answered a health
+    check. Several directories can be mounted at the same time, each under its
+    own URL prefix, so concurrent renders share one server.
+    """
+
+    def __init__(self, host: str = STATIC_SERVER_HOST, port: int = 0):
+        self.host = host
+        self.port = port
+        self._server: _StaticHTTPServer | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> None:
+        with self._lock:
+            if self._server is not None:
+                return
+            self._server = _StaticHTTPServer((self.host, self.port))
+            self.port = self._server.server_address[1]
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+            with urllib.request.urlopen(f"{self.base_url}/healthz", timeout=STATIC_SERVER_READY_TIMEOUT) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Static server on {self.base_url} is not healthy")
+            logger.info(f"Static server ready on {self.base_url}")
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._server is None:
+                return
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def mount(self, directory: Path) -> str:
+        """Expose a directory and return its base URL."""
+        self.start()
+        token = uuid.uuid4().hex
+        self._server.mounts[token] = directory.resolve()
+        return f"{self.base_url}/{token}"
+
+    def unmount(self, url: str) -> None:
+        """Stop exposing the directory mounted at ``url``."""
+        if self._server is not None:
+            self._server.mounts.pop(url.rstrip("/").rsplit("/", 1)[-1], None)
+
+    @contextmanager
+    def serve(self, directory: Path) -> Iterator[str]:
+        """Expose a directory for the duration of the block, yielding its base URL."""
+        url = self.mount(directory)
+        try:
+            yield url
+        finally:
+            self.unmount(url)
+
+
+_server: StaticServer | None = None
+_server_lock = threading.Lock()
+
+
+def get_static_server() -> StaticServer:
+    """Return the static server shared by every render of the process."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = StaticServer()
+        return _server
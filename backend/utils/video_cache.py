@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from backend.utils.checkpoints import file_digest
+from backend.utils.generate_assets import TTS_VOICES
+from backend.utils.generate_script import script_models
+
+logger = logging.getLogger(__name__)
+
+VIDEO_CACHE_MAX_MB = int(os.getenv("VIDEO_CACHE_MAX_MB", "20000"))
+VIDEO_CACHE_MAX_AGE_DAYS = float(os.getenv("VIDEO_CACHE_MAX_AGE_DAYS", "30"))
+VIDEO_CACHE_INDEX_NAME = "cache.json"
+
+_index_lock = threading.Lock()
+
+
+def video_cache_key(
+    paper_id: str | None,
+    pdf_path: str | None,
+    method_script: str,
+    end_point_base_url: str | None,
+    method_audio: str,
+    profile: str,
+) -> str:
+    """Return the key of the video of a paper with given settings.
+
+    The paper is its arXiv id as given (pass a versioned id such as
+    "2404.02905v2" to tell versions apart) or the hash of its PDF. The
+    script is keyed by its method and the models it may use, the narration
+    by its method and voice.
+    """
+    paper = f"pdf:{file_digest(Path(pdf_path))}" if pdf_path else f"arxiv:{paper_id.strip()}"
+    settings = [
+        paper,
+        method_script,
+        script_models(method_script, end_point_base_url),
+        method_audio,
+        TTS_VOICES.get(method_audio),
+        profile,
+    ]
+    return hashlib.sha256(json.dumps(settings).encode()).hexdigest()[:16]
+
+
+class VideoCache:
+    """Videos already generated, by the key of their paper and settings, with eviction by age and size.
+
+    The index, ``cache.json`` in the video directory, records the file,
+    settings and last use of each video. Only the videos of the index count
+    towards the limits and are ever deleted: other files of the directory,
+    such as videos put there by hand, are left alone. Eviction runs when a
+    video is added.
+
+    Parameters
+    ----------
+    video_dir : Path
+        The directory of the videos
+    max_bytes : int, optional
+        Size of the videos above which the least recently used are deleted,
+        by default VIDEO_CACHE_MAX_MB
+    max_age_seconds : float, optional
+        Videos unused for longer are deleted, by default VIDEO_CACHE_MAX_AGE_DAYS
+    """
+
+    def __init__(
+        self,
+        video_dir: Path,
+        max_bytes: int = VIDEO_CACHE_MAX_MB * 1024 * 1024,
+        max_age_seconds: float = VIDEO_CACHE_MAX_AGE_DAYS * 24 * 3600,
+    ):
+        self.video_dir = video_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.index_path = video_dir / VIDEO_CACHE_INDEX_NAME
+
+    def get(self, key: str) -> Path | None:
+        """Return the video of a key and mark it used, None if there is none."""
+        with _index_lock:
+            index = self._read()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            video = self.video_dir / entry["file"]
+            if not video.exists():
+                del index[key]
+                self._write(index)
+                return None
+            entry["last_used"] = time.time()
+            self._write(index)
+        logger.info(f"Video cache hit: {video}")
+        return video
+
+    def put(self, key: str, video: Path, settings: dict[str, Any]) -> None:
+        """Record a video of the video directory under a key, then evict old videos."""
+        with _index_lock:
+            index = self._read()
+            now = time.time()
+            index[key] = {"file": video.name, "settings": settings, "created": now, "last_used": now}
+            self._write(index)
+        self.evict(keep=video)
+
+    def evict(self, keep: Path | None = None) -> list[Path]:
+        """Delete the videos of the index unused for longer than the age limit, then the least recently used ones above the size limit.
+
+        Parameters
+        ----------
+        keep : Path | None, optional
+            A video never to delete, e.g. the one just generated
+
+        Returns
+        -------
+        list[Path]
+            The deleted videos
+        """
+        with _index_lock:
+            index = self._read()
+            videos = []
+            for key, entry in index.items():
+                video = self.video_dir / entry["file"]
+                if video.exists():
+                    videos.append((entry["last_used"], video.stat().st_size, video, key))
+            videos.sort()
+            total = sum(size for _, size, _, _ in videos)
+            now = time.time()
+            evicted = []
+            for used, size, video, key in videos:
+                if keep is not None and video == keep:
+                    continue
+                if now - used <= self.max_age_seconds and total <= self.max_bytes:
+                    break
+                video.unlink(missing_ok=True)
+                del index[key]
+                total -= size
+                evicted.append(video)
+            if evicted:
+                self._write(index)
+                logger.info(f"Evicted {len(evicted)} videos from {self.video_dir}, {total / 1e6:.0f} MB left")
+        return evicted
+
+    def _read(self) -> dict[str, dict[str, Any]]:
+        return json.loads(self.index_path.read_text()) if self.index_path.exists() else {}
+
+    def _write(self, index: dict[str, dict[str, Any]]) -> None:
+        self.video_dir.mkdir(parents=True, exist_ok=True)
+        temp = self.index_path.with_suffix(".tmp")
+        temp.write_text(json.dumps(index, indent=2))
+        os.replace(temp, self.index_path)
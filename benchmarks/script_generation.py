@@ -0,0 +1,76 @@
+"""Compare the wall time of single-shot and map-reduce script generation.
+
+Usage:
+    python -m benchmarks.script_generation 2404.02905 2506.05301 --method openrouter
+
+Each paper is fetched once, then a script is generated with both strategies.
+"""
+import logging
+import time
+from typing import Literal
+
+import typer
+from dotenv import load_dotenv
+
+from backend.utils import process_article, process_script
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+cli = typer.Typer()
+
+
+@cli.command()
+def benchmark(
+    paper_ids: list[str],
+    method: Literal["openai", "local", "gemini", "openrouter", "groq"] = "openrouter",
+    paper_method: Literal["arxiv_gpt", "arxiv_html"] = "arxiv_html",
+    end_point_base_url: str = None,
+    runs: int = 1,
+):
+    """Generate a script for each paper with both strategies and print the wall times.
+
+    Parameters
+    ----------
+    paper_ids : list[str]
+        The arXiv ids of the papers, long papers show the difference best
+    method : str, optional
+        The provider to use, by default "openrouter"
+    paper_method : "arxiv_gpt" | "arxiv_html", optional
+        How to fetch the papers, by default "arxiv_html"
+    runs : int, optional
+        Number of runs per paper and strategy, the best one is kept, by default 1
+    """
+    rows = []
+    for paper_id in paper_ids:
+        paper_markdown = process_article(paper_method, paper_id)
+        timings = {}
+        for strategy in ("single", "map_reduce"):
+            best = None
+            for _ in range(runs):
+                start = time.perf_counter()
+                try:
+                    process_script(method, paper_markdown, paper_id, end_point_base_url, strategy=strategy)
+                except ValueError as e:
+                    logger.error(f"{paper_id} ({strategy}) failed: {e}")
+                    continue
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[strategy] = best
+        rows.append((paper_id, len(paper_markdown), timings["single"], timings["map_reduce"]))
+
+    print(f"{'paper':<14}{'chars':>10}{'single (s)':>14}{'map_reduce (s)':>18}{'speedup':>10}")
+    for paper_id, chars, single, map_reduce in rows:
+        speedup = f"{single / map_reduce:.2f}x" if single and map_reduce else "-"
+        print(
+            f"{paper_id:<14}{chars:>10}"
+            f"{single if single is not None else float('nan'):>14.1f}"
+            f"{map_reduce if map_reduce is not None else float('nan'):>18.1f}"
+            f"{speedup:>10}"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level="INFO")
+    cli()
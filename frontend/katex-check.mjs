@@ -0,0 +1,24 @@
+// Parse LaTeX equations with KaTeX, as the video does, without rendering
+// anything. Used by backend/utils/rich_raster.py to reject a bad equation
+// before the assets and the render.
+//
+// stdin: a JSON array of equations
+// stdout: a JSON array with, for each equation, null or the KaTeX error message
+import katex from "katex";
+
+let input = "";
+process.stdin.setEncoding("utf8");
+process.stdin.on("data", (chunk) => {
+	input += chunk;
+});
+process.stdin.on("end", () => {
+	const errors = JSON.parse(input).map((equation) => {
+		try {
+			katex.renderToString(equation, { throwOnError: true });
+			return null;
+		} catch (error) {
+			return String(error?.message || error);
+		}
+	});
+	process.stdout.write(JSON.stringify(errors));
+});
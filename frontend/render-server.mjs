@@ -0,0 +1,199 @@
+// Long-lived render service used by backend/utils/render_daemon.py.
+// It keeps headless browsers open between renders so that a job does not pay
+// for booting Node and Chrome again.
+//
+// Protocol: one JSON request per line on stdin, one JSON message per line on
+// stdout (any other stdout line is a log line).
+//   {"id": "1", "type": "ping"}
+//     -> {"id": "1", "type": "pong", "browsers": 2, "busy": 1}
+//   {"id": "2", "type": "render", "serveUrl": "...", "compositionId": "Arxflix",
+//    "inputProps": {...}, "output": "/abs/out.mp4", "frameRange": [0, 299], "concurrency": 6, "muted": false,
+//    "scale": 1, "crf": null, "x264Preset": null, "profile": false}
+//     -> {"id": "2", "type": "progress", "progress": 0.5, "renderedFrames": 150, "encodedFrames": 140,
+//         "frameTimes": [[149, 85.2], ...]}  (milliseconds per frame, only with "profile")
+//     -> {"id": "2", "type": "done", "output": "/abs/out.mp4"}
+//     or {"id": "2", "type": "error", "message": "..."}
+//   {"id": "3", "type": "stills", "serveUrl": "...", "compositionId": "ArxflixStatic",
+//    "inputProps": {...}, "frames": [0, 60, 61], "outDir": "/abs/stills", "concurrency": 4, "scale": 1}
+//     -> {"id": "3", "type": "progress", "progress": 0.33, "renderedFrames": 1}
+//     -> {"id": "3", "type": "done", "outputs": ["/abs/stills/still_000000.png", ...]}
+//   {"id": "4", "type": "shutdown"}
+import readline from "node:readline";
+import path from "node:path";
+import { openBrowser, renderMedia, renderStill, selectComposition } from "@remotion/renderer";
+
+const BROWSERS = Number(process.env.RENDER_DAEMON_BROWSERS || 1);
+
+const send = (message) => process.stdout.write(JSON.stringify(message) + "\n");
+
+const pool = [];
+const waiting = [];
+
+const launchBrowser = () => openBrowser("chrome", { logLevel: "error" });
+
+const closeBrowser = async (browser) => {
+	try {
+		await browser.close({ silent: true });
+	} catch {
+		// Already gone
+	}
+};
+
+const acquire = () => {
+	const slot = pool.find((s) => !s.busy);
+	if (slot) {
+		slot.busy = true;
+		return Promise.resolve(slot);
+	}
+	return new Promise((resolve) => waiting.push(resolve));
+};
+
+const release = (slot) => {
+	const next = waiting.shift();
+	if (next) {
+		next(slot);
+	} else {
+		slot.busy = false;
+	}
+};
+
+const render = async (request) => {
+	const slot = await acquire();
+	try {
+		const puppeteerInstance = slot.browser;
+		const composition = await selectComposition({
+			serveUrl: request.serveUrl,
+			id: request.compositionId,
+			inputProps: request.inputProps,
+			puppeteerInstance,
+			logLevel: "error",
+		});
+		let lastSent = 0;
+		// [frame, ms] pairs not sent yet, when the job asks for a frame timing profile
+		let frameTimes = [];
+		await renderMedia({
+			composition,
+			serveUrl: request.serveUrl,
+			codec: request.codec || "h264",
+			outputLocation: request.output,
+			inputProps: request.inputProps,
+			frameRange: request.frameRange ?? null,
+			concurrency: request.concurrency ?? null,
+			muted: Boolean(request.muted),
+			scale: request.scale ?? 1,
+			crf: request.crf ?? null,
+			x264Preset: request.x264Preset ?? null,
+			puppeteerInstance,
+			logLevel: "error",
+			onProgress: ({ progress, renderedFrames, encodedFrames }) => {
+				const now = Date.now();
+				if (now - lastSent < 250 && progress < 1) return;
+				lastSent = now;
+				send({ id: request.id, type: "progress", progress, renderedFrames, encodedFrames, frameTimes });
+				frameTimes = [];
+			},
+			onFrameUpdate: request.profile
+				? (_framesRendered, frameIndex, timeToRenderInMilliseconds) => {
+						frameTimes.push([frameIndex, timeToRenderInMilliseconds]);
+					}
+				: undefined,
+		});
+		if (frameTimes.length) {
+			send({ id: request.id, type: "progress", progress: 1, frameTimes });
+		}
+		send({ id: request.id, type: "done", output: request.output });
+	} catch (error) {
+		send({ id: request.id, type: "error", message: String(error?.stack || error) });
+		// The browser may have crashed with the render, replace it
+		await closeBrowser(slot.browser);
+		slot.browser = await launchBrowser();
+	} finally {
+		release(slot);
+	}
+};
+
+// Render single frames to PNG files, several pages of the same browser at a time
+const stills = async (request) => {
+	const slot = await acquire();
+	try {
+		const puppeteerInstance = slot.browser;
+		const composition = await selectComposition({
+			serveUrl: request.serveUrl,
+			id: request.compositionId,
+			inputProps: request.inputProps,
+			puppeteerInstance,
+			logLevel: "error",
+		});
+		const outputs = request.frames.map((frame) =>
+			path.join(request.outDir, `still_${String(frame).padStart(6, "0")}.png`),
+		);
+		let next = 0;
+		let done = 0;
+		const worker = async () => {
+			while (next < request.frames.length) {
+				const index = next++;
+				await renderStill({
+					composition,
+					serveUrl: request.serveUrl,
+					output: outputs[index],
+					frame: request.frames[index],
+					inputProps: request.inputProps,
+					imageFormat: "png",
+					scale: request.scale ?? 1,
+					puppeteerInstance,
+					logLevel: "error",
+				});
+				done++;
+				send({ id: request.id, type: "progress", progress: done / request.frames.length, renderedFrames: done });
+			}
+		};
+		await Promise.all(Array.from({ length: Math.max(1, request.concurrency || 1) }, worker));
+		send({ id: request.id, type: "done", outputs });
+	} catch (error) {
+		send({ id: request.id, type: "error", message: String(error?.stack || error) });
+		await closeBrowser(slot.browser);
+		slot.browser = await launchBrowser();
+	} finally {
+		release(slot);
+	}
+};
+
+const main = async () => {
+	for (let i = 0; i < BROWSERS; i++) {
+		pool.push({ browser: await launchBrowser(), busy: false });
+	}
+	send({ type: "ready", browsers: pool.length });
+
+	const lines = readline.createInterface({ input: process.stdin });
+	lines.on("line", (line) => {
+		if (!line.trim()) return;
+		let request;
+		try {
+			request = JSON.parse(line);
+		} catch (error) {
+			send({ type: "error", message: `Invalid request: ${line}` });
+			return;
+		}
+		if (request.type === "ping") {
+			send({ id: request.id, type: "pong", browsers: pool.length, busy: pool.filter((s) => s.busy).length });
+		} else if (request.type === "render") {
+			render(request);
+		} else if (request.type === "stills") {
+			stills(request);
+		} else if (request.type === "shutdown") {
+			lines.close();
+		} else {
+			send({ id: request.id, type: "error", message: `Unknown request type: ${request.type}` });
+		}
+	});
+	// stdin closed: the Python side is gone or asked to stop
+	lines.on("close", async () => {
+		await Promise.all(pool.map((s) => closeBrowser(s.browser)));
+		process.exit(0);
+	});
+};
+
+main().catch((error) => {
+	send({ type: "fatal", message: String(error?.stack || error) });
+	process.exit(1);
+});
@@ -7,25 +7,69 @@ import {
 } from 'remotion';
 import { extendViewBox } from "@remotion/paths";
 
-export const AudioViz: React.FC<{
+// Frequency bins precomputed by the backend (see backend/utils/audio_viz.py)
+export type AudioVizData = {
+	// Frame rate of the stored frames, looked up by time when the composition differs
+	fps: number;
+	numberOfSamples: number;
+	// First stored bin, and number of stored bins per frame
+	startIndex: number;
+	bins: number;
+	// value = scale * (byte / 255) ** 2
+	scale: number;
+	data: Uint8Array;
+};
+
+type VizType = 'bars' | 'waveform' | 'circle' | 'radialBars' | 'customWaveform';
+
+type AudioVizProps = {
 	waveColor: string;
 	numberOfSamples: number;
 	freqRangeStartIndex: number;
 	waveLinesToDisplay: number;
 	mirrorWave: boolean;
 	audioSrc: string;
-	vizType?: 'bars' | 'waveform' | 'circle' | 'radialBars' | 'customWaveform';
-}> = ({
-	waveColor,
-	numberOfSamples,
-	freqRangeStartIndex,
-	waveLinesToDisplay,
-	mirrorWave,
+	vizType?: VizType;
+	vizData?: AudioVizData | null;
+};
+
+export const AudioViz: React.FC<AudioVizProps> = ({ vizData, ...props }) => {
+	// Hooks can't be conditional, so decoding the audio is its own component
+	if (
+		vizData &&
+		vizData.numberOfSamples === props.numberOfSamples &&
+		vizData.startIndex <= props.freqRangeStartIndex &&
+		vizData.startIndex + vizData.bins >= props.freqRangeStartIndex + props.waveLinesToDisplay
+	) {
+		return <PrecomputedAudioViz vizData={vizData} {...props} />;
+	}
+	return <DecodedAudioViz {...props} />;
+};
+
+const PrecomputedAudioViz: React.FC<AudioVizProps & { vizData: AudioVizData }> = ({
+	vizData,
 	audioSrc,
-	vizType = 'customWaveform',
+	numberOfSamples,
+	...props
 }) => {
 	const frame = useCurrentFrame();
 	const { fps } = useVideoConfig();
+	const { startIndex, bins, scale, data } = vizData;
+	const frequencyData = new Array<number>(startIndex + bins).fill(0);
+	const storedFrame = Math.round((frame * vizData.fps) / fps);
+	const offset = storedFrame * bins;
+	if (storedFrame >= 0 && offset < data.length) {
+		for (let i = 0; i < bins; i++) {
+			const q = data[offset + i] / 255;
+			frequencyData[startIndex + i] = scale * q * q;
+		}
+	}
+	return <AudioVizShape frequencyData={frequencyData} {...props} />;
+};
+
+const DecodedAudioViz: React.FC<AudioVizProps> = ({ audioSrc, numberOfSamples, ...props }) => {
+	const frame = useCurrentFrame();
+	const { fps } = useVideoConfig();
 
 	const audioData = useAudioData(audioSrc);
 
@@ -40,6 +84,24 @@ export const AudioViz: React.FC<{
 		numberOfSamples,
 	});
 
+	return <AudioVizShape frequencyData={frequencyData} {...props} />;
+};
+
+const AudioVizShape: React.FC<{
+	frequencyData: number[];
+	waveColor: string;
+	freqRangeStartIndex: number;
+	waveLinesToDisplay: number;
+	mirrorWave: boolean;
+	vizType?: VizType;
+}> = ({
+	frequencyData,
+	waveColor,
+	freqRangeStartIndex,
+	waveLinesToDisplay,
+	mirrorWave,
+	vizType = 'customWaveform',
+}) => {
 	const frequencyDataSubset = frequencyData.slice(
 		freqRangeStartIndex,
 		freqRangeStartIndex +
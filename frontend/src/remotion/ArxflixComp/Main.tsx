@@ -14,12 +14,13 @@ import {
 import { z } from 'zod';
 import { zColor } from '@remotion/zod-types';
 import { PaginatedSubtitles } from './Subtitles';
-import { AudioViz } from './AudioViz';
+import { AudioViz, AudioVizData } from './AudioViz';
 import { CurrentFigure, RichContent } from './RichContent';
 import { loadFont, fontFamily } from "@remotion/google-fonts/Inter";
 import { CalculateMetadataFunction } from "remotion";
 import { getAudioDurationInSeconds } from '@remotion/media-utils';
-import { VIDEO_FPS, CompositionPropsType } from '../../types/constants';
+import { SubtitleItem } from 'parse-srt';
+import { VIDEO_FPS, VIDEO_HEIGHT, LAYER_SPLIT, CompositionPropsType, RenderManifestType } from '../../types/constants';
 
 loadFont();
 
@@ -37,16 +38,51 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 	subtitlesLineHeight,
 	onlyDisplayCurrentSentence,
 	mirrorWave,
+	manifestFileName,
+	layer = 'all',
 }) => {
 	const { durationInFrames, fps } = useVideoConfig();
 	const frame = useCurrentFrame();
 	const [handle] = useState(() => delayRender());
-	const [subtitles, setSubtitles] = useState<string | null>(null);
+	// SRT text, or words already in frames when read from the manifest
+	const [subtitles, setSubtitles] = useState<string | SubtitleItem[] | null>(null);
 	const [introData, setIntroData] = useState<{ title: string; figure: string } | null>(null);
 	const [richContent, setRichContent] = useState<RichContent[]>([]);
+	const [vizData, setVizData] = useState<AudioVizData | null>(null);
 	const ref = useRef<HTMLDivElement>(null);
 
 	useEffect(() => {
+		if (!manifestFileName) return;
+		// Local figures are relative to the manifest
+		const resolveFigure = (content: string) => (content ? new URL(content, manifestFileName).href : content);
+		fetch(manifestFileName)
+			.then((res) => res.json())
+			.then(async (manifest: RenderManifestType) => {
+				if (manifest.audioViz) {
+					const response = await fetch(new URL(manifest.audioViz.file, manifestFileName).href);
+					setVizData({ ...manifest.audioViz, data: new Uint8Array(await response.arrayBuffer()) });
+				}
+				setSubtitles(manifest.words);
+				setRichContent(
+					manifest.richContent.map((c) => ({
+						...c,
+						content: c.type === 'figure' ? resolveFigure(c.content) : c.content,
+						image: c.image ? resolveFigure(c.image) : null,
+					})),
+				);
+				setIntroData({
+					title: manifest.intro.title,
+					figure: resolveFigure(manifest.intro.figure),
+				});
+				continueRender(handle);
+			})
+			.catch((err) => {
+				console.log('Error fetching manifest', err);
+			});
+	}, [handle, manifestFileName]);
+
+	useEffect(() => {
+		if (manifestFileName) return;
 		fetch(subtitlesFileName)
 			.then((res) => res.text())
 			.then((text) => {
@@ -56,13 +92,22 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 			.catch((err) => {
 				console.log('Error fetching subtitles', err);
 			});
-	}, [handle, subtitlesFileName]);
+	}, [handle, manifestFileName, subtitlesFileName]);
 
 	useEffect(() => {
+		if (manifestFileName) return;
 		fetch(richContentFileName)
 			.then((res) => res.json())
 			.then((data: RichContent[]) => {
-				setRichContent(data);
+				// The rich content JSON is in seconds, the composition works in frames.
+				// Pre-rendered images are next to it.
+				const base = new URL(richContentFileName, window.location.href);
+				setRichContent(data.map((f) => ({
+					...f,
+					start: f.start * fps,
+					end: f.end * fps,
+					image: f.image ? new URL(f.image, base).href : null,
+				})));
 				const firstFigure = data.find((f) => f.type === 'figure')?.content || '';
 				const firstHeadline = data.find((f) => f.type === 'headline')?.content || '';
 				setIntroData({
@@ -74,7 +119,7 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 			.catch((err) => {
 				console.log('Error fetching rich content', err);
 			});
-	}, [handle, richContentFileName]);
+	}, [fps, handle, manifestFileName, richContentFileName]);
 
 	if (!subtitles || !richContent || !introData) {
 		return null;
@@ -85,10 +130,13 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 	const introductionDurationInSeconds = Math.round(2 * fps);
 	// No outro section needed
 	const outroDurationInSeconds = 0;
+	const showStatic = layer !== 'dynamic';
+	const showDynamic = layer !== 'static';
 	return (
 		<div ref={ref}>
-			<AbsoluteFill>
-				<Sequence from={0} durationInFrames={introductionDurationInSeconds}>
+			{/* The dynamic layer is rendered in a composition as tall as the rows below LAYER_SPLIT */}
+			<AbsoluteFill style={layer === 'dynamic' ? { top: -LAYER_SPLIT, bottom: 'auto', height: VIDEO_HEIGHT } : undefined}>
+				{showStatic && <Sequence from={0} durationInFrames={introductionDurationInSeconds}>
 					<div
 						className="grid grid-cols-1 grid-rows-5 w-full h-full text-white p-16 bg-orange-50 "
 						style={{
@@ -111,9 +159,9 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 							</div>
 						</div>
 					</div>
-				</Sequence>
+				</Sequence>}
 				<Sequence from={introductionDurationInSeconds} durationInFrames={durationInFrames - introductionDurationInSeconds - outroDurationInSeconds}>
-					<Audio src={audioFileName} />
+					{showDynamic && <Audio src={audioFileName} />}
 
 					<div
 						className="grid grid-cols-1 grid-rows-5 w-full h-full text-white p-5 bg-orange-50"
@@ -122,11 +170,11 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 						}}
 					>
 						<div className="row-span-3 flex justify-center items-center">
-							<CurrentFigure
+							{showStatic && <CurrentFigure
 								richContent={richContent}
 								transitionFrames={5}
 								key={figures.map((f) => f.content).join('')}
-							/>
+							/>}
 						</div>
 
 						<div className='row-span-1'>
@@ -136,7 +184,7 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 								}}
 								className="font-semibold text-7xl pt-24"
 							>
-								<PaginatedSubtitles
+								{showDynamic && <PaginatedSubtitles
 									subtitles={subtitles}
 									startFrame={0}
 									endFrame={durationInFrames - introductionDurationInSeconds}
@@ -144,11 +192,11 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 									subtitlesZoomMeasurerSize={subtitlesZoomMeasurerSize}
 									subtitlesLineHeight={subtitlesLineHeight}
 									onlyDisplayCurrentSentence={onlyDisplayCurrentSentence}
-								/>
+								/>}
 							</div>
 						</div>
 						<div className='row-span-1 max-h-[100px] content-end self-end'>
-							<AudioViz
+							{showDynamic && <AudioViz
 								audioSrc={audioFileName}
 								mirrorWave={mirrorWave}
 								waveColor={waveColor}
@@ -156,7 +204,8 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 								freqRangeStartIndex={waveFreqRangeStartIndex}
 								waveLinesToDisplay={waveLinesToDisplay}
 								vizType='customWaveform'
-							/>
+								vizData={vizData}
+							/>}
 						</div>
 					</div>
 				</Sequence>
@@ -169,17 +218,18 @@ export const ArxflixComposition: React.FC<CompositionPropsType> = ({
 export const calculateMetadata: CalculateMetadataFunction<
 	CompositionPropsType
 > = async ({ props }) => {
+	const fps = props.fps ?? VIDEO_FPS;
 	if (props.duration) {
 		return {
 			durationInFrames: props.duration,
-			fps: VIDEO_FPS,
+			fps,
 		};
 	}
 	const duration = await getAudioDurationInSeconds(props.audioFileName);
-	const audioDurationInFrame = Math.floor(duration * VIDEO_FPS)
+	const audioDurationInFrame = Math.floor(duration * fps)
 	
 	return {
 		durationInFrames: audioDurationInFrame,
-		fps: VIDEO_FPS,
+		fps,
 	};
 };
\ No newline at end of file
@@ -3,7 +3,6 @@ import {
 	Img,
 	interpolate,
 	useCurrentFrame,
-	useVideoConfig,
 } from 'remotion';
 import { InlineMath } from 'react-katex';
 import { preloadImage } from "@remotion/preload";
@@ -11,8 +10,31 @@ import { preloadImage } from "@remotion/preload";
 export type RichContent = {
 	type: 'figure' | 'headline' | 'equation';
 	content: string;
+	// In frames
 	start: number;
 	end: number;
+	// Headline or equation pre-rendered by the backend (see backend/utils/rich_raster.py)
+	image?: string | null;
+};
+
+// Markup of a headline or an equation, shared by the video and RichContentRaster
+export const RichText: React.FC<{
+	type: 'headline' | 'equation';
+	content: string;
+	style?: React.CSSProperties;
+}> = ({ type, content, style }) => {
+	if (type === 'headline') {
+		return (
+			<div className="text-8xl font-semibold text-black text-center" style={style}>
+				{content}
+			</div>
+		);
+	}
+	return (
+		<div className="text-5xl font-semibold text-black text-center" style={style}>
+			<InlineMath math={content} />
+		</div>
+	);
 };
 
 export const CurrentFigure: React.FC<{
@@ -20,8 +42,6 @@ export const CurrentFigure: React.FC<{
 	transitionFrames?: number;
 }> = ({ richContent = [], transitionFrames = 10 }) => {
 	const frame = useCurrentFrame();
-	const config = useVideoConfig();
-	const { fps } = config;
 
 	useEffect(() => {
 		richContent.forEach((f) => {
@@ -31,19 +51,19 @@ export const CurrentFigure: React.FC<{
 		});
 	}, [richContent]);
 
-	const currentFigure = richContent.find((f) => frame >= (f.start * fps) && frame <= (f.end * fps));
+	const currentFigure = richContent.find((f) => frame >= f.start && frame <= f.end);
 	if (!currentFigure) {
 		return null;
 	}
 
 
 
-	const currentFigureDurationInFrame = (currentFigure.end * fps) - (currentFigure.start * fps);
+	const currentFigureDurationInFrame = currentFigure.end - currentFigure.start;
 
-	const scale = interpolate(frame - (currentFigure.start * fps), [0, transitionFrames, currentFigureDurationInFrame - transitionFrames, currentFigureDurationInFrame], [0.5, 1, 1, 0.5], {
+	const scale = interpolate(frame - currentFigure.start, [0, transitionFrames, currentFigureDurationInFrame - transitionFrames, currentFigureDurationInFrame], [0.5, 1, 1, 0.5], {
 		extrapolateRight: 'clamp',
 	});
-	const opacity = interpolate(frame - (currentFigure.start * fps), [0, transitionFrames, currentFigureDurationInFrame - transitionFrames, currentFigureDurationInFrame], [0, 1, 1, 0], {
+	const opacity = interpolate(frame - currentFigure.start, [0, transitionFrames, currentFigureDurationInFrame - transitionFrames, currentFigureDurationInFrame], [0, 1, 1, 0], {
 		extrapolateRight: 'clamp',
 	});
 
@@ -55,21 +75,14 @@ export const CurrentFigure: React.FC<{
 	if (!currentFigure) {
 		return null;
 	}
-	if (currentFigure.type === 'headline') {
-		return (
-			<div className="text-8xl font-semibold text-black text-center" style={styleCombined}>
-				{currentFigure.content}
-			</div>
-		);
-	} else if (currentFigure.type === 'figure') {
+	if (currentFigure.type === 'figure') {
 		return <div className="flex w-full justify-center items-center">
 			<Img className="object-fill min-h-[500px] max-h-[650px]" style={styleCombined} src={currentFigure.content} />
 		</div>;
-	} else if (currentFigure.type === 'equation') {
-		return (
-			<div className="text-5xl font-semibold text-black text-center" style={styleCombined}>
-				<InlineMath math={currentFigure.content} />
-			</div>
-		);
 	}
+	if (currentFigure.image) {
+		// As large as the row it was rendered in, so it is centered the same way
+		return <Img className="w-full h-full" style={styleCombined} src={currentFigure.image} />;
+	}
+	return <RichText type={currentFigure.type} content={currentFigure.content} style={styleCombined} />;
 }
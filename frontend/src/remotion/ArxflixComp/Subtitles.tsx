@@ -10,37 +10,35 @@ import {
 import { Word } from './Word';
 
 const useWindowedFrameSubs = (
-	src: string,
+	src: string | SubtitleItem[],
 	options: { windowStart: number; windowEnd: number },
 ) => {
 	const { windowStart, windowEnd } = options;
 	const config = useVideoConfig();
 	const { fps } = config;
 
-	const parsed = useMemo(() => parseSRT(src), [src]);
+	// Words from the render manifest are already in frames
+	const parsed = useMemo(
+		() =>
+			typeof src === 'string'
+				? parseSRT(src).map<SubtitleItem>((item) => ({
+						...item,
+						start: Math.floor(item.start * fps),
+						end: Math.floor(item.end * fps),
+					}))
+				: src,
+		[fps, src],
+	);
 
 	return useMemo(() => {
-		return parsed
-			.map((item) => {
-				const start = Math.floor(item.start * fps);
-				const end = Math.floor(item.end * fps);
-				return { item, start, end };
-			})
-			.filter(({ start }) => {
-				return start >= windowStart && start <= windowEnd;
-			})
-			.map<SubtitleItem>(({ item, start, end }) => {
-				return {
-					...item,
-					start,
-					end,
-				};
-			}, []);
-	}, [fps, parsed, windowEnd, windowStart]);
+		return parsed.filter(({ start }) => {
+			return start >= windowStart && start <= windowEnd;
+		});
+	}, [parsed, windowEnd, windowStart]);
 };
 
 export const PaginatedSubtitles: React.FC<{
-	subtitles: string;
+	subtitles: string | SubtitleItem[];
 	startFrame: number;
 	endFrame: number;
 	linesPerPage: number;
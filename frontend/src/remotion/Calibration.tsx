@@ -0,0 +1,33 @@
+import { AbsoluteFill, interpolate, useCurrentFrame } from 'remotion';
+import { InlineMath } from 'react-katex';
+
+// Fixed, asset-free composition used to measure the render throughput at a
+// given concurrency (see `python -m backend.main calibrate_render`). It mixes
+// the kinds of work of the Arxflix composition: text, KaTeX and a waveform.
+export const CALIBRATION_DURATION_IN_FRAMES = 150;
+
+const BARS = 300;
+
+export const CalibrationComposition: React.FC = () => {
+	const frame = useCurrentFrame();
+	const opacity = interpolate(frame, [0, 30], [0, 1], { extrapolateRight: 'clamp' });
+	return (
+		<AbsoluteFill className="bg-white flex flex-col items-center justify-center gap-12">
+			<h1 className="text-7xl font-bold text-gray-800" style={{ opacity }}>
+				Render calibration, frame {frame}
+			</h1>
+			<div className="text-6xl">
+				<InlineMath math={`\\sum_{i=0}^{${frame}} \\frac{x_i^2}{\\sqrt{i + 1}}`} />
+			</div>
+			<div className="flex flex-row items-center h-48 gap-[2px]">
+				{Array.from({ length: BARS }, (_, i) => (
+					<div
+						key={i}
+						className="w-1 rounded bg-gray-400"
+						style={{ height: `${50 + 45 * Math.sin((i + frame * 3) / 7)}%` }}
+					/>
+				))}
+			</div>
+		</AbsoluteFill>
+	);
+};
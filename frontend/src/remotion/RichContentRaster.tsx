@@ -0,0 +1,33 @@
+import { useEffect, useState } from 'react';
+import { AbsoluteFill, continueRender, delayRender, useCurrentFrame } from 'remotion';
+import { z } from 'zod';
+import { loadFont, fontFamily } from '@remotion/google-fonts/Inter';
+import { RichText } from './ArxflixComp/RichContent';
+
+loadFont();
+
+// Renders the headlines and equations of a video once, one per frame, on a
+// transparent background the size of the row they are shown in, so the video
+// shows an image instead of laying out text and typesetting KaTeX on every
+// frame (see backend/utils/rich_raster.py).
+export const RichContentRasterProps = z.object({
+	items: z.array(z.object({ type: z.enum(['headline', 'equation']), content: z.string() })),
+});
+
+export const RichContentRasterComposition: React.FC<z.infer<typeof RichContentRasterProps>> = ({ items }) => {
+	const frame = useCurrentFrame();
+	// KaTeX fonts are only fetched once an equation uses them
+	const [handle] = useState(() => delayRender('Waiting for the fonts'));
+	useEffect(() => {
+		document.fonts.ready.then(() => continueRender(handle));
+	}, [handle]);
+	const item = items[frame];
+	if (!item) {
+		return null;
+	}
+	return (
+		<AbsoluteFill className="flex justify-center items-center" style={{ fontFamily }}>
+			<RichText type={item.type} content={item.content} />
+		</AbsoluteFill>
+	);
+};
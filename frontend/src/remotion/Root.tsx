@@ -1,11 +1,16 @@
 import { Composition, delayRender } from 'remotion';
 import { ArxflixComposition, calculateMetadata } from './ArxflixComp/Main';
+import { CalibrationComposition, CALIBRATION_DURATION_IN_FRAMES } from './Calibration';
+import { RichContentRasterComposition, RichContentRasterProps } from './RichContentRaster';
 import './style.css';
 import 'katex/dist/katex.min.css';
 import {
 	VIDEO_WIDTH,
 	VIDEO_HEIGHT,
 	VIDEO_FPS,
+	LAYER_SPLIT,
+	RICH_CONTENT_WIDTH,
+	RICH_CONTENT_HEIGHT,
 	CompositionProps,
 	CompositionPropsType,
 	defaultCompositionProps
@@ -14,17 +19,58 @@ import { useEffect, useState } from 'react';
 
 export const RemotionRoot: React.FC = () => {
 	return (
-		<Composition
-			id="Arxflix"
-			component={ArxflixComposition}
-			fps	={VIDEO_FPS}
-			width={VIDEO_WIDTH}
-			height={VIDEO_HEIGHT}
-			schema={CompositionProps}
-			defaultProps={defaultCompositionProps}
-			// Determine the length of the video based on the duration of the audio file
-			// durationInFrames={8000}
-			calculateMetadata={calculateMetadata}
-		/>
+		<>
+			<Composition
+				id="Arxflix"
+				component={ArxflixComposition}
+				fps	={VIDEO_FPS}
+				width={VIDEO_WIDTH}
+				height={VIDEO_HEIGHT}
+				schema={CompositionProps}
+				defaultProps={defaultCompositionProps}
+				// Determine the length of the video based on the duration of the audio file
+				// durationInFrames={8000}
+				calculateMetadata={calculateMetadata}
+			/>
+			{/* Layers of the Arxflix composition, for the layered render (backend/utils/layered_render.py) */}
+			<Composition
+				id="ArxflixStatic"
+				component={ArxflixComposition}
+				fps={VIDEO_FPS}
+				width={VIDEO_WIDTH}
+				height={VIDEO_HEIGHT}
+				schema={CompositionProps}
+				defaultProps={{ ...defaultCompositionProps, layer: 'static' }}
+				calculateMetadata={calculateMetadata}
+			/>
+			<Composition
+				id="ArxflixDynamic"
+				component={ArxflixComposition}
+				fps={VIDEO_FPS}
+				width={VIDEO_WIDTH}
+				height={VIDEO_HEIGHT - LAYER_SPLIT}
+				schema={CompositionProps}
+				defaultProps={{ ...defaultCompositionProps, layer: 'dynamic' }}
+				calculateMetadata={calculateMetadata}
+			/>
+			<Composition
+				id="Calibration"
+				component={CalibrationComposition}
+				fps={VIDEO_FPS}
+				width={VIDEO_WIDTH}
+				height={VIDEO_HEIGHT}
+				durationInFrames={CALIBRATION_DURATION_IN_FRAMES}
+			/>
+			<Composition
+				id="RichContentRaster"
+				component={RichContentRasterComposition}
+				fps={VIDEO_FPS}
+				width={RICH_CONTENT_WIDTH}
+				height={RICH_CONTENT_HEIGHT}
+				schema={RichContentRasterProps}
+				defaultProps={{ items: [] }}
+				calculateMetadata={async ({ props }) => ({ durationInFrames: Math.max(1, props.items.length) })}
+			/>
+		</>
 	);
 };
@@ -23,9 +23,43 @@ export const CompositionProps = z.object({
 	waveLinesToDisplay: z.number().int().min(0),
 	waveFreqRangeStartIndex: z.number().int().min(0),
 	waveNumberOfSamples: z.enum(['32', '64', '128', '256', '512']),
-	duration: z.optional(z.number().int().min(0)),
+	duration: z.number().int().min(0).nullish(),
+	// Frame rate of the composition, VIDEO_FPS when missing (draft renders use less)
+	fps: z.number().int().min(1).nullish(),
+	// Precomputed by the backend (see backend/utils/render_manifest.py)
+	manifestFileName: z.string().nullish(),
+	// Render only the figure/headline layer or only the subtitles/waveform layer, see LAYER_SPLIT
+	layer: z.enum(['all', 'static', 'dynamic']).nullish(),
 });
 
+export const RenderManifest = z.object({
+	version: z.number().int(),
+	fps: z.number(),
+	durationInFrames: z.number().int().min(0),
+	intro: z.object({ title: z.string(), figure: z.string() }),
+	// Times in frames
+	words: z.array(z.object({ id: z.number().int(), text: z.string(), start: z.number(), end: z.number() })),
+	richContent: z.array(z.object({
+		type: z.enum(['figure', 'headline', 'equation']),
+		content: z.string(),
+		start: z.number(),
+		end: z.number(),
+		image: z.string().nullish(),
+	})),
+	// Frequency bins of AudioViz for each frame, see backend/utils/audio_viz.py
+	audioViz: z.object({
+		file: z.string(),
+		fps: z.number(),
+		frames: z.number().int(),
+		numberOfSamples: z.number().int(),
+		startIndex: z.number().int(),
+		bins: z.number().int(),
+		scale: z.number(),
+	}).nullish(),
+});
+
+export type RenderManifestType = z.infer<typeof RenderManifest>;
+
 export type CompositionPropsType = z.infer<typeof CompositionProps>;
 
 export const defaultCompositionProps: CompositionPropsType = {
@@ -54,3 +88,10 @@ export const defaultCompositionProps: CompositionPropsType = {
 export const VIDEO_WIDTH = 1920;
 export const VIDEO_HEIGHT = 1080;
 export const VIDEO_FPS = 30;
+// Rows above are the static layer (figure, headline, equation), rows below the
+// dynamic one (subtitles, waveform). Must match LAYER_SPLIT in backend/utils/layered_render.py
+export const LAYER_SPLIT = 648;
+// Size of the row showing the figure, headline or equation: the video minus
+// the p-5 padding, and 3 of the 5 grid rows (see Main.tsx)
+export const RICH_CONTENT_WIDTH = 1880;
+export const RICH_CONTENT_HEIGHT = 624;